@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import (
-    CustomUser, PointHistory, UserRecommendation, UserPreference
+    CustomUser, PointHistory, PointBalanceSnapshot, PointCampaign, PointEscrow,
+    UserRecommendation, UserPreference, NotificationEvent, Notification
 )
 
 @admin.register(CustomUser)
@@ -33,6 +34,33 @@ class PointHistoryAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
 
 
+@admin.register(PointBalanceSnapshot)
+class PointBalanceSnapshotAdmin(admin.ModelAdmin):
+    """ポイント残高スナップショット管理"""
+    list_display = ('user', 'balance', 'entries_count', 'last_entry_id', 'taken_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('taken_at',)
+
+
+@admin.register(PointCampaign)
+class PointCampaignAdmin(admin.ModelAdmin):
+    """ポイントキャンペーン管理"""
+    list_display = ('name', 'points', 'status', 'awarded_count', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('name', 'reason')
+    readonly_fields = ('last_user_id', 'awarded_count', 'error_message', 'started_at', 'finished_at', 'created_at', 'updated_at')
+
+
+@admin.register(PointEscrow)
+class PointEscrowAdmin(admin.ModelAdmin):
+    """ポイント預かり管理（状態の変更は accounts.escrow で行う）"""
+    list_display = ('question', 'user', 'points', 'status', 'recipient', 'created_at', 'settled_at')
+    list_filter = ('status',)
+    search_fields = ('user__username', 'question__title')
+    raw_id_fields = ('question', 'user', 'recipient')
+    readonly_fields = ('question', 'user', 'points', 'status', 'recipient', 'created_at', 'settled_at')
+
+
 @admin.register(UserRecommendation)
 class UserRecommendationAdmin(admin.ModelAdmin):
     """ユーザーおすすめ管理"""
@@ -47,3 +75,22 @@ class UserPreferenceAdmin(admin.ModelAdmin):
     list_display = ('user', 'budget_min', 'budget_max', 'created_at')
     search_fields = ('user__username',)
     filter_horizontal = ('preferred_brands', 'preferred_categories')
+
+
+@admin.register(NotificationEvent)
+class NotificationEventAdmin(admin.ModelAdmin):
+    """通知イベント管理"""
+    list_display = ('kind', 'question', 'actor', 'created_at', 'delivered_at')
+    list_filter = ('kind', 'delivered_at')
+    raw_id_fields = ('question', 'answer', 'actor')
+    readonly_fields = ('created_at', 'delivered_at')
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    """通知管理"""
+    list_display = ('user', 'kind', 'is_read', 'created_at')
+    list_filter = ('kind', 'is_read')
+    search_fields = ('user__username',)
+    raw_id_fields = ('user', 'event')
+    readonly_fields = ('created_at',)
@@ -0,0 +1,218 @@
+"""
+キャッシュ付きトークン認証
+
+DRF の TokenAuthentication はリクエストごとに Token と CustomUser を JOIN して取得する。
+CachedTokenAuthentication はトークン→ユーザーID、ユーザーID→ユーザーのスナップショットを
+プロセス内のLRUと共有キャッシュ（settings.TOKEN_AUTH_CACHE['CACHE_ALIAS']）に短いTTLで保持する。
+
+トークンの削除とユーザーの更新時は accounts.signals から無効化される。
+プロセス内のLRUは他プロセスでの無効化を受け取れないため、TTLを共有キャッシュより短くしている。
+共有キャッシュは CACHE_ALIAS がプロセス間で共有されるバックエンド（Redis・Memcached・ファイルなど）の場合のみ使い、
+LocMemCache（CACHES 未設定時の既定）ではプロセス内のLRUだけを使う（ログアウトが他のワーカーに届かない時間を LOCAL_TIMEOUT に抑える）。
+スナップショットにはパスワードのハッシュを含めない（参照した場合はDBから読み込む）::
+
+    TOKEN_AUTH_CACHE = {
+        'CACHE_ALIAS': 'default',
+        'TIMEOUT': 60,          # 共有キャッシュのTTL（秒）
+        'LOCAL_TIMEOUT': 5,     # プロセス内LRUのTTL（秒）
+        'LOCAL_MAXSIZE': 1024,  # プロセス内LRUの最大件数
+    }
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 60,
+    'LOCAL_TIMEOUT': 5,
+    'LOCAL_MAXSIZE': 1024,
+}
+
+
+class LocalLRUCache:
+    """TTL付きのスレッドセーフなLRUキャッシュ"""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0 or self.timeout <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# プロセス内にしか保存しない（または保存しない）キャッシュバックエンド
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_local_cache = None
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TOKEN_AUTH_CACHE', {})}
+
+
+def get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        config = get_config()
+        _local_cache = LocalLRUCache(config['LOCAL_MAXSIZE'], config['LOCAL_TIMEOUT'])
+    return _local_cache
+
+
+def get_shared_cache():
+    """プロセス間で共有されるキャッシュ（共有されないバックエンドの場合は None）"""
+    alias = get_config()['CACHE_ALIAS']
+    if settings.CACHES.get(alias, {}).get('BACKEND') in LOCAL_CACHE_BACKENDS:
+        return None
+    return caches[alias]
+
+
+def token_cache_key(key):
+    # トークンそのものをキャッシュキーに残さない
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _delete(keys):
+    get_local_cache().delete_many(keys)
+    shared_cache = get_shared_cache()
+    if shared_cache is not None:
+        shared_cache.delete_many(keys)
+
+
+def _delete_now_and_on_commit(keys):
+    # コミット前に古い値を読んだ別リクエストが再キャッシュしないよう、コミット後にも削除する
+    _delete(keys)
+    transaction.on_commit(lambda: _delete(keys))
+
+
+def invalidate_token(key):
+    """トークンのキャッシュを無効化する"""
+    _delete_now_and_on_commit([token_cache_key(key)])
+
+
+def invalidate_users(user_ids):
+    """ユーザーのスナップショットを無効化する"""
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        _delete_now_and_on_commit(keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """トークン→ユーザーのスナップショットをキャッシュする TokenAuthentication"""
+
+    def authenticate_credentials(self, key):
+        local_cache = get_local_cache()
+        shared_cache = get_shared_cache()
+        config = get_config()
+        token_key = token_cache_key(key)
+
+        token = local_cache.get(token_key)
+        if token is None and shared_cache is not None:
+            token = shared_cache.get(token_key)
+            if token is not None:
+                local_cache.set(token_key, token)
+
+        if token is None:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            user = token.user
+            self._store(user_cache_key(user.pk), self._strip(user), config['TIMEOUT'])
+            self._store(token_key, self._strip(token), config['TIMEOUT'])
+        else:
+            user = self._get_user(token.user_id, config['TIMEOUT'])
+
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        # キャッシュ上のインスタンスをリクエスト間で共有しない
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return (user, token)
+
+    def _get_user(self, user_id, timeout):
+        cache_key = user_cache_key(user_id)
+        shared_cache = get_shared_cache()
+        user = get_local_cache().get(cache_key)
+        if user is None and shared_cache is not None:
+            user = shared_cache.get(cache_key)
+            if user is not None:
+                get_local_cache().set(cache_key, user)
+        if user is None:
+            user = get_user_model().objects.filter(pk=user_id).first()
+            if user is not None:
+                self._store(cache_key, self._strip(user), timeout)
+        return user
+
+    def _store(self, cache_key, value, timeout):
+        shared_cache = get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.set(cache_key, value, timeout)
+        get_local_cache().set(cache_key, value)
+
+    def _strip(self, instance):
+        # 関連オブジェクトのキャッシュはスナップショットに含めない
+        instance = copy.copy(instance)
+        instance._state.fields_cache = {}
+        # パスワードのハッシュは遅延読み込みのフィールドにしてキャッシュに残さない（save() でも上書きしない）
+        instance.__dict__.pop('password', None)
+        return instance
+
+
+@receiver(setting_changed)
+def reset_local_cache(*, setting, **kwargs):
+    global _local_cache
+    if setting in ('TOKEN_AUTH_CACHE', 'CACHES'):
+        _local_cache = None
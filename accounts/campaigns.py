@@ -0,0 +1,123 @@
+"""
+ポイント一括付与キャンペーンの実行エンジン
+
+対象ユーザーをID順にチャンク単位で処理し、各チャンクの付与と進捗（処理済みユーザーID）を
+同じトランザクションで記録する。途中で停止しても再実行すれば続きから再開され、
+同じユーザーに二重付与されることはない。
+
+実行は status を条件にした UPDATE でキャンペーンを確保してから行い、進捗は前回記録した
+処理済みユーザーIDを条件に進めるため、複数のプロセスが同じキャンペーンを同時に実行しても
+後から確保しようとした側・進捗を先に進められた側のチャンクはロールバックされる。
+"""
+
+import bisect
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+
+from .models import PointCampaign
+from .points import award_chunk
+
+# APIから指定できる対象ユーザー条件
+ALLOWED_USER_FILTERS = {
+    'is_active', 'is_premium', 'notification_enabled',
+    'date_joined__gte', 'date_joined__lt', 'last_login__gte', 'last_login__lt',
+    'points__gte', 'points__lt', 'answers_count__gte', 'questions_count__gte',
+}
+
+
+class CampaignBusy(Exception):
+    """キャンペーンを他のプロセスが実行中（または実行済み）"""
+
+
+def read_user_ids(path):
+    """1行に1つユーザーIDが書かれたファイルを読み込み、昇順のリストを返す"""
+    with open(path, encoding='utf-8') as f:
+        return sorted({int(line) for line in f if line.strip()})
+
+
+def _next_chunk(campaign, users, file_ids, chunk_size):
+    """
+    処理済みユーザーIDより後ろの対象ユーザーを最大chunk_size件取得し、
+    (付与対象のユーザーID, 進捗として記録するユーザーID) を返す
+    """
+    if file_ids is None:
+        user_ids = list(
+            users.filter(pk__gt=campaign.last_user_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        return user_ids, (user_ids[-1] if user_ids else None)
+    
+    start = bisect.bisect_right(file_ids, campaign.last_user_id)
+    candidates = file_ids[start:start + chunk_size]
+    if not candidates:
+        return [], None
+    
+    # ファイル内の存在しないユーザー・条件外のユーザーは除外しつつ、進捗はファイル上の位置で進める
+    user_ids = list(users.filter(pk__in=candidates).order_by('pk').values_list('pk', flat=True))
+    return user_ids, candidates[-1]
+
+
+def run_campaign(campaign, chunk_size=5000, progress=None, force=False):
+    """
+    キャンペーンを最後まで実行して付与人数を返す
+
+    progress にはチャンクごとに (campaign, 今回の付与人数, 経過秒数) が渡される。
+    実行待ち・失敗のキャンペーンのみ実行し、他のプロセスが実行中の場合は CampaignBusy を送出する。
+    force=True は実行中のまま停止したプロセスのキャンペーンを引き継ぐ（他のプロセスが動いていないことを確認して使う）。
+    """
+    User = get_user_model()
+    users = User.objects.filter(**campaign.user_filter)
+    file_ids = read_user_ids(campaign.ids_file) if campaign.ids_file else None
+    
+    statuses = ('pending', 'failed', 'running') if force else ('pending', 'failed')
+    claimed = PointCampaign.objects.filter(pk=campaign.pk, status__in=statuses).update(
+        status='running', started_at=Coalesce('started_at', Now()), updated_at=timezone.now()
+    )
+    if not claimed:
+        raise CampaignBusy(f'Campaign {campaign.pk} is already running or completed')
+    # 確保した時点の進捗から再開する
+    campaign.refresh_from_db(fields=['status', 'last_user_id', 'awarded_count', 'started_at'])
+    started = time.perf_counter()
+    awarded_total = 0
+    
+    try:
+        while True:
+            user_ids, last_user_id = _next_chunk(campaign, users, file_ids, chunk_size)
+            if last_user_id is None:
+                break
+            
+            with transaction.atomic():
+                awarded = award_chunk(user_ids, campaign.points, campaign.reason) if user_ids else 0
+                advanced = PointCampaign.objects.filter(
+                    pk=campaign.pk, status='running', last_user_id=campaign.last_user_id
+                ).update(
+                    last_user_id=last_user_id,
+                    awarded_count=F('awarded_count') + awarded,
+                    updated_at=timezone.now(),
+                )
+                if not advanced:
+                    # 他のプロセスが進捗を進めたため、このチャンクの付与をロールバックする
+                    raise CampaignBusy(f'Campaign {campaign.pk} was advanced by another process')
+            
+            campaign.last_user_id = last_user_id
+            campaign.awarded_count += awarded
+            awarded_total += awarded
+            if progress:
+                progress(campaign, awarded, time.perf_counter() - started)
+    except CampaignBusy:
+        raise
+    except Exception as e:
+        PointCampaign.objects.filter(pk=campaign.pk, status='running').update(
+            status='failed', error_message=str(e), updated_at=timezone.now()
+        )
+        raise
+    
+    PointCampaign.objects.filter(pk=campaign.pk).update(
+        status='completed', error_message='', finished_at=timezone.now(), updated_at=timezone.now()
+    )
+    campaign.refresh_from_db()
+    return awarded_total
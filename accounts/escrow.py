@@ -0,0 +1,132 @@
+"""
+質問の報酬ポイントの預かり
+
+質問の投稿時に報酬ポイントを残高から差し引いて PointEscrow に預け、次のいずれかで精算する。
+
+- ベストアンサーの選出: release() で支払い待ち（releasing）にし、settle_escrows ジョブがまとめて回答者に支払う
+- 質問の期限切れ: settle_expired() で質問者に返還するか没収する（answers.expiry）
+- 質問の削除: refund() で質問者に返還する
+
+預かり導入前の質問の預かり（funded=False）はポイントを差し引いていないため、返還の代わりに没収する。
+
+差し引きは台帳（accounts.points.spend_points）の条件付き UPDATE で行い、残高が足りなければ質問の作成ごとロールバックする。
+預かりの状態の変更はすべて status を条件にした UPDATE で行うため、選出と期限切れが同時に起きても二重に精算されない。
+支払いと返還はバッチ内のユーザーごとに合算し、ユーザーの行の更新はポイント数ごとに1回の UPDATE で済ませる。
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from jobs.queue import job
+from .models import PointEscrow
+from .points import credit_chunk, spend_points
+
+
+class InsufficientPoints(Exception):
+    """報酬ポイントに対して残高が足りない"""
+
+
+def hold(question):
+    """
+    質問の報酬ポイントを差し引いて預かり、作成した PointEscrow を返す（報酬が0の場合はNone）
+
+    質問の作成と同じトランザクション内で呼び出すこと。残高が足りない場合は InsufficientPoints を送出する。
+    """
+    if not question.reward_points:
+        return None
+    if spend_points(question.user_id, question.reward_points, f"質問の報酬ポイント預け入れ: {question.title}") is None:
+        raise InsufficientPoints(question.reward_points)
+    return PointEscrow.objects.create(question=question, user_id=question.user_id, points=question.reward_points)
+
+
+def release(question_id, recipient_id):
+    """
+    預かり中の報酬ポイントを回答者への支払い待ちにして支払いジョブを追加し、支払いを予約したかを返す
+
+    すでに精算済み・精算中の場合は何もしない（ベストアンサーを選び直しても二重に支払わない）。
+    """
+    released = PointEscrow.objects.filter(question_id=question_id, status='held').update(
+        status='releasing', recipient_id=recipient_id
+    )
+    if released:
+        settle_escrows.enqueue()
+    return bool(released)
+
+
+def refund(question_id):
+    """
+    預かり中の報酬ポイントを質問者に返還し、返還したポイント数を返す
+
+    差し引いていない預かり（funded=False）は返還せずに没収する。
+    """
+    with transaction.atomic():
+        escrow = (
+            PointEscrow.objects.select_for_update().filter(question_id=question_id, status='held')
+            .values_list('pk', 'user_id', 'points', 'funded').first()
+        )
+        if escrow is None:
+            return 0
+        pk, user_id, points, funded = escrow
+        if not funded:
+            PointEscrow.objects.filter(pk=pk).update(status='forfeited', settled_at=timezone.now())
+            return 0
+        PointEscrow.objects.filter(pk=pk).update(status='refunded', settled_at=timezone.now())
+        credit_chunk({user_id: points}, '削除した質問の報酬ポイント返還')
+    return points
+
+
+def settle_expired(refund_question_ids, forfeit_question_ids, reason):
+    """
+    期限切れにした質問の預かりを返還・没収し、返還したポイント数を返す
+
+    呼び出し側で質問をロックしたトランザクション内で呼び出すこと。
+    """
+    now = timezone.now()
+    refunds = Counter()
+    if refund_question_ids:
+        escrows = list(
+            PointEscrow.objects.filter(question_id__in=refund_question_ids, status='held', funded=True)
+            .values_list('pk', 'user_id', 'points')
+        )
+        PointEscrow.objects.filter(pk__in=[pk for pk, _, _ in escrows]).update(status='refunded', settled_at=now)
+        for _, user_id, points in escrows:
+            refunds[user_id] += points
+        credit_chunk(refunds, reason)
+    # 返還の対象でも差し引いていない預かり（funded=False）は預かり中のまま残るため、ここで没収する
+    forfeit_question_ids = [*forfeit_question_ids, *refund_question_ids]
+    if forfeit_question_ids:
+        PointEscrow.objects.filter(question_id__in=forfeit_question_ids, status='held').update(
+            status='forfeited', settled_at=now
+        )
+    return sum(refunds.values())
+
+
+def settle_releasing(batch_size=500):
+    """支払い待ちの預かりを古い順に最大 batch_size 件まとめて回答者に支払い、支払った件数を返す"""
+    with transaction.atomic():
+        escrows = list(
+            PointEscrow.objects.filter(status='releasing')
+            .select_for_update(skip_locked=True).order_by('pk')
+            .values_list('pk', 'recipient_id', 'points')[:batch_size]
+        )
+        if not escrows:
+            return 0
+        payouts = Counter()
+        for _, recipient_id, points in escrows:
+            # 支払い待ちの間に回答者が退会した場合は支払わない
+            if recipient_id is not None:
+                payouts[recipient_id] += points
+        credit_chunk(payouts, 'ベストアンサー報酬', earned=True)
+        PointEscrow.objects.filter(pk__in=[pk for pk, _, _ in escrows]).update(
+            status='released', settled_at=timezone.now()
+        )
+    return len(escrows)
+
+
+@job(priority=10, unique=True, atomic=False)
+def settle_escrows(batch_size=500):
+    """支払い待ちがなくなるまでバッチ単位で支払う（バッチごとにコミットする）"""
+    while settle_releasing(batch_size):
+        pass
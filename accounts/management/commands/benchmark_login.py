@@ -0,0 +1,86 @@
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from oshare_style_answers.log_handlers import QueuedHandler
+from oshare_style_answers.metrics import get_latency_histogram, reset_latencies
+
+
+@contextmanager
+def synchronous_logging(logger_name):
+    """QueuedHandler を出力先ハンドラーに差し替えて、同期書き込みの場合と比較する"""
+    logger = logging.getLogger(logger_name)
+    original = list(logger.handlers)
+    replaced = []
+    for handler in original:
+        if isinstance(handler, QueuedHandler):
+            target = handler.target
+            target.setFormatter(handler.formatter)
+            for log_filter in handler.filters:
+                target.addFilter(log_filter)
+            replaced.append(target)
+        else:
+            replaced.append(handler)
+    logger.handlers = replaced
+    try:
+        yield
+    finally:
+        logger.handlers = original
+        for handler in original:
+            if isinstance(handler, QueuedHandler):
+                handler.target.setFormatter(None)
+                handler.target.filters = []
+
+
+class Command(BaseCommand):
+    help = 'ログインAPIのスループットとレイテンシを計測します（作成したデータはロールバック）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=1000, help='ログイン回数')
+        parser.add_argument('--sync-logging', action='store_true', help='ログを同期的に書き込んで比較する')
+        parser.add_argument(
+            '--real-hasher', action='store_true',
+            help='本番と同じパスワードハッシュを使う（既定はハッシュ計算を除くため MD5 を使用）'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        client = Client(HTTP_HOST='localhost')
+        payload = {'username': 'bench-login', 'password': 'bench-password'}
+        
+        with ExitStack() as stack:
+            if not options['real_hasher']:
+                stack.enter_context(override_settings(
+                    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher']
+                ))
+            if options['sync_logging']:
+                stack.enter_context(synchronous_logging('accounts'))
+            
+            with transaction.atomic():
+                User.objects.create_user(**payload)
+                reset_latencies()
+                
+                started = time.perf_counter()
+                for _ in range(options['logins']):
+                    response = client.post('/api/accounts/login/', payload, content_type='application/json')
+                    if response.status_code != 200:
+                        self.stderr.write(f'Login failed: {response.status_code}')
+                        break
+                elapsed = time.perf_counter() - started
+                
+                transaction.set_rollback(True)
+        
+        histogram = get_latency_histogram('accounts.login').snapshot()
+        mode = 'synchronous' if options['sync_logging'] else 'queued'
+        self.stdout.write(f'Logins:     {histogram["count"]} ({mode} logging)')
+        self.stdout.write(f'Elapsed:    {elapsed:.2f}s')
+        self.stdout.write(f'Throughput: {histogram["count"] / elapsed:.1f} logins/s')
+        self.stdout.write(
+            f'Latency:    p50<={histogram["p50"]}s p95<={histogram["p95"]}s p99<={histogram["p99"]}s '
+            f'mean={histogram["sum"] / max(histogram["count"], 1) * 1000:.2f}ms'
+        )
@@ -0,0 +1,69 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from accounts.authentication import CachedTokenAuthentication, get_local_cache
+
+
+class Command(BaseCommand):
+    help = 'トークン認証のオーバーヘッドを TokenAuthentication と CachedTokenAuthentication で比較します（作成したデータはロールバック）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10000, help='認証するリクエスト数')
+        parser.add_argument('--users', type=int, default=100, help='トークンを発行するユーザー数')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        factory = APIRequestFactory()
+        
+        with transaction.atomic():
+            tokens = []
+            for index in range(options['users']):
+                user = User.objects.create_user(username=f'bench-auth-{index}', password=None)
+                tokens.append(Token.objects.create(user=user).key)
+            
+            for authentication_class in (TokenAuthentication, CachedTokenAuthentication):
+                cache.clear()
+                get_local_cache().clear()
+                view = self._view(authentication_class)
+                
+                queries = []
+                
+                def count_query(execute, sql, params, many, context):
+                    queries.append(sql)
+                    return execute(sql, params, many, context)
+                
+                started = time.perf_counter()
+                with connection.execute_wrapper(count_query):
+                    for index in range(options['requests']):
+                        key = tokens[index % len(tokens)]
+                        request = factory.get('/bench/', HTTP_AUTHORIZATION=f'Token {key}')
+                        view(request)
+                elapsed = time.perf_counter() - started
+                
+                self.stdout.write(
+                    f'{authentication_class.__name__:28} '
+                    f'{elapsed:.2f}s  {options["requests"] / elapsed:.0f} req/s  '
+                    f'{elapsed / options["requests"] * 1e6:.0f}us/req  queries={len(queries)}'
+                )
+            
+            transaction.set_rollback(True)
+    
+    def _view(self, authentication_class):
+        class BenchmarkView(APIView):
+            authentication_classes = [authentication_class]
+            permission_classes = [IsAuthenticated]
+            
+            def get(self, request):
+                return Response({'id': request.user.pk})
+        
+        return BenchmarkView.as_view()
@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.campaigns import CampaignBusy, run_campaign
+from accounts.models import PointCampaign
+
+
+class Command(BaseCommand):
+    help = 'ポイント一括付与キャンペーンを実行します（中断したキャンペーンは続きから再開）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, help='実行・再開するキャンペーンID')
+        parser.add_argument('--pending', action='store_true', help='実行待ちのキャンペーンをすべて実行する')
+        parser.add_argument('--name', help='新規キャンペーン名')
+        parser.add_argument('--points', type=int, help='付与ポイント')
+        parser.add_argument('--reason', help='ポイント履歴に記録する理由')
+        parser.add_argument('--active-only', action='store_true', help='有効なユーザーのみを対象にする')
+        parser.add_argument('--ids-file', help='対象ユーザーIDを1行ずつ記載したファイル')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='1トランザクションで処理するユーザー数')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='実行中のまま停止したキャンペーンを引き継ぐ（他のプロセスが実行していないことを確認して使う）'
+        )
+
+    def handle(self, *args, **options):
+        if options['campaign']:
+            campaigns = list(PointCampaign.objects.filter(pk=options['campaign']))
+            if not campaigns:
+                raise CommandError(f'Campaign {options["campaign"]} does not exist')
+        elif options['pending']:
+            campaigns = list(PointCampaign.objects.filter(status='pending').order_by('created_at'))
+        else:
+            if not (options['name'] and options['points']):
+                raise CommandError('--campaign, --pending, or --name and --points are required')
+            campaigns = [PointCampaign.objects.create(
+                name=options['name'],
+                points=options['points'],
+                reason=options['reason'] or options['name'],
+                user_filter={'is_active': True} if options['active_only'] else {},
+                ids_file=options['ids_file'] or '',
+            )]
+        
+        for campaign in campaigns:
+            self.stdout.write(f'Running campaign {campaign.pk}: {campaign} (resume after user {campaign.last_user_id})')
+            try:
+                awarded = run_campaign(
+                    campaign, chunk_size=options['chunk_size'], progress=self._progress, force=options['force']
+                )
+            except CampaignBusy as e:
+                if options['campaign']:
+                    raise CommandError(str(e))
+                # --pending では他のプロセスが先に確保したキャンペーンを飛ばす
+                self.stdout.write(self.style.WARNING(f'Skipped: {e}'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'Campaign {campaign.pk} completed: awarded {awarded} users in this run '
+                f'({campaign.awarded_count} total)'
+            ))
+
+    def _progress(self, campaign, awarded, elapsed):
+        rate = campaign.awarded_count / elapsed if elapsed else 0
+        self.stdout.write(
+            f'  awarded={campaign.awarded_count} last_user_id={campaign.last_user_id} '
+            f'chunk={awarded} rate={rate:,.0f} rows/s'
+        )
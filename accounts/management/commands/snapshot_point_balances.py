@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from accounts.points import take_balance_snapshots
+
+
+class Command(BaseCommand):
+    help = 'ポイント残高スナップショットを更新します（cron等で定期実行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--settle-seconds', type=int, default=5, help='直近この秒数以内の履歴は次回に回す')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = take_balance_snapshots(
+            settle_seconds=options['settle_seconds'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated {updated} point balance snapshots')
+        )
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PointBalanceSnapshot",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("balance", models.PositiveIntegerField(default=0, verbose_name="残高")),
+                ("entries_count", models.PositiveIntegerField(default=0, verbose_name="履歴件数")),
+                ("last_entry_id", models.PositiveBigIntegerField(default=0, verbose_name="最終履歴ID")),
+                ("taken_at", models.DateTimeField(auto_now=True, verbose_name="取得日時")),
+                ("user", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="point_snapshot", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "verbose_name": "ポイント残高スナップショット",
+                "verbose_name_plural": "ポイント残高スナップショット",
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_point_balance_snapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PointCampaign",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=100, verbose_name="キャンペーン名")),
+                ("points", models.PositiveIntegerField(verbose_name="付与ポイント")),
+                ("reason", models.CharField(max_length=200, verbose_name="理由")),
+                ("user_filter", models.JSONField(blank=True, default=dict, verbose_name="対象ユーザー条件")),
+                ("ids_file", models.CharField(blank=True, max_length=255, verbose_name="ユーザーIDファイル")),
+                ("status", models.CharField(choices=[("pending", "実行待ち"), ("running", "実行中"), ("completed", "完了"), ("failed", "失敗")], default="pending", max_length=10, verbose_name="ステータス")),
+                ("last_user_id", models.PositiveBigIntegerField(default=0, verbose_name="処理済みユーザーID")),
+                ("awarded_count", models.PositiveIntegerField(default=0, verbose_name="付与済み人数")),
+                ("error_message", models.TextField(blank=True, verbose_name="エラー内容")),
+                ("started_at", models.DateTimeField(blank=True, null=True, verbose_name="開始日時")),
+                ("finished_at", models.DateTimeField(blank=True, null=True, verbose_name="終了日時")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="作成日時")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新日時")),
+                ("created_by", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "verbose_name": "ポイントキャンペーン",
+                "verbose_name_plural": "ポイントキャンペーン",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
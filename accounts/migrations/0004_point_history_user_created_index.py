@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_point_campaign"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pointhistory",
+            index=models.Index(fields=["user", "-created_at"], name="point_history_user_created_idx"),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_point_history_user_created_index'),
+        ('answers', '0002_add_recommended_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread_count', models.PositiveIntegerField(default=0, verbose_name='未読数')),
+            ],
+            options={
+                'verbose_name': '未読通知数',
+                'verbose_name_plural': '未読通知数',
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('answer_created', '回答の投稿'), ('best_answer', 'ベストアンサーの選出')], max_length=20, verbose_name='種類')),
+                ('data', models.JSONField(blank=True, default=dict, verbose_name='表示データ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True, verbose_name='配信日時')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('answer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='answers.answer')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='answers.question')),
+            ],
+            options={
+                'verbose_name': '通知イベント',
+                'verbose_name_plural': '通知イベント',
+            },
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'あなたの質問への回答'), (2, 'ベストアンサーに選出'), (3, '回答した質問の解決')], verbose_name='種類')),
+                ('is_read', models.BooleanField(default=False, verbose_name='既読')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='accounts.notificationevent')),
+            ],
+            options={
+                'verbose_name': '通知',
+                'verbose_name_plural': '通知',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notificationevent',
+            index=models.Index(condition=models.Q(('delivered_at__isnull', True)), fields=['id'], name='notification_event_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-id'], name='notification_user_id_idx'),
+        ),
+    ]
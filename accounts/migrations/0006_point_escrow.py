@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:09
+
+from itertools import islice
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def escrow_open_questions(apps, schema_editor):
+    """
+    受付中の質問の預かりを作成する
+
+    移行前の質問は投稿時にポイントを差し引いていないため funded=False とし、
+    ベストアンサーへの支払いはこれまで通り行うが、期限切れ・削除では返還せずに没収する。
+    """
+    Question = apps.get_model('answers', 'Question')
+    PointEscrow = apps.get_model('accounts', 'PointEscrow')
+    questions = (
+        Question.objects.filter(status='open', reward_points__gt=0)
+        .values_list('pk', 'user_id', 'reward_points').order_by().iterator(chunk_size=2000)
+    )
+    while chunk := list(islice(questions, 2000)):
+        PointEscrow.objects.bulk_create([
+            PointEscrow(question_id=question_id, user_id=user_id, points=points, funded=False)
+            for question_id, user_id, points in chunk
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_notifications'),
+        ('answers', '0003_question_open_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointEscrow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.PositiveIntegerField(verbose_name='預かりポイント')),
+                ('funded', models.BooleanField(default=True, verbose_name='差し引き済み')),
+                ('status', models.CharField(choices=[('held', '預かり中'), ('releasing', '支払い待ち'), ('released', '支払い済み'), ('refunded', '返還済み'), ('forfeited', '没収')], default='held', max_length=10, verbose_name='状態')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('settled_at', models.DateTimeField(blank=True, null=True, verbose_name='精算日時')),
+                ('question', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='escrow', to='answers.question')),
+                ('recipient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='支払先')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='point_escrows', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'ポイント預かり',
+                'verbose_name_plural': 'ポイント預かり',
+                'indexes': [models.Index(condition=models.Q(('status', 'releasing')), fields=['id'], name='point_escrow_releasing_idx')],
+            },
+        ),
+        migrations.RunPython(escrow_open_questions, migrations.RunPython.noop),
+    ]
@@ -36,33 +36,22 @@ class CustomUser(AbstractUser):
     
     def add_points(self, points, reason=""):
         """ポイントを追加"""
-        self.points += points
-        self.total_earned_points += points
-        self.save()
+        from .points import award_points
         
-        # ポイント履歴を記録
-        PointHistory.objects.create(
-            user=self,
-            points=points,
-            reason=reason,
-            balance_after=self.points
-        )
+        history = award_points(self, points, reason)
+        self.points = history.balance_after
+        self.total_earned_points += points
+        return history
     
     def subtract_points(self, points, reason=""):
         """ポイントを減算"""
-        if self.points >= points:
-            self.points -= points
-            self.save()
-            
-            # ポイント履歴を記録
-            PointHistory.objects.create(
-                user=self,
-                points=-points,
-                reason=reason,
-                balance_after=self.points
-            )
-            return True
-        return False
+        from .points import spend_points
+        
+        history = spend_points(self, points, reason)
+        if history is None:
+            return False
+        self.points = history.balance_after
+        return True
 
 
 class PointHistory(models.Model):
@@ -77,11 +66,68 @@ class PointHistory(models.Model):
         verbose_name = 'ポイント履歴'
         verbose_name_plural = 'ポイント履歴'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='point_history_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username}: {self.points}pt ({self.reason})"
 
 
+class PointBalanceSnapshot(models.Model):
+    """ポイント残高スナップショット（snapshot_point_balancesコマンドで定期更新）"""
+    user = models.OneToOneField('CustomUser', on_delete=models.CASCADE, related_name='point_snapshot')
+    balance = models.PositiveIntegerField('残高', default=0)
+    entries_count = models.PositiveIntegerField('履歴件数', default=0)
+    last_entry_id = models.PositiveBigIntegerField('最終履歴ID', default=0)
+    taken_at = models.DateTimeField('取得日時', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'ポイント残高スナップショット'
+        verbose_name_plural = 'ポイント残高スナップショット'
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.balance}pt ({self.entries_count}件)"
+
+
+class PointCampaign(models.Model):
+    """ポイント一括付与キャンペーン（run_point_campaignコマンドで実行）"""
+    STATUS_CHOICES = [
+        ('pending', '実行待ち'),
+        ('running', '実行中'),
+        ('completed', '完了'),
+        ('failed', '失敗'),
+    ]
+    
+    name = models.CharField('キャンペーン名', max_length=100)
+    points = models.PositiveIntegerField('付与ポイント')
+    reason = models.CharField('理由', max_length=200)
+    
+    # 対象ユーザー（CustomUserの絞り込み条件、またはユーザーIDを1行ずつ記載したファイル）
+    user_filter = models.JSONField('対象ユーザー条件', default=dict, blank=True)
+    ids_file = models.CharField('ユーザーIDファイル', max_length=255, blank=True)
+    
+    # 進捗（チャンクごとに付与と同じトランザクションで更新）
+    status = models.CharField('ステータス', max_length=10, choices=STATUS_CHOICES, default='pending')
+    last_user_id = models.PositiveBigIntegerField('処理済みユーザーID', default=0)
+    awarded_count = models.PositiveIntegerField('付与済み人数', default=0)
+    error_message = models.TextField('エラー内容', blank=True)
+    
+    created_by = models.ForeignKey('CustomUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    started_at = models.DateTimeField('開始日時', null=True, blank=True)
+    finished_at = models.DateTimeField('終了日時', null=True, blank=True)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    updated_at = models.DateTimeField('更新日時', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'ポイントキャンペーン'
+        verbose_name_plural = 'ポイントキャンペーン'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.name} ({self.points}pt)"
+
+
 class UserRecommendation(models.Model):
     """ユーザーおすすめ商品"""
     user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='recommendations')
@@ -134,3 +180,114 @@ class UserPreference(models.Model):
     
     def __str__(self):
         return f"{self.user.username}の好み設定"
+
+
+class NotificationEvent(models.Model):
+    """通知イベント（書き込みと同じトランザクションで追加し、deliver_notifications ジョブで一括配信）"""
+    KIND_CHOICES = [
+        ('answer_created', '回答の投稿'),
+        ('best_answer', 'ベストアンサーの選出'),
+    ]
+    
+    kind = models.CharField('種類', max_length=20, choices=KIND_CHOICES)
+    question = models.ForeignKey('answers.Question', on_delete=models.CASCADE, related_name='+')
+    answer = models.ForeignKey('answers.Answer', on_delete=models.CASCADE, related_name='+')
+    # イベントを起こしたユーザー（本人には通知しない）
+    actor = models.ForeignKey('CustomUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # 通知の表示に使う値（質問タイトル・ポイントなど）。配信先の通知はこの行を参照する
+    data = models.JSONField('表示データ', default=dict, blank=True)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    delivered_at = models.DateTimeField('配信日時', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = '通知イベント'
+        verbose_name_plural = '通知イベント'
+        indexes = [
+            # 配信待ちのイベントだけを古い順に取り出す
+            models.Index(
+                fields=['id'], condition=models.Q(delivered_at__isnull=True), name='notification_event_pending_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()}: {self.data.get('title', '')}"
+
+
+class Notification(models.Model):
+    """ユーザーごとの通知（表示内容はイベント側に持ち、1通知1行を小さく保つ）"""
+    KIND_ANSWER = 1
+    KIND_BEST_ANSWER = 2
+    KIND_QUESTION_CLOSED = 3
+    KIND_CHOICES = [
+        (KIND_ANSWER, 'あなたの質問への回答'),
+        (KIND_BEST_ANSWER, 'ベストアンサーに選出'),
+        (KIND_QUESTION_CLOSED, '回答した質問の解決'),
+    ]
+    
+    user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='notifications')
+    event = models.ForeignKey('NotificationEvent', on_delete=models.CASCADE, related_name='notifications')
+    kind = models.PositiveSmallIntegerField('種類', choices=KIND_CHOICES)
+    is_read = models.BooleanField('既読', default=False)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = '通知'
+        verbose_name_plural = '通知'
+        indexes = [
+            models.Index(fields=['user', '-id'], name='notification_user_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.get_kind_display()}"
+
+
+class NotificationCounter(models.Model):
+    """未読通知数（通知の配信・既読化と同じトランザクションで増減する）"""
+    user = models.OneToOneField(
+        'CustomUser', on_delete=models.CASCADE, primary_key=True, related_name='notification_counter'
+    )
+    unread_count = models.PositiveIntegerField('未読数', default=0)
+    
+    class Meta:
+        verbose_name = '未読通知数'
+        verbose_name_plural = '未読通知数'
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.unread_count}"
+
+
+class PointEscrow(models.Model):
+    """質問の報酬ポイントの預かり（質問の投稿時に差し引き、ベストアンサーへの支払いか返還・没収で精算する）"""
+    STATUS_CHOICES = [
+        ('held', '預かり中'),
+        ('releasing', '支払い待ち'),
+        ('released', '支払い済み'),
+        ('refunded', '返還済み'),
+        ('forfeited', '没収'),
+    ]
+    
+    # 質問が削除されても精算の記録は残す
+    question = models.OneToOneField(
+        'answers.Question', on_delete=models.SET_NULL, null=True, blank=True, related_name='escrow'
+    )
+    user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='point_escrows')
+    points = models.PositiveIntegerField('預かりポイント')
+    # 預かり導入前の質問は投稿時に差し引いていないため、返還せずに没収する（ベストアンサーへの支払いは行う）
+    funded = models.BooleanField('差し引き済み', default=True)
+    status = models.CharField('状態', max_length=10, choices=STATUS_CHOICES, default='held')
+    recipient = models.ForeignKey(
+        'CustomUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='支払先'
+    )
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    settled_at = models.DateTimeField('精算日時', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'ポイント預かり'
+        verbose_name_plural = 'ポイント預かり'
+        indexes = [
+            # 支払い待ちだけを古い順に取り出す（settle_escrows）
+            models.Index(fields=['id'], condition=models.Q(status='releasing'), name='point_escrow_releasing_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.points}pt ({self.get_status_display()})"
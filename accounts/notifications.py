@@ -0,0 +1,163 @@
+"""
+通知の配信
+
+書き込み側は NotificationEvent を同じトランザクションで1行追加して配信ジョブを予約するだけにし（enqueue_*）、
+配信先の決定と Notification の作成はジョブのワーカーがまとめて行う（deliver_notifications）。
+配信ジョブは実行待ちが1つにまとめられるため、イベントが続けて追加されても1回の実行でバッチ単位に配信する。
+
+- 回答の投稿: 質問者に「あなたの質問への回答」
+- ベストアンサーの選出: 選ばれた回答者に「ベストアンサーに選出」、ほかの回答者に「回答した質問の解決」
+
+イベントを起こした本人と、通知設定（CustomUser.notification_enabled）をオフにしているユーザーには作成しない。
+配信先はイベントのバッチごとに数回のクエリで決定し、通知は bulk_create で追加する。
+未読数は NotificationCounter に保持し、通知の追加・既読化と同じトランザクションで増減するため、
+未読数の取得は通知を数えずに1行を読むだけで済む。
+"""
+
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from jobs.queue import job
+from .models import Notification, NotificationCounter, NotificationEvent
+
+
+def enqueue_answer_created(answer):
+    """回答の投稿を通知イベントとして追加する"""
+    question = answer.question
+    event = NotificationEvent.objects.create(
+        kind='answer_created', question_id=question.pk, answer_id=answer.pk, actor_id=answer.user_id,
+        data={'title': question.title},
+    )
+    deliver_notifications.enqueue()
+    return event
+
+
+def enqueue_best_answer(question, answer_id):
+    """ベストアンサーの選出を通知イベントとして追加する（question は user_id・title・reward_points を持つこと）"""
+    event = NotificationEvent.objects.create(
+        kind='best_answer', question_id=question.pk, answer_id=answer_id, actor_id=question.user_id,
+        data={'title': question.title, 'points': question.reward_points},
+    )
+    deliver_notifications.enqueue()
+    return event
+
+
+def _recipients(events):
+    """イベントごとの配信先 [(ユーザーID, 通知の種類), ...] を返す"""
+    from answers.models import Answer, Question
+
+    recipients = defaultdict(list)
+    by_kind = defaultdict(list)
+    for event in events:
+        by_kind[event.kind].append(event)
+
+    if by_kind['answer_created']:
+        owners = dict(
+            Question.objects.filter(pk__in={event.question_id for event in by_kind['answer_created']})
+            .values_list('pk', 'user_id')
+        )
+        for event in by_kind['answer_created']:
+            recipients[event.pk].append((owners.get(event.question_id), Notification.KIND_ANSWER))
+
+    if by_kind['best_answer']:
+        answerers = defaultdict(dict)
+        for question_id, answer_id, user_id in (
+            Answer.objects.filter(question_id__in={event.question_id for event in by_kind['best_answer']})
+            .values_list('question_id', 'pk', 'user_id')
+        ):
+            answerers[question_id][answer_id] = user_id
+        for event in by_kind['best_answer']:
+            answers = answerers[event.question_id]
+            best_user_id = answers.get(event.answer_id)
+            recipients[event.pk].append((best_user_id, Notification.KIND_BEST_ANSWER))
+            recipients[event.pk].extend(
+                (user_id, Notification.KIND_QUESTION_CLOSED)
+                for user_id in sorted(set(answers.values()) - {best_user_id})
+            )
+
+    return {
+        event.pk: [(user_id, kind) for user_id, kind in recipients[event.pk] if user_id and user_id != event.actor_id]
+        for event in events
+    }
+
+
+def _increment_unread(counts):
+    """{ユーザーID: 追加した未読数} を NotificationCounter に加算する"""
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_id) for user_id in counts], ignore_conflicts=True
+    )
+    # 加算する数ごとに1回のUPDATE（ほとんどのバッチでは1人1件なので1回で済む）
+    by_amount = defaultdict(list)
+    for user_id, amount in counts.items():
+        by_amount[amount].append(user_id)
+    for amount, user_ids in by_amount.items():
+        NotificationCounter.objects.filter(user_id__in=user_ids).update(unread_count=F('unread_count') + amount)
+
+
+def deliver_pending(batch_size=500):
+    """
+    配信待ちのイベントを古い順に最大 batch_size 件配信し、(配信したイベント数, 作成した通知数) を返す
+
+    通知の作成・未読数の加算・イベントの配信済み記録を1つのトランザクションで行うため、
+    途中で停止しても同じイベントが二重に配信されることはない。
+    PostgreSQL では SKIP LOCKED で取り出すため、複数のワーカーを同時に動かせる。
+    """
+    User = get_user_model()
+
+    with transaction.atomic():
+        events = list(
+            NotificationEvent.objects.filter(delivered_at__isnull=True)
+            .select_for_update(skip_locked=True).order_by('pk')[:batch_size]
+        )
+        if not events:
+            return 0, 0
+
+        recipients = _recipients(events)
+        enabled = set(
+            User.objects.filter(
+                pk__in={user_id for targets in recipients.values() for user_id, kind in targets},
+                is_active=True, notification_enabled=True,
+            ).values_list('pk', flat=True)
+        )
+        notifications = Notification.objects.bulk_create([
+            Notification(user_id=user_id, event_id=event.pk, kind=kind)
+            for event in events
+            for user_id, kind in recipients[event.pk]
+            if user_id in enabled
+        ], batch_size=1000)
+
+        if notifications:
+            _increment_unread(Counter(notification.user_id for notification in notifications))
+        NotificationEvent.objects.filter(pk__in=[event.pk for event in events]).update(delivered_at=timezone.now())
+
+    return len(events), len(notifications)
+
+
+@job(priority=5, unique=True, atomic=False)
+def deliver_notifications(batch_size=500):
+    """配信待ちのイベントがなくなるまでバッチ単位で配信する（バッチごとにコミットする）"""
+    while deliver_pending(batch_size)[0]:
+        pass
+
+
+def unread_count(user):
+    return NotificationCounter.objects.filter(user=user).values_list('unread_count', flat=True).first() or 0
+
+
+def mark_read(user, ids=None):
+    """通知を既読にして既読にした件数を返す（ids を省略するとすべて）"""
+    with transaction.atomic():
+        notifications = Notification.objects.filter(user=user, is_read=False)
+        if ids is not None:
+            notifications = notifications.filter(pk__in=ids)
+        updated = notifications.update(is_read=True)
+        if updated:
+            NotificationCounter.objects.filter(user=user).update(
+                unread_count=Greatest(F('unread_count') - updated, 0)
+            )
+    return updated
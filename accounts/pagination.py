@@ -0,0 +1,38 @@
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from .notifications import unread_count
+from .points import point_history_count
+
+
+class PointHistoryPagination(CursorPagination):
+    """ポイント履歴用カーソルページネーション（総件数は残高スナップショットから算出）"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    # 同じ時刻の履歴を取りこぼさないよう id で順序を確定させる
+    ordering = ('-created_at', '-id')
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'count': point_history_count(self.request.user),
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class NotificationPagination(CursorPagination):
+    """通知用カーソルページネーション（総件数の代わりに未読数を返す）"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'unread_count': unread_count(self.request.user),
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,233 @@
+"""
+ポイント台帳
+
+ポイント残高の変更は必ずこのモジュールを経由する。
+残高は条件付きの F() UPDATE で更新し、同じトランザクション内で PointHistory を追記するため、
+同時にポイントが付与・消費されても残高と履歴が食い違わない。
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth
+from django.utils import timezone
+
+from .authentication import invalidate_users
+from .models import PointBalanceSnapshot, PointHistory
+
+
+def _user_id(user):
+    return getattr(user, 'pk', user)
+
+
+def award_points(user, points, reason=''):
+    """ポイントを付与して作成した PointHistory を返す"""
+    User = get_user_model()
+    user_id = _user_id(user)
+    
+    with transaction.atomic():
+        updated = User.objects.filter(pk=user_id).update(
+            points=F('points') + points,
+            total_earned_points=F('total_earned_points') + points,
+        )
+        if not updated:
+            raise User.DoesNotExist(f'User {user_id} does not exist')
+        invalidate_users([user_id])
+        
+        balance = User.objects.filter(pk=user_id).values_list('points', flat=True).get()
+        return PointHistory.objects.create(
+            user_id=user_id, points=points, reason=reason, balance_after=balance
+        )
+
+
+def spend_points(user, points, reason=''):
+    """残高が足りる場合のみポイントを消費して PointHistory を返す（不足時はNone）"""
+    User = get_user_model()
+    user_id = _user_id(user)
+    
+    with transaction.atomic():
+        updated = User.objects.filter(pk=user_id, points__gte=points).update(
+            points=F('points') - points
+        )
+        if not updated:
+            return None
+        invalidate_users([user_id])
+        
+        balance = User.objects.filter(pk=user_id).values_list('points', flat=True).get()
+        return PointHistory.objects.create(
+            user_id=user_id, points=-points, reason=reason, balance_after=balance
+        )
+
+
+def award_chunk(user_ids, points, reason=''):
+    """
+    ユーザーIDのチャンクに一括でポイントを付与し、付与した人数を返す
+
+    残高は1回のUPDATEで加算し、履歴は bulk_create で追記する。
+    呼び出し側のトランザクション内で実行すること。
+    """
+    User = get_user_model()
+    User.objects.filter(pk__in=user_ids).update(
+        points=F('points') + points,
+        total_earned_points=F('total_earned_points') + points,
+    )
+    invalidate_users(user_ids)
+    balances = User.objects.filter(pk__in=user_ids).values_list('pk', 'points')
+    histories = PointHistory.objects.bulk_create([
+        PointHistory(user_id=user_id, points=points, reason=reason, balance_after=balance)
+        for user_id, balance in balances
+    ], batch_size=1000)
+    return len(histories)
+
+
+def credit_chunk(amounts, reason='', earned=False):
+    """
+    {ユーザーID: ポイント} をまとめて加算し、加算した人数を返す
+
+    earned=False（預かりポイントの返還など）は累計獲得ポイントを増やさない。
+    残高は加算するポイント数ごとに1回のUPDATEで加算し、履歴は bulk_create で追記する。
+    呼び出し側のトランザクション内で実行すること。
+    """
+    User = get_user_model()
+    by_points = defaultdict(list)
+    for user_id, points in amounts.items():
+        if points:
+            by_points[points].append(user_id)
+    if not by_points:
+        return 0
+    
+    for points, user_ids in by_points.items():
+        changes = {'points': F('points') + points}
+        if earned:
+            changes['total_earned_points'] = F('total_earned_points') + points
+        User.objects.filter(pk__in=user_ids).update(**changes)
+    user_ids = [user_id for user_ids in by_points.values() for user_id in user_ids]
+    invalidate_users(user_ids)
+    balances = User.objects.filter(pk__in=user_ids).values_list('pk', 'points')
+    histories = PointHistory.objects.bulk_create([
+        PointHistory(user_id=user_id, points=amounts[user_id], reason=reason, balance_after=balance)
+        for user_id, balance in balances
+    ], batch_size=1000)
+    return len(histories)
+
+
+def bulk_award(user_ids, points, reason='', batch_size=1000):
+    """複数ユーザーにポイントを一括付与し、付与した人数を返す"""
+    user_ids = list(user_ids)
+    awarded = 0
+    
+    for start in range(0, len(user_ids), batch_size):
+        with transaction.atomic():
+            awarded += award_chunk(user_ids[start:start + batch_size], points, reason)
+    
+    return awarded
+
+
+def take_balance_snapshots(settle_seconds=5, batch_size=1000):
+    """
+    前回以降に追記された履歴をユーザーごとに集計してスナップショットを更新し、
+    更新したユーザー数を返す
+
+    コミット順とID順のずれで履歴を取りこぼさないよう、直近 settle_seconds 秒の履歴は次回に回す。
+    """
+    since = PointBalanceSnapshot.objects.aggregate(since=Max('last_entry_id'))['since'] or 0
+    high = PointHistory.objects.filter(
+        id__gt=since, created_at__lt=timezone.now() - timedelta(seconds=settle_seconds)
+    ).aggregate(high=Max('id'))['high']
+    if high is None:
+        return 0
+    
+    # ユーザー数が多くても全件をメモリに載せないよう、PostgreSQL ではサーバーサイドカーソルで少しずつ取得する
+    rows = (
+        PointHistory.objects.filter(id__gt=since, id__lte=high)
+        .values('user_id').annotate(entries=Count('id'), last_id=Max('id')).order_by()
+    ).iterator(chunk_size=batch_size)
+    
+    updated = 0
+    while chunk := list(islice(rows, batch_size)):
+        balances = dict(
+            PointHistory.objects.filter(id__in=[row['last_id'] for row in chunk])
+            .values_list('id', 'balance_after')
+        )
+        snapshots = PointBalanceSnapshot.objects.in_bulk(
+            [row['user_id'] for row in chunk], field_name='user_id'
+        )
+        
+        now = timezone.now()
+        created, changed = [], []
+        for row in chunk:
+            snapshot = snapshots.get(row['user_id'])
+            if snapshot is None:
+                snapshot = PointBalanceSnapshot(user_id=row['user_id'])
+                created.append(snapshot)
+            else:
+                changed.append(snapshot)
+            snapshot.balance = balances[row['last_id']]
+            snapshot.entries_count += row['entries']
+            snapshot.last_entry_id = row['last_id']
+            snapshot.taken_at = now
+        
+        with transaction.atomic():
+            PointBalanceSnapshot.objects.bulk_create(created, batch_size=batch_size)
+            PointBalanceSnapshot.objects.bulk_update(
+                changed, ['balance', 'entries_count', 'last_entry_id', 'taken_at'], batch_size=batch_size
+            )
+        updated += len(chunk)
+    
+    return updated
+
+
+def point_history_count(user):
+    """スナップショット以降の履歴だけを数えてユーザーの履歴件数を返す"""
+    snapshot = PointBalanceSnapshot.objects.filter(user=user).values_list(
+        'entries_count', 'last_entry_id'
+    ).first()
+    if snapshot is None:
+        return PointHistory.objects.filter(user=user).count()
+    
+    entries_count, last_entry_id = snapshot
+    return entries_count + PointHistory.objects.filter(user=user, id__gt=last_entry_id).count()
+
+
+PERIOD_FUNCTIONS = {
+    'day': TruncDay,
+    'month': TruncMonth,
+}
+
+
+def point_history_summary(user, group='day', limit=90):
+    """履歴を日別・月別に集計し、新しい期間から最大limit件返す"""
+    rows = list(
+        PointHistory.objects.filter(user=user)
+        .annotate(period=PERIOD_FUNCTIONS[group]('created_at'))
+        .values('period')
+        .annotate(
+            total=Sum('points'),
+            earned=Sum('points', filter=Q(points__gt=0), default=0),
+            spent=Sum('points', filter=Q(points__lt=0), default=0),
+            entries=Count('id'),
+            last_id=Max('id'),
+        )
+        .order_by('-period')[:limit]
+    )
+    
+    # 期間末の残高は各期間の最後の履歴から取得
+    balances = dict(
+        PointHistory.objects.filter(id__in=[row['last_id'] for row in rows])
+        .values_list('id', 'balance_after')
+    )
+    return [
+        {
+            'period': row['period'],
+            'total': row['total'],
+            'earned': row['earned'],
+            'spent': -row['spent'],
+            'entries': row['entries'],
+            'balance_after': balances[row['last_id']],
+        }
+        for row in rows
+    ]
@@ -1,10 +1,15 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model, authenticate
+from django.db import transaction
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.authtoken.models import Token
 from .models import (
-    PointHistory, UserRecommendation, UserPreference
+    Notification, PointHistory, PointCampaign, UserRecommendation, UserPreference
 )
+from . import escrow
+from .campaigns import ALLOWED_USER_FILTERS
+from .points import award_points
 from answers.models import Question, Answer, AnswerVote
 from items.models import Item
 
@@ -41,9 +46,15 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         validated_data.pop('password_confirm')
         try:
-            user = User.objects.create_user(**validated_data)
-            # 新規登録時にトークンを作成
-            Token.objects.create(user=user)
+            with transaction.atomic():
+                user = User.objects.create_user(**validated_data)
+                # 新規登録時にトークンを作成
+                Token.objects.create(user=user)
+                # 最初の質問の報酬ポイントを預けられるよう、登録ボーナスを台帳経由で付与する
+                bonus = getattr(settings, 'SIGNUP_BONUS_POINTS', 100)
+                if bonus:
+                    user.points = award_points(user, bonus, '新規登録ボーナス').balance_after
+                    user.total_earned_points += bonus
             return user
         except Exception as e:
             raise serializers.ValidationError(f"ユーザー作成でエラーが発生しました: {str(e)}")
@@ -101,6 +112,13 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'username', 'points', 'total_earned_points', 'questions_count',
             'answers_count', 'helpful_answers_count', 'date_joined'
         ]
+    
+    def update(self, instance, validated_data):
+        # ポイントや集計列を上書きしないよう、編集したフィールドだけを保存する
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
 
 
 class PointHistorySerializer(serializers.ModelSerializer):
@@ -110,6 +128,60 @@ class PointHistorySerializer(serializers.ModelSerializer):
         fields = ['id', 'points', 'reason', 'balance_after', 'created_at']
 
 
+class NotificationSerializer(serializers.ModelSerializer):
+    """通知シリアライザー（表示内容は通知イベントから取得）"""
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    question_id = serializers.IntegerField(source='event.question_id', read_only=True)
+    answer_id = serializers.IntegerField(source='event.answer_id', read_only=True)
+    question_title = serializers.SerializerMethodField()
+    points = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Notification
+        fields = [
+            'id', 'kind', 'kind_display', 'question_id', 'answer_id', 'question_title', 'points',
+            'is_read', 'created_at'
+        ]
+    
+    def get_question_title(self, obj):
+        return obj.event.data.get('title', '')
+    
+    def get_points(self, obj):
+        if obj.kind != Notification.KIND_BEST_ANSWER:
+            return None
+        return obj.event.data.get('points') or 0
+
+
+class PointCampaignSerializer(serializers.ModelSerializer):
+    """ポイントキャンペーンシリアライザー"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    
+    class Meta:
+        model = PointCampaign
+        fields = [
+            'id', 'name', 'points', 'reason', 'user_filter', 'status', 'status_display',
+            'last_user_id', 'awarded_count', 'error_message',
+            'started_at', 'finished_at', 'created_at'
+        ]
+        read_only_fields = [
+            'status', 'last_user_id', 'awarded_count', 'error_message',
+            'started_at', 'finished_at', 'created_at'
+        ]
+    
+    def validate_points(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("付与ポイントは1以上で指定してください。")
+        return value
+    
+    def validate_user_filter(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("対象ユーザー条件はオブジェクト形式で指定してください。")
+        invalid = set(value) - ALLOWED_USER_FILTERS
+        if invalid:
+            raise serializers.ValidationError(f"指定できない条件です: {', '.join(sorted(invalid))}")
+        return value
+
+
 class QuestionListSerializer(serializers.ModelSerializer):
     """質問一覧シリアライザー"""
     user_name = serializers.CharField(source='user.username', read_only=True)
@@ -137,6 +209,8 @@ class QuestionDetailSerializer(serializers.ModelSerializer):
             'status', 'status_display', 'user_name', 'image',
             'views_count', 'answers_count', 'reward_points', 'created_at', 'updated_at'
         ]
+        # 報酬ポイントと状態は預かりの精算（accounts.escrow）と合わせて変更するため、編集では変更できない
+        read_only_fields = ['status', 'reward_points']
 
 
 class QuestionCreateSerializer(serializers.ModelSerializer):
@@ -152,7 +226,14 @@ class QuestionCreateSerializer(serializers.ModelSerializer):
             request_user = self.context['request'].user
             if request_user.is_authenticated:
                 validated_data['user'] = request_user
-        return super().create(validated_data)
+        # 報酬ポイントは質問の作成と同じトランザクションで預かり、残高が足りなければ作成しない
+        with transaction.atomic():
+            question = super().create(validated_data)
+            try:
+                escrow.hold(question)
+            except escrow.InsufficientPoints:
+                raise serializers.ValidationError({'reward_points': ['所持ポイントが足りません。']})
+        return question
 
 
 class AnswerSerializer(serializers.ModelSerializer):
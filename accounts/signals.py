@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token, invalidate_users
+from .models import CustomUser
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_on_delete(sender, instance, **kwargs):
+    """トークン削除（ログアウト）時に認証キャッシュを無効化"""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_user_snapshot(sender, instance, **kwargs):
+    """ユーザー更新・削除時に認証キャッシュのスナップショットを無効化"""
+    invalidate_users([instance.pk])
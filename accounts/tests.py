@@ -1,3 +1,485 @@
-from django.test import TestCase
+import copy
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from answers.best_answers import mark_best_answer
+from answers.models import Answer, Question
+from jobs.worker import run_pending
+from oshare_style_answers.log_handlers import redact
+from oshare_style_answers.metrics import get_latency_histogram
+from oshare_style_answers.throttling import SlidingWindowThrottle, local_counters
+from .authentication import get_local_cache, user_cache_key
+from .campaigns import CampaignBusy, run_campaign
+from .models import Notification, NotificationEvent, PointCampaign, PointEscrow, PointHistory
+from .notifications import deliver_pending
+from .points import award_points, bulk_award, point_history_count, spend_points, take_balance_snapshots
+
+User = get_user_model()
+
+
+class PointLedgerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='answerer', password='password123')
+
+    def test_award_and_spend_keep_history_in_sync(self):
+        award_points(self.user, 100, 'ベストアンサー')
+        self.assertIsNotNone(spend_points(self.user, 30, '質問投稿'))
+        self.assertIsNone(spend_points(self.user, 100, '残高不足'))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.points, 70)
+        self.assertEqual(self.user.total_earned_points, 100)
+        self.assertEqual(
+            list(PointHistory.objects.order_by('id').values_list('points', 'balance_after')),
+            [(100, 100), (-30, 70)]
+        )
+
+    def test_add_points_does_not_overwrite_other_columns(self):
+        stale = User.objects.get(pk=self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(bio='更新済み')
+        stale.add_points(10, 'テスト')
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bio, '更新済み')
+        self.assertEqual(stale.points, 10)
+
+    def test_bulk_award(self):
+        users = [User.objects.create_user(username=f'user{i}') for i in range(5)]
+        self.assertEqual(bulk_award([u.pk for u in users], 50, 'キャンペーン', batch_size=2), 5)
+        self.assertEqual(set(User.objects.filter(pk__in=[u.pk for u in users]).values_list('points', flat=True)), {50})
+        self.assertEqual(PointHistory.objects.filter(reason='キャンペーン').count(), 5)
+
+
+class PointBalanceSnapshotTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='answerer', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def test_count_uses_snapshot_plus_new_entries(self):
+        for _ in range(3):
+            award_points(self.user, 10, '回答')
+        self.assertEqual(take_balance_snapshots(settle_seconds=0), 1)
+        award_points(self.user, 10, '回答')
+
+        snapshot = self.user.point_snapshot
+        self.assertEqual((snapshot.entries_count, snapshot.balance), (3, 30))
+        self.assertEqual(point_history_count(self.user), 4)
+
+        response = self.client.get('/api/accounts/point-history/', {'page_size': 3})
+        self.assertEqual(response.data['count'], 4)
+        self.assertEqual(len(response.data['results']), 3)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNone(response.data['next'])
+
+    def test_grouped_summary(self):
+        award_points(self.user, 100, '回答')
+        spend_points(self.user, 30, '質問')
+        award_points(self.user, 5, '回答')
+
+        response = self.client.get('/api/accounts/point-history/', {'group': 'day'})
+        self.assertEqual(len(response.data['results']), 1)
+        row = response.data['results'][0]
+        self.assertEqual((row['total'], row['earned'], row['spent']), (75, 105, 30))
+        self.assertEqual((row['entries'], row['balance_after']), (3, 75))
+
+        response = self.client.get('/api/accounts/point-history/', {'group': 'day', 'limit': -1})
+        self.assertEqual(len(response.data['results']), 1)
+
+        response = self.client.get('/api/accounts/point-history/', {'group': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_does_not_skip_entries_with_same_timestamp(self):
+        for _ in range(5):
+            award_points(self.user, 10, '回答')
+        PointHistory.objects.update(created_at=timezone.now())
+
+        seen = []
+        response = self.client.get('/api/accounts/point-history/', {'page_size': 2})
+        while True:
+            seen += [row['id'] for row in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(sorted(seen), sorted(PointHistory.objects.values_list('pk', flat=True)))
+
+
+class PointCampaignTest(APITestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(5)]
+        User.objects.filter(pk=self.users[0].pk).update(is_active=False)
+
+    def test_interrupted_campaign_resumes_without_double_award(self):
+        campaign = PointCampaign.objects.create(
+            name='夏のキャンペーン', points=50, reason='キャンペーン', user_filter={'is_active': True}
+        )
+
+        def interrupt(campaign, awarded, elapsed):
+            raise RuntimeError('stopped')
+
+        with self.assertRaises(RuntimeError):
+            run_campaign(campaign, chunk_size=2, progress=interrupt)
+        campaign.refresh_from_db()
+        self.assertEqual((campaign.status, campaign.awarded_count), ('failed', 2))
+
+        self.assertEqual(run_campaign(campaign, chunk_size=2), 2)
+        self.assertEqual((campaign.status, campaign.awarded_count), ('completed', 4))
+        self.assertEqual(
+            dict(User.objects.values_list('username', 'points')),
+            {'user0': 0, 'user1': 50, 'user2': 50, 'user3': 50, 'user4': 50}
+        )
+
+    def test_running_campaign_is_not_run_twice(self):
+        campaign = PointCampaign.objects.create(name='実行中', points=50, reason='キャンペーン', status='running')
+        with self.assertRaises(CampaignBusy):
+            run_campaign(campaign)
+        self.assertFalse(PointHistory.objects.exists())
+
+        # 実行中のまま停止したキャンペーンは force で引き継ぐ
+        self.assertEqual(run_campaign(campaign, force=True), 5)
+        self.assertEqual(campaign.status, 'completed')
+
+    def test_chunk_rolls_back_when_another_runner_advanced(self):
+        campaign = PointCampaign.objects.create(
+            name='競合', points=50, reason='キャンペーン', user_filter={'is_active': True}
+        )
+
+        def overtaken(campaign, awarded, elapsed):
+            # 他のプロセスが先に次のチャンクを処理した状態
+            PointCampaign.objects.filter(pk=campaign.pk).update(last_user_id=self.users[3].pk)
+
+        with self.assertRaises(CampaignBusy):
+            run_campaign(campaign, chunk_size=2, progress=overtaken)
+        self.assertEqual(
+            dict(User.objects.values_list('username', 'points')),
+            {'user0': 0, 'user1': 50, 'user2': 50, 'user3': 0, 'user4': 0}
+        )
+        self.assertEqual(PointCampaign.objects.get(pk=campaign.pk).status, 'running')
+
+    def test_ids_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as f:
+            f.write(f'{self.users[3].pk}\n{self.users[1].pk}\n999999\n')
+            f.flush()
+            campaign = PointCampaign.objects.create(name='指定', points=10, reason='指定', ids_file=f.name)
+            self.assertEqual(run_campaign(campaign, chunk_size=1), 2)
+        self.assertEqual(PointHistory.objects.count(), 2)
+
+    def test_api_requires_admin_and_validates_filter(self):
+        self.client.force_authenticate(self.users[1])
+        self.assertEqual(self.client.post('/api/accounts/point-campaigns/', {}, format='json').status_code, 403)
+
+        admin = User.objects.create_user(username='admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        payload = {'name': 'キャンペーン', 'points': 50, 'reason': '理由', 'user_filter': {'password': 'x'}}
+        self.assertEqual(self.client.post('/api/accounts/point-campaigns/', payload, format='json').status_code, 400)
+        payload['user_filter'] = {'is_active': True}
+        response = self.client.post('/api/accounts/point-campaigns/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], 'pending')
+
+
+class NotificationTest(APITestCase):
+    def setUp(self):
+        self.asker = User.objects.create_user(username='asker')
+        self.best = User.objects.create_user(username='best')
+        self.other = User.objects.create_user(username='other')
+        self.silent = User.objects.create_user(username='silent', notification_enabled=False)
+        self.question = Question.objects.create(user=self.asker, title='春のコーデ', content='内容', reward_points=30)
+        self.answers = [
+            Answer.objects.create(question=self.question, user=user, content='回答')
+            for user in (self.best, self.other, self.other, self.silent)
+        ]
+        Answer.objects.create(question=self.question, user=self.asker, content='補足')
+
+    def test_events_are_fanned_out_in_batches(self):
+        mark_best_answer(self.answers[0].pk, self.asker.pk)
+        self.assertEqual(NotificationEvent.objects.count(), 6)
+        self.assertEqual(Notification.objects.count(), 0)
+
+        with self.assertNumQueries(11):
+            self.assertEqual(deliver_pending(batch_size=10), (6, 6))
+        self.assertEqual(deliver_pending(), (0, 0))
+
+        # 質問者は自分の補足、回答者は重複せず1件、通知をオフにしたユーザーには作成しない
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user__username', 'kind')),
+            [('asker', Notification.KIND_ANSWER)] * 4
+            + [('best', Notification.KIND_BEST_ANSWER), ('other', Notification.KIND_QUESTION_CLOSED)]
+        )
+
+    def test_unread_count_and_read(self):
+        mark_best_answer(self.answers[0].pk, self.asker.pk)
+        deliver_pending()
+        self.client.force_authenticate(self.asker)
+
+        response = self.client.get('/api/accounts/notifications/unread-count/')
+        self.assertEqual(response.data, {'unread_count': 4})
+        response = self.client.get('/api/accounts/notifications/', {'page_size': 2})
+        self.assertEqual(response.data['unread_count'], 4)
+        self.assertEqual([n['question_title'] for n in response.data['results']], ['春のコーデ'] * 2)
+        self.assertIsNotNone(response.data['next'])
+
+        first = response.data['results'][0]['id']
+        response = self.client.post('/api/accounts/notifications/read/', {'ids': [first, first]}, format='json')
+        self.assertEqual(response.data, {'read': 1, 'unread_count': 3})
+        response = self.client.post('/api/accounts/notifications/read/', {}, format='json')
+        self.assertEqual(response.data, {'read': 3, 'unread_count': 0})
+        response = self.client.post('/api/accounts/notifications/read/', {'ids': 'all'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.best)
+        notification, = self.client.get('/api/accounts/notifications/').data['results']
+        self.assertEqual((notification['kind'], notification['points']), (Notification.KIND_BEST_ANSWER, 30))
+
+
+class PointEscrowTest(APITestCase):
+    def setUp(self):
+        self.asker = User.objects.create_user(username='asker', points=100)
+        self.answerer = User.objects.create_user(username='answerer')
+        self.client.force_authenticate(self.asker)
+
+    def post_question(self, url, points):
+        return self.client.post(url, {
+            'title': '春のコーデについて', 'content': '質問の内容です', 'category': 'styling', 'reward_points': points,
+        }, format='json')
+
+    def test_reward_is_held_at_creation_and_paid_to_best_answer(self):
+        self.assertEqual(self.post_question('/api/questions/', 60).status_code, 201)
+        self.asker.refresh_from_db()
+        self.assertEqual(self.asker.points, 40)
+        escrow = PointEscrow.objects.get()
+        self.assertEqual((escrow.user, escrow.points, escrow.status), (self.asker, 60, 'held'))
+        self.assertEqual(PointHistory.objects.get(user=self.asker).points, -60)
+
+        answer = Answer.objects.create(question=escrow.question, user=self.answerer, content='回答')
+        mark_best_answer(answer.pk, self.asker.pk)
+        self.assertEqual(run_pending(), {'succeeded': 3})
+        self.answerer.refresh_from_db()
+        self.assertEqual((self.answerer.points, self.answerer.total_earned_points), (60, 60))
+        escrow.refresh_from_db()
+        self.assertEqual((escrow.status, escrow.recipient), ('released', self.answerer))
+
+    def test_new_user_can_post_first_question(self):
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/accounts/register/', {
+            'username': 'newcomer', 'email': 'newcomer@example.com',
+            'password': 'Str0ng-passw0rd', 'password_confirm': 'Str0ng-passw0rd',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user']['points'], settings.SIGNUP_BONUS_POINTS)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.data["token"]}')
+        # フロントエンドの既定値（10ポイント）で最初の質問を投稿できる
+        self.assertEqual(self.post_question('/api/questions/', 10).status_code, 201)
+        newcomer = User.objects.get(username='newcomer')
+        self.assertEqual(newcomer.points, settings.SIGNUP_BONUS_POINTS - 10)
+        self.assertEqual(
+            list(PointHistory.objects.filter(user=newcomer).order_by('pk').values_list('points', flat=True)),
+            [settings.SIGNUP_BONUS_POINTS, -10]
+        )
+
+    def test_insufficient_points_rejects_question(self):
+        response = self.post_question('/api/accounts/questions/', 200)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('reward_points', response.data)
+        self.assertFalse(Question.objects.exists())
+        self.asker.refresh_from_db()
+        self.assertEqual(self.asker.points, 100)
+        self.assertFalse(PointHistory.objects.exists())
+
+    def test_deleting_question_refunds_reward(self):
+        self.post_question('/api/accounts/questions/', 30)
+        question = Question.objects.get()
+        response = self.client.patch(f'/api/accounts/questions/{question.pk}/', {'reward_points': 1}, format='json')
+        self.assertEqual(response.data['reward_points'], 30)
+
+        self.assertEqual(self.client.delete(f'/api/accounts/questions/{question.pk}/').status_code, 204)
+        self.asker.refresh_from_db()
+        self.assertEqual((self.asker.points, self.asker.total_earned_points), (100, 0))
+        self.assertEqual(PointEscrow.objects.get().status, 'refunded')
+
+    def test_deleting_question_forfeits_unfunded_reward(self):
+        question = Question.objects.create(user=self.asker, title='移行前の質問', content='内容', reward_points=30)
+        PointEscrow.objects.create(question=question, user=self.asker, points=30, funded=False)
+        self.assertEqual(self.client.delete(f'/api/accounts/questions/{question.pk}/').status_code, 204)
+        self.asker.refresh_from_db()
+        self.assertEqual(self.asker.points, 100)
+        self.assertEqual(PointEscrow.objects.get().status, 'forfeited')
+        self.assertFalse(PointHistory.objects.exists())
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        get_local_cache().clear()
+        self.user = User.objects.create_user(username='cached', password='password123')
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_requests_skip_token_query(self):
+        self.assertEqual(self.client.get('/api/accounts/me/').status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/accounts/me/')
+        self.assertEqual(response.data['user']['username'], 'cached')
+
+    def test_snapshot_excludes_password_and_stays_in_process_with_locmem(self):
+        self.assertEqual(self.client.get('/api/accounts/me/').status_code, 200)
+        snapshot = get_local_cache().get(user_cache_key(self.user.pk))
+        self.assertNotIn('password', snapshot.__dict__)
+        # LocMemCache は他のワーカーと共有されないため、共有キャッシュには保存しない
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertTrue(copy.copy(snapshot).check_password('password123'))
+
+    def test_shared_tier_is_used_with_cross_process_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_cache = {'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+            }}
+            with override_settings(CACHES=file_cache):
+                self.assertEqual(self.client.get('/api/accounts/me/').status_code, 200)
+                get_local_cache().clear()
+                with self.assertNumQueries(0):
+                    self.assertEqual(self.client.get('/api/accounts/me/').status_code, 200)
+
+    def test_logout_invalidates_token(self):
+        self.client.get('/api/accounts/me/')
+        self.assertEqual(self.client.post('/api/accounts/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/accounts/me/').status_code, 401)
+
+    def test_user_updates_invalidate_snapshot(self):
+        self.client.get('/api/accounts/me/')
+        self.user.bio = '更新済み'
+        self.user.save()
+        award_points(self.user, 50, 'テスト')
+
+        user = self.client.get('/api/accounts/me/').data['user']
+        self.assertEqual(user['bio'], '更新済み')
+        self.assertEqual(user['points'], 50)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/accounts/me/').status_code, 401)
+
+    def test_profile_update_does_not_overwrite_points(self):
+        self.client.get('/api/accounts/profile/')
+        # キャッシュ済みのスナップショットを無効化しない更新（別プロセスでの付与などの途中）
+        User.objects.filter(pk=self.user.pk).update(points=70, answers_count=3)
+
+        response = self.client.patch('/api/accounts/profile/', {'bio': '更新済み'}, format='json')
+        self.assertEqual(response.data['points'], 70)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.bio, self.user.points, self.user.answers_count), ('更新済み', 70, 3))
+
+
+class LoginLoggingTest(APITestCase):
+    def setUp(self):
+        User.objects.create_user(username='login-user', password='s3cret-pass')
+
+    def test_login_logs_no_credentials_and_records_latency(self):
+        histogram = get_latency_histogram('accounts.login')
+        before = histogram.count
+        payload = {'username': 'login-user', 'password': 's3cret-pass'}
+
+        with self.assertLogs('accounts', 'INFO') as logs:
+            self.assertEqual(self.client.post('/api/accounts/login/', payload, format='json').status_code, 200)
+            self.client.post('/api/accounts/login/', {**payload, 'password': 'wrong'}, format='json')
+
+        output = '\n'.join(logs.output)
+        self.assertNotIn('s3cret-pass', output)
+        self.assertNotIn('HTTP_', output)
+        self.assertEqual(histogram.count, before + 2)
+
+    def test_redact(self):
+        self.assertEqual(
+            redact({'username': 'a', 'password': 'x', 'nested': {'token': 'y'}}),
+            {'username': 'a', 'password': '[REDACTED]', 'nested': {'token': '[REDACTED]'}}
+        )
+        self.assertEqual(
+            redact("{'password': 'p w', 'HTTP_AUTHORIZATION': 'Token abc'} token=xyz"),
+            "{'password': '[REDACTED]', 'HTTP_AUTHORIZATION': '[REDACTED]'} token=[REDACTED]"
+        )
+
+
+@override_settings(REST_FRAMEWORK={
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {'login': '3/min'},
+})
+class SlidingWindowThrottleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        local_counters.clear()
+        self.payload = {'username': 'nobody', 'password': 'wrong'}
+
+    def post_login(self):
+        return self.client.post('/api/accounts/login/', self.payload, format='json')
+
+    @mock.patch('oshare_style_answers.throttling.time.time')
+    def test_sliding_window_and_retry_after(self, now):
+        now.return_value = 6000.0  # ウィンドウの先頭
+        for _ in range(3):
+            self.assertEqual(self.post_login().status_code, 400)
+        response = self.post_login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '80')
+
+        # 次のウィンドウの半分が過ぎても直前の3件の半分が残る
+        now.return_value = 6090.0
+        self.assertEqual(self.post_login().status_code, 400)
+        self.assertEqual(self.post_login().status_code, 429)
+
+        now.return_value = 6180.0
+        self.assertEqual(self.post_login().status_code, 400)
+
+    def test_forwarded_for_header_does_not_reset_ip_limit(self):
+        for i in range(3):
+            response = self.client.post(
+                '/api/accounts/login/', self.payload, format='json', HTTP_X_FORWARDED_FOR=f'10.0.0.{i}'
+            )
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/accounts/login/', self.payload, format='json', HTTP_X_FORWARDED_FOR='10.0.0.99'
+        )
+        self.assertEqual(response.status_code, 429)
+
+    def test_falls_back_to_in_process_counters(self):
+        with mock.patch.object(SlidingWindowThrottle, '_cache', side_effect=ConnectionError):
+            for _ in range(3):
+                self.assertEqual(self.post_login().status_code, 400)
+            self.assertEqual(self.post_login().status_code, 429)
+
+
+class PointLedgerConcurrencyTest(TransactionTestCase):
+    def _award(self, user_id):
+        # SQLiteのテストDBはテーブルロックで即時エラーになるため、確定するまで再試行
+        try:
+            while True:
+                try:
+                    return award_points(user_id, 1, '同時付与')
+                except OperationalError:
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_concurrent_awards_are_not_lost(self):
+        user = User.objects.create_user(username='answerer')
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(self._award, [user.pk] * 200))
+
+        user.refresh_from_db()
+        self.assertEqual(user.points, 200)
+        self.assertEqual(
+            sorted(PointHistory.objects.values_list('balance_after', flat=True)),
+            list(range(1, 201))
+        )
@@ -9,6 +9,7 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('me/', views.current_user, name='current-user'),
+    path('auth-latency/', views.auth_latency, name='auth-latency'),
     
     # テスト用エンドポイント
     path('test/', views.test_api, name='api-test'),
@@ -18,6 +19,13 @@ urlpatterns = [
     path('profile/', views.UserProfileView.as_view(), name='user-profile'),
     path('users/<str:username>/', views.UserDetailView.as_view(), name='user-detail'),
     path('point-history/', views.PointHistoryListView.as_view(), name='point-history'),
+    path('point-campaigns/', views.PointCampaignListCreateView.as_view(), name='point-campaigns'),
+    path('point-campaigns/<int:pk>/', views.PointCampaignDetailView.as_view(), name='point-campaign-detail'),
+    
+    # 通知
+    path('notifications/', views.NotificationListView.as_view(), name='notifications'),
+    path('notifications/unread-count/', views.notification_unread_count, name='notification-unread-count'),
+    path('notifications/read/', views.read_notifications, name='read-notifications'),
     
     # 質問関連
     path('questions/', views.QuestionListView.as_view(), name='question-list'),
@@ -4,24 +4,35 @@ from django.contrib.auth import login, logout
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
-from django.db.models import F
+from django.db import transaction
+from django.db.models import Count, F
 import logging
-import json
 
 # ロガーの設定
 logger = logging.getLogger('accounts')
 from .models import (
-    PointHistory, UserRecommendation, UserPreference
+    Notification, PointHistory, PointCampaign, UserRecommendation, UserPreference
 )
-from answers.models import Question, Answer, AnswerVote
+from answers.models import Question, Answer
+from answers import best_answers
+from answers.votes import cast_vote
+from oshare_style_answers.metrics import latency_snapshot, observe_latency
+from oshare_style_answers.query_budget import query_budget
+from oshare_style_answers.throttling import (
+    BestAnswerRateThrottle, LoginRateThrottle, RegisterRateThrottle, VoteRateThrottle
+)
+from . import escrow
+from .notifications import mark_read, unread_count
+from .pagination import NotificationPagination, PointHistoryPagination
+from .points import PERIOD_FUNCTIONS, point_history_summary
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer,
-    UserSerializer, UserProfileSerializer, PointHistorySerializer,
+    UserSerializer, UserProfileSerializer, PointHistorySerializer, PointCampaignSerializer, NotificationSerializer,
     QuestionListSerializer, QuestionDetailSerializer, QuestionCreateSerializer,
     AnswerSerializer, AnswerCreateSerializer, AnswerWithQuestionSerializer,
     UserRecommendationSerializer, UserPreferenceSerializer, AnswerVoteSerializer
@@ -30,6 +41,7 @@ from .serializers import (
 User = get_user_model()
 
 
+@query_budget(0)
 @api_view(['GET'])
 @permission_classes([])  # 認証不要
 def test_api(request):
@@ -43,15 +55,20 @@ def test_api(request):
     })
 
 
+@query_budget({'GET': 1, 'PUT': 2, 'PATCH': 2})
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """ユーザープロフィール取得・更新"""
     serializer_class = UserProfileSerializer
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        return self.request.user
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+        # request.user は認証キャッシュのスナップショットのため、更新時はデータベースから読み直す
+        return User.objects.get(pk=self.request.user.pk)
 
 
+@query_budget(1)
 class UserDetailView(generics.RetrieveAPIView):
     """ユーザー詳細取得（他のユーザーも含む）"""
     queryset = User.objects.all()
@@ -59,18 +76,94 @@ class UserDetailView(generics.RetrieveAPIView):
     lookup_field = 'username'
 
 
+@query_budget(3)
 class PointHistoryListView(generics.ListAPIView):
-    """ポイント履歴一覧"""
+    """ポイント履歴一覧（?group=day|month で期間別の集計を返す）"""
     serializer_class = PointHistorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PointHistoryPagination
     
     def get_queryset(self):
         return PointHistory.objects.filter(user=self.request.user)
+    
+    def list(self, request, *args, **kwargs):
+        group = request.query_params.get('group')
+        if not group:
+            return super().list(request, *args, **kwargs)
+        
+        if group not in PERIOD_FUNCTIONS:
+            return Response(
+                {'error': 'groupにはdayまたはmonthを指定してください。'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 90)), 366))
+        except ValueError:
+            limit = 90
+        
+        return Response({
+            'group': group,
+            'results': point_history_summary(request.user, group, limit),
+        })
+
+
+@query_budget(1)
+class PointCampaignListCreateView(generics.ListCreateAPIView):
+    """ポイントキャンペーン一覧・作成（管理者用、実行はrun_point_campaignコマンド）"""
+    queryset = PointCampaign.objects.all()
+    serializer_class = PointCampaignSerializer
+    permission_classes = [permissions.IsAdminUser]
+    
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+@query_budget(1)
+class PointCampaignDetailView(generics.RetrieveAPIView):
+    """ポイントキャンペーン進捗確認（管理者用）"""
+    queryset = PointCampaign.objects.all()
+    serializer_class = PointCampaignSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+
+@query_budget(2)
+class NotificationListView(generics.ListAPIView):
+    """通知一覧（新しい順、未読数を添えて返す）"""
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = NotificationPagination
+    
+    def get_queryset(self):
+        return Notification.objects.filter(user=self.request.user).select_related('event')
+
+
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notification_unread_count(request):
+    """未読通知数（ヘッダーのバッジ用）"""
+    return Response({'unread_count': unread_count(request.user)})
 
 
+@query_budget(3)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def read_notifications(request):
+    """通知を既読にする（idsを省略するとすべて）"""
+    ids = request.data.get('ids')
+    if ids is not None and (
+        not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)
+    ):
+        return Response({'error': 'idsには通知IDの配列を指定してください。'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    read = mark_read(request.user, ids)
+    return Response({'read': read, 'unread_count': unread_count(request.user)})
+
+
+@query_budget({'GET': 1, 'POST': 8})
 class QuestionListView(generics.ListCreateAPIView):
     """質問一覧・作成"""
-    queryset = Question.objects.all()
+    queryset = Question.objects.select_related('user')
     permission_classes = []  # 一時的に認証を無効化（開発用）
     
     def get_serializer_class(self):
@@ -100,18 +193,19 @@ class QuestionListView(generics.ListCreateAPIView):
         return question
 
 
+@query_budget({'GET': 2, 'PUT': 2, 'PATCH': 2})
 class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
     """質問詳細・更新・削除"""
-    queryset = Question.objects.all()
+    queryset = Question.objects.select_related('user')
     serializer_class = QuestionDetailSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     def get_object(self):
         obj = super().get_object()
         # 閲覧数をカウントアップ（自分の質問は除く）
-        if self.request.user != obj.user:
-            obj.views_count = F('views_count') + 1
-            obj.save(update_fields=['views_count'])
+        if self.request.user.pk != obj.user_id:
+            Question.objects.filter(pk=obj.pk).update(views_count=F('views_count') + 1)
+            obj.views_count += 1
         return obj
     
     def perform_update(self, serializer):
@@ -124,9 +218,12 @@ class QuestionDetailView(generics.RetrieveUpdateDestroyAPIView):
         # 自分の質問のみ削除可能
         if instance.user != self.request.user:
             raise PermissionError("他のユーザーの質問は削除できません")
-        instance.delete()
+        with transaction.atomic():
+            escrow.refund(instance.pk)
+            instance.delete()
 
 
+@query_budget({'GET': 1, 'POST': 9})
 class QuestionAnswersView(generics.ListCreateAPIView):
     """質問に対する回答一覧・作成"""
     serializer_class = AnswerSerializer
@@ -134,7 +231,7 @@ class QuestionAnswersView(generics.ListCreateAPIView):
     
     def get_queryset(self):
         question_id = self.kwargs['question_id']
-        return Answer.objects.filter(question_id=question_id)
+        return Answer.objects.filter(question_id=question_id).select_related('user')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -169,99 +266,69 @@ class QuestionAnswersView(generics.ListCreateAPIView):
             user.refresh_from_db()
             logger.info(f"Updated answers_count for user {user.username}: {old_count} -> {user.answers_count}")
         
-        # 質問の回答数もカウントアップ
-        question = answer.question
-        question.answers_count = F('answers_count') + 1
-        question.save(update_fields=['answers_count'])
-        logger.info(f"Updated answers_count for question {question.id}: {question.answers_count}")
-        
+        # 質問の回答数は answers.signals で更新する
         return answer
 
 
+@query_budget(1)
 class UserQuestionsView(generics.ListAPIView):
     """ユーザーの質問一覧"""
     serializer_class = QuestionListSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Question.objects.filter(user=self.request.user).order_by('-created_at')
-        logger.info(f"UserQuestionsView - User: {self.request.user.username}, Questions count: {queryset.count()}")
-        for q in queryset:
-            logger.info(f"  Question ID: {q.id}, Title: {q.title}, User: {q.user.username}")
-        return queryset
-    
-    def list(self, request, *args, **kwargs):
-        logger.info(f"UserQuestionsView.list called for user: {request.user.username}")
-        response = super().list(request, *args, **kwargs)
-        logger.info(f"UserQuestionsView response data: {response.data}")
-        return response
+        return Question.objects.filter(user=self.request.user).select_related('user').order_by('-created_at')
 
 
+@query_budget(1)
 class UserAnswersView(generics.ListAPIView):
     """ユーザーの回答一覧"""
     serializer_class = AnswerWithQuestionSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = Answer.objects.filter(user=self.request.user).select_related('question')
-        logger.info(f"UserAnswersView - User: {self.request.user.username}, Answers count: {queryset.count()}")
-        return queryset
-    
-    def list(self, request, *args, **kwargs):
-        logger.info(f"UserAnswersView.list called for user: {request.user.username}")
-        response = super().list(request, *args, **kwargs)
-        logger.info(f"UserAnswersView response data: {response.data}")
-        return response
+        return Answer.objects.filter(user=self.request.user).select_related('question', 'user')
 
 
+@query_budget(1)
 class UserRecommendationsView(generics.ListAPIView):
     """ユーザーおすすめ商品一覧"""
     serializer_class = UserRecommendationSerializer
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return UserRecommendation.objects.filter(user=self.request.user)
+        return UserRecommendation.objects.filter(user=self.request.user).select_related('item__brand')
 
 
+@query_budget({'GET': 3, 'PUT': 8, 'PATCH': 8})
 class UserPreferenceView(generics.RetrieveUpdateAPIView):
     """ユーザー好み設定取得・更新"""
     serializer_class = UserPreferenceSerializer
     permission_classes = [IsAuthenticated]
     
     def get_object(self):
-        preference, created = UserPreference.objects.get_or_create(user=self.request.user)
+        preference, created = UserPreference.objects.prefetch_related(
+            'preferred_brands', 'preferred_categories'
+        ).get_or_create(user=self.request.user)
         return preference
 
 
+@query_budget(5)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([VoteRateThrottle])
 def vote_answer(request, answer_id):
     """回答に投票"""
     try:
-        answer = get_object_or_404(Answer, id=answer_id)
+        answer = get_object_or_404(Answer.objects.only('id', 'user_id'), id=answer_id)
         is_helpful = request.data.get('is_helpful', True)
         
-        # 既存の投票を確認
-        vote, created = AnswerVote.objects.get_or_create(
-            answer=answer,
-            user=request.user,
-            defaults={'is_helpful': is_helpful}
-        )
-        
-        if not created:
-            # 既存の投票を更新
-            vote.is_helpful = is_helpful
-            vote.save()
-        
-        # 投票数を更新
-        helpful_votes = AnswerVote.objects.filter(answer=answer, is_helpful=True).count()
-        answer.helpful_votes = helpful_votes
-        answer.save(update_fields=['helpful_votes'])
+        result = cast_vote(answer, request.user, is_helpful)
         
         return Response({
             'success': True,
             'message': '投票しました',
-            'helpful_votes': helpful_votes
+            'helpful_votes': result.helpful_votes
         })
     
     except Exception as e:
@@ -271,159 +338,106 @@ def vote_answer(request, answer_id):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(7)
 @api_view(['POST'])
-@permission_classes([])  # 開発環境での動作確認用に一時的に無効化
+@permission_classes([IsAuthenticated])
+@throttle_classes([BestAnswerRateThrottle])
 def mark_best_answer(request, answer_id):
-    """ベストアンサーをマーク"""
+    """ベストアンサーをマーク（質問者本人のみ、受付中の質問のみ）"""
     try:
-        answer = get_object_or_404(Answer, id=answer_id)
-        question = answer.question
-        
-        # 開発環境では認証チェックを簡略化
-        from django.conf import settings
-        if settings.DEBUG:
-            print(f"DEBUG: Setting best answer for answer_id={answer_id}")
-            print(f"DEBUG: Question user={question.user.username}, Answer user={answer.user.username}")
-        
-        # 他のベストアンサーを解除
-        Answer.objects.filter(question=question, is_best_answer=True).update(is_best_answer=False)
-        
-        # 新しいベストアンサーを設定
-        answer.is_best_answer = True
-        answer.save(update_fields=['is_best_answer'])
-        
-        # 回答者にポイント付与
-        try:
-            answer.user.add_points(question.reward_points, f"ベストアンサー選出: {question.title}")
-        except Exception as e:
-            print(f"DEBUG: Point addition failed: {e}")
-        
-        # 質問をクローズ
-        question.status = 'closed'
-        question.save(update_fields=['status'])
-        
+        changed = best_answers.mark_best_answer(answer_id, request.user.pk)
+    except Answer.DoesNotExist:
         return Response({
-            'success': True,
-            'message': 'ベストアンサーに選出しました'
-        })
-    
-    except Exception as e:
-        print(f"DEBUG: Exception in mark_best_answer: {e}")
+            'success': False,
+            'message': '回答が見つかりません'
+        }, status=status.HTTP_404_NOT_FOUND)
+    except best_answers.NotQuestionOwner:
         return Response({
             'success': False,
-            'message': str(e)
-        }, status=status.HTTP_400_BAD_REQUEST)
+            'message': 'ベストアンサーを選べるのは質問者のみです'
+        }, status=status.HTTP_403_FORBIDDEN)
+    except best_answers.QuestionNotOpen:
+        return Response({
+            'success': False,
+            'message': '受付中の質問ではないためベストアンサーを選べません'
+        }, status=status.HTTP_409_CONFLICT)
+    
+    # 画面に反映できるよう、question_closed イベントと同じ差分を返す
+    return Response({
+        'success': True,
+        'message': 'ベストアンサーに選出しました' if changed else 'すでにベストアンサーに選出されています',
+        'status': 'closed',
+        'status_display': dict(Question.STATUS_CHOICES)['closed'],
+        'best_answer_id': answer_id,
+    })
 
 
+@query_budget(9)
+@observe_latency('accounts.register')
 @api_view(['POST'])
 @permission_classes([])
+@throttle_classes([RegisterRateThrottle])
 @csrf_exempt
 def register(request):
     """ユーザー登録"""
-    logger.info(f"Registration attempt - Method: {request.method}, Content-Type: {request.content_type}")
-    logger.info(f"Request data: {request.data}")
+    serializer = UserRegistrationSerializer(data=request.data)
+    if not serializer.is_valid():
+        logger.info("Registration rejected: fields=%s", sorted(serializer.errors))
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        serializer = UserRegistrationSerializer(data=request.data)
-        logger.info(f"Registration serializer created with data: {request.data}")
-        
-        if serializer.is_valid():
-            logger.info("Registration serializer validation passed")
-            user = serializer.save()
-            logger.info(f"User created: {user.username}")
-            
-            token, created = Token.objects.get_or_create(user=user)
-            logger.info(f"Token {'created' if created else 'retrieved'} for registration: {token.key[:10]}...")
-            
-            response_data = {
-                'user': UserSerializer(user).data,
-                'token': token.key,
-                'message': '登録が完了しました。'
-            }
-            logger.info("Registration response data prepared successfully")
-            
-            return Response(response_data, status=status.HTTP_201_CREATED)
-        else:
-            logger.warning(f"Registration serializer validation failed: {serializer.errors}")
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            
+        user = serializer.save()
+        token, _ = Token.objects.get_or_create(user=user)
     except Exception as e:
-        logger.error(f"Exception in register: {str(e)}", exc_info=True)
+        logger.error("Exception in register: %s", e, exc_info=True)
         return Response({
             'error': str(e),
             'message': '登録処理でエラーが発生しました。'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    logger.info("User registered: user_id=%s", user.pk)
+    return Response({
+        'user': UserSerializer(user).data,
+        'token': token.key,
+        'message': '登録が完了しました。'
+    }, status=status.HTTP_201_CREATED)
 
 
+@query_budget(6)
+@observe_latency('accounts.login')
 @api_view(['POST'])
 @permission_classes([])
+@throttle_classes([LoginRateThrottle])
 @csrf_exempt
 def login_view(request):
     """ユーザーログイン"""
-    logger.info(f"Login attempt - Method: {request.method}")
-    logger.info(f"Content-Type: {request.content_type}")
-    logger.info(f"Request META: {dict(request.META)}")
+    serializer = UserLoginSerializer(data=request.data)
+    if not serializer.is_valid():
+        # パスワードなどのリクエスト内容はログに残さない
+        logger.info("Login rejected: fields=%s", sorted(serializer.errors))
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    user = serializer.validated_data['user']
     try:
-        # リクエストデータの取得とログ
-        if hasattr(request, 'data'):
-            request_data = request.data
-        else:
-            # フォールバック: JSONパースを試行
-            try:
-                request_data = json.loads(request.body.decode('utf-8'))
-            except:
-                request_data = request.POST
-                
-        logger.info(f"Request data: {request_data}")
-        
-        # シリアライザーでバリデーション
-        serializer = UserLoginSerializer(data=request_data)
-        logger.info(f"Serializer created successfully")
-        
-        if serializer.is_valid():
-            logger.info("Serializer validation passed")
-            user = serializer.validated_data['user']
-            logger.info(f"User found: {user.username}")
-            
-            # トークン取得・作成
-            token, created = Token.objects.get_or_create(user=user)
-            logger.info(f"Token {'created' if created else 'retrieved'}: {token.key[:10]}...")
-            
-            # ログイン処理
-            login(request, user)
-            logger.info("User logged in successfully")
-            
-            # レスポンスデータ作成
-            user_data = UserSerializer(user).data
-            response_data = {
-                'user': user_data,
-                'token': token.key,
-                'message': 'ログインしました。'
-            }
-            logger.info("Response data prepared successfully")
-            
-            return Response(response_data, status=status.HTTP_200_OK)
-            
-        else:
-            logger.warning(f"Serializer validation failed: {serializer.errors}")
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error: {str(e)}")
-        return Response({
-            'error': 'Invalid JSON',
-            'message': 'リクエストデータの形式が正しくありません。'
-        }, status=status.HTTP_400_BAD_REQUEST)
-        
+        token, _ = Token.objects.get_or_create(user=user)
+        login(request, user)
     except Exception as e:
-        logger.error(f"Exception in login_view: {str(e)}", exc_info=True)
+        logger.error("Exception in login_view: %s", e, exc_info=True)
         return Response({
             'error': str(e),
             'message': 'ログイン処理でエラーが発生しました。'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    logger.info("User logged in: user_id=%s", user.pk)
+    return Response({
+        'user': UserSerializer(user).data,
+        'token': token.key,
+        'message': 'ログインしました。'
+    }, status=status.HTTP_200_OK)
 
 
+@query_budget(1)
+@observe_latency('accounts.logout')
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout_view(request):
@@ -437,6 +451,19 @@ def logout_view(request):
     return Response({'message': 'ログアウトしました。'})
 
 
+@query_budget(0)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def auth_latency(request):
+    """認証エンドポイントのレイテンシヒストグラム（管理者用）"""
+    return Response({
+        endpoint: histogram
+        for endpoint, histogram in latency_snapshot().items()
+        if endpoint.startswith('accounts.')
+    })
+
+
+@query_budget(0)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def current_user(request):
@@ -446,71 +473,53 @@ def current_user(request):
     })
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def debug_user_data(request):
     """デバッグ用：ユーザーの質問・回答データを確認"""
     user = request.user
-    
-    # Djangoの認証状況を詳細にログ出力
-    logger.info(f"=== Debug API Called ===")
-    logger.info(f"Request user: {user}")
-    logger.info(f"User ID: {user.id}")
-    logger.info(f"User username: {user.username}")
-    logger.info(f"User email: {user.email}")
-    logger.info(f"Is authenticated: {user.is_authenticated}")
-    logger.info(f"Is active: {user.is_active}")
-    logger.info(f"Authorization header: {request.META.get('HTTP_AUTHORIZATION', 'No Auth Header')}")
+    logger.info("Debug API called: user_id=%s", user.pk)
     
     # ユーザーの質問を取得
-    questions = Question.objects.filter(user=user).order_by('-created_at')
-    logger.info(f"Questions found for user {user.username}: {questions.count()}")
-    
-    questions_data = []
-    for q in questions:
-        questions_data.append({
+    questions = list(Question.objects.filter(user=user).order_by('-created_at'))
+    questions_data = [
+        {
             'id': q.id,
             'title': q.title,
             'content': q.content[:50] + '...' if len(q.content) > 50 else q.content,
             'created_at': q.created_at,
-            'user_id': q.user.id,
-            'user_username': q.user.username
-        })
-        logger.info(f"  Question {q.id}: {q.title} by {q.user.username}")
+            'user_id': user.id,
+            'user_username': user.username
+        }
+        for q in questions
+    ]
     
     # ユーザーの回答を取得
-    answers = Answer.objects.filter(user=user).select_related('question')
-    logger.info(f"Answers found for user {user.username}: {answers.count()}")
-    
-    answers_data = []
-    for a in answers:
-        answers_data.append({
+    answers = list(Answer.objects.filter(user=user).select_related('question'))
+    answers_data = [
+        {
             'id': a.id,
             'content': a.content[:50] + '...' if len(a.content) > 50 else a.content,
             'question_title': a.question.title,
             'created_at': a.created_at,
-            'user_id': a.user.id,
-            'user_username': a.user.username
-        })
-        logger.info(f"  Answer {a.id}: to '{a.question.title}' by {a.user.username}")
+            'user_id': user.id,
+            'user_username': user.username
+        }
+        for a in answers
+    ]
     
     # 全質問数（確認用）
     total_questions = Question.objects.count()
-    user_questions_count = questions.count()
-    logger.info(f"Total questions in DB: {total_questions}")
-    logger.info(f"Questions by this user: {user_questions_count}")
     
     # 他のユーザーの質問も確認
-    all_users = User.objects.all()
-    all_users_info = []
-    for u in all_users:
-        u_questions = Question.objects.filter(user=u).count()
-        all_users_info.append({
-            'id': u.id,
-            'username': u.username,
-            'questions_count': u_questions
-        })
-        logger.info(f"User {u.username} has {u_questions} questions")
+    all_users_info = list(
+        User.objects.annotate(questions_total=Count('questions'))
+        .order_by('id')
+        .values('id', 'username', 'questions_total')
+    )
+    for info in all_users_info:
+        info['questions_count'] = info.pop('questions_total')
     
     debug_info = {
         'user_info': {
@@ -521,19 +530,18 @@ def debug_user_data(request):
             'is_active': user.is_active,
         },
         'questions': {
-            'count': user_questions_count,
+            'count': len(questions),
             'data': questions_data
         },
         'answers': {
-            'count': answers.count(),
+            'count': len(answers),
             'data': answers_data
         },
         'database_info': {
             'total_questions_in_db': total_questions,
-            'questions_by_this_user': user_questions_count,
+            'questions_by_this_user': len(questions),
             'all_users': all_users_info
         }
     }
     
-    logger.info(f"Returning debug info: {debug_info}")
     return Response(debug_info)
@@ -0,0 +1,106 @@
+"""
+Q&Aの読み込みAPIの非同期版（ASGI で配信する）
+
+同期版（views.py）と同じ形式の JSON を返し、互いに独立したクエリを同時に実行する。
+question_events は質問ページへの変更（answers.events）を Server-Sent Events で配信する。
+"""
+
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+
+from oshare_style_answers.async_views import filtered_queryset, gather_queries, json_response, not_found_response
+from oshare_style_answers.pubsub import SubscriptionOverflow, get_broker
+from oshare_style_answers.query_budget import query_budget
+from .events import question_channel
+from .models import Answer, Question
+from .serializers import AnswerSerializer, QuestionListSerializer, QuestionSerializer, recommended_products_map
+from .views import QuestionListCreateView, answer_stats, question_stats
+
+
+@query_budget(1)
+@require_GET
+async def question_list(request):
+    """質問一覧API（QuestionListCreateView の GET と同じ絞り込み・検索・並び替え）"""
+    try:
+        questions, = await gather_queries(lambda: list(filtered_queryset(QuestionListCreateView, request)))
+    except ValidationError as exc:
+        return json_response(exc.detail, status=400)
+    return json_response(QuestionListSerializer(questions, many=True, context={'request': request}).data)
+
+
+def _view_question(pk):
+    """閲覧数を増やしてから質問を取得する（存在しなければ None）"""
+    if not Question.objects.filter(pk=pk).update(views_count=F('views_count') + 1):
+        return None
+    return Question.objects.select_related('user').get(pk=pk)
+
+
+@query_budget(5)
+@require_GET
+async def question_detail(request, pk):
+    """質問詳細API（閲覧数の更新と取得、回答の取得を同時に行う）"""
+    question, answers = await gather_queries(
+        lambda: _view_question(pk),
+        lambda: list(Answer.objects.filter(question_id=pk).select_related('user').prefetch_related('votes')),
+    )
+    if question is None:
+        return not_found_response(Question)
+
+    product_ids = {product_id for answer in answers for product_id in (answer.recommended_products or [])}
+    products = {}
+    if product_ids:
+        products, = await gather_queries(lambda: recommended_products_map(product_ids))
+
+    context = {'request': request, 'recommended_products': products}
+    serializer = QuestionSerializer(question, context=context)
+    del serializer.fields['answers']
+    data = serializer.data
+    data['answers'] = AnswerSerializer(answers, many=True, context=context).data
+    return json_response(data)
+
+
+@query_budget(2)
+@require_GET
+async def qa_stats(request):
+    """Q&A統計情報API（質問と回答の集計を同時に行う）"""
+    questions, answers = await gather_queries(question_stats, answer_stats)
+    return json_response({**questions, **answers})
+
+
+# 接続を維持するためのコメントを送る間隔（プロキシのアイドルタイムアウトより短くする）
+EVENTS_KEEPALIVE_SECONDS = 15
+# 切断されたクライアントが再接続するまでの時間（ミリ秒）
+EVENTS_RETRY_MS = 3000
+
+
+async def _event_stream(channel):
+    async with get_broker().subscribe(channel) as subscription:
+        yield f'retry: {EVENTS_RETRY_MS}\n\n'
+        while True:
+            try:
+                message = await subscription.get(timeout=EVENTS_KEEPALIVE_SECONDS)
+            except SubscriptionOverflow:
+                # 受信が追いつかなかった。クライアントは全体を取得し直して再接続する
+                yield 'event: resync\ndata: {}\n\n'
+                return
+            yield message if message is not None else ': keepalive\n\n'
+
+
+@query_budget(1)
+@require_GET
+async def question_events(request, pk):
+    """質問ページの変更（回答の追加・投票・解決）を Server-Sent Events で配信する"""
+    if not isinstance(request, ASGIRequest):
+        # WSGI では接続ごとにワーカーのスレッドを占有するため配信しない
+        return json_response({'detail': 'Server-sent events require the ASGI server.'}, status=501)
+    if not await Question.objects.filter(pk=pk).aexists():
+        return not_found_response(Question)
+
+    response = StreamingHttpResponse(_event_stream(question_channel(pk)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx などのプロキシでバッファリングしない
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,78 @@
+"""
+ベストアンサーの選出
+
+回答と質問を select_for_update でロックして1つのトランザクションで処理する。
+質問者本人が受付中の質問に対してのみ選出でき、解決済み・期限切れの質問の預かりは動かさない。
+既存のベストアンサーの解除と新しいベストアンサーの設定は1回の UPDATE で行い、
+預かった報酬ポイントの支払い（accounts.escrow）と回答者への通知はジョブにして同じトランザクションで追加する。
+報酬ポイントは預かりから1回だけ支払うため、ベストアンサーを選び直しても二重に支払われない。
+確定後に質問ページへ question_closed を配信する（answers.events）。
+"""
+
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from accounts import escrow
+from accounts.notifications import enqueue_best_answer
+from . import events
+from .models import Answer, Question
+
+
+class NotQuestionOwner(Exception):
+    """質問者以外がベストアンサーを選ぼうとした"""
+
+
+class QuestionNotOpen(Exception):
+    """受付中でない（解決済み・期限切れの）質問のベストアンサーを選ぼうとした"""
+
+
+def _check_rejected(answer_id, user_id):
+    """ロック付きの取得で対象にならなかった理由を判定する（すでにベストアンサーの場合は False を返す）"""
+    row = (
+        Answer.objects.filter(pk=answer_id)
+        .values_list('is_best_answer', 'question__user_id', 'question__status').first()
+    )
+    if row is None:
+        raise Answer.DoesNotExist(f'Answer {answer_id} does not exist')
+    is_best_answer, owner_id, status = row
+    if owner_id != user_id:
+        raise NotQuestionOwner(answer_id)
+    if is_best_answer:
+        return False
+    raise QuestionNotOpen(status)
+
+
+def mark_best_answer(answer_id, user_id):
+    """
+    質問者 user_id が回答をベストアンサーにして質問を解決済みにする
+
+    受付中の質問のみ対象とし、質問者以外は NotQuestionOwner、受付中でなければ QuestionNotOpen を送出する。
+    すでにベストアンサーの場合は何もせず False を返す。
+    """
+    with transaction.atomic():
+        answer = (
+            Answer.objects.select_related('question')
+            .select_for_update(of=('self', 'question'))
+            .filter(pk=answer_id, question__user_id=user_id, question__status='open')
+            .only('id', 'user_id', 'is_best_answer', 'question__id', 'question__user_id', 'question__title',
+                  'question__reward_points')
+            .first()
+        )
+        if answer is None:
+            return _check_rejected(answer_id, user_id)
+        if answer.is_best_answer:
+            return False
+        
+        question = answer.question
+        Answer.objects.filter(question_id=question.pk).filter(
+            Q(is_best_answer=True) | Q(pk=answer.pk)
+        ).update(
+            is_best_answer=Case(When(pk=answer.pk, then=Value(True)), default=Value(False))
+        )
+        
+        escrow.release(question.pk, answer.user_id)
+        Question.objects.filter(pk=question.pk, status='open').update(status='closed', updated_at=timezone.now())
+        enqueue_best_answer(question, answer.pk)
+        events.question_closed(question.pk, answer.pk)
+    return True
@@ -0,0 +1,71 @@
+"""
+質問ページへのリアルタイム通知
+
+書き込みが確定した後（transaction.on_commit）に、質問ごとのチャンネルへ差分のイベントを配信する。
+クライアントは /api/async/questions/<id>/events/（Server-Sent Events）で受け取り、
+質問全体を取得し直さずに画面を更新する:
+
+- answer_created: {'answer': AnswerSerializer の形式, 'answers_count': 回答数}
+- vote_changed: {'answer_id': 回答ID, 'helpful_votes': 役立った票の数}
+- question_closed: {'question_id': 質問ID, 'status': 'closed', 'status_display': 表示名, 'best_answer_id': ベストアンサーのID}
+
+メッセージは SSE のイベントの形式（``event: ...\\ndata: ...\\n\\n``）のまま配信し、購読者ごとに変換しない。
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from oshare_style_answers.pubsub import publish
+from .models import AnswerVote, Question
+from .serializers import AnswerSerializer
+
+
+def question_channel(question_id):
+    return f'question:{question_id}'
+
+
+def encode_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)}\n\n'
+
+
+def publish_on_commit(question_id, event, get_data):
+    """確定後に get_data() の結果をイベントとして配信する（配信の失敗は書き込みを失敗させない）"""
+
+    def send():
+        publish(question_channel(question_id), encode_event(event, get_data()))
+
+    transaction.on_commit(send, robust=True)
+
+
+def answer_created(answer):
+    def get_data():
+        # 作成直後の回答には投票がないため、投票の取得を省く
+        answer._prefetched_objects_cache = {'votes': AnswerVote.objects.none()}
+        return {
+            'answer': AnswerSerializer(answer).data,
+            'answers_count': (
+                Question.objects.filter(pk=answer.question_id).values_list('answers_count', flat=True).get()
+            ),
+        }
+
+    publish_on_commit(answer.question_id, 'answer_created', get_data)
+
+
+def vote_changed(question_id, answer_id, helpful_votes):
+    publish_on_commit(
+        question_id, 'vote_changed', lambda: {'answer_id': answer_id, 'helpful_votes': helpful_votes}
+    )
+
+
+def question_closed(question_id, best_answer_id):
+    publish_on_commit(
+        question_id, 'question_closed',
+        lambda: {
+            'question_id': question_id,
+            'status': 'closed',
+            'status_display': dict(Question.STATUS_CHOICES)['closed'],
+            'best_answer_id': best_answer_id,
+        },
+    )
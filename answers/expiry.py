@@ -0,0 +1,92 @@
+"""
+受付中の質問の期限切れ
+
+投稿から QUESTION_EXPIRY['AFTER_DAYS'] 日が過ぎても解決しない質問を expired にする（expire_questions コマンド）。
+対象は status='open' の部分インデックス（question_open_created_idx）を古い順に範囲スキャンして取り出し、
+BATCH_SIZE 件ずつ1つのトランザクションでステータスの更新と預かった報酬ポイント（accounts.escrow）の精算を行う。
+PostgreSQL では SKIP LOCKED で取り出すため、ベストアンサーの選出中の質問は待たずに次回に回す。
+
+報酬ポイントの扱いは REWARD_POLICY で決める::
+
+    QUESTION_EXPIRY = {
+        'AFTER_DAYS': 30,
+        'BATCH_SIZE': 500,
+        'REWARD_POLICY': 'refund_unanswered',  # 'refund' / 'refund_unanswered' / 'forfeit'
+    }
+
+返還はポイント台帳（accounts.points.credit_chunk）を経由し、バッチ内の質問者ごとに1件の履歴を追記する。
+没収した預かりは誰にも支払わない。
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from accounts import escrow
+from oshare_style_answers.metrics import increment
+from .models import Question
+
+DEFAULT_QUESTION_EXPIRY = {
+    'AFTER_DAYS': 30,
+    'BATCH_SIZE': 500,
+    'REWARD_POLICY': 'refund_unanswered',
+}
+
+REWARD_POLICIES = ('refund', 'refund_unanswered', 'forfeit')
+
+REFUND_REASON = '期限切れの質問の報酬ポイント返還'
+
+
+def get_config():
+    return {**DEFAULT_QUESTION_EXPIRY, **getattr(settings, 'QUESTION_EXPIRY', {})}
+
+
+def _refundable(policy, answers_count):
+    return policy == 'refund' or (policy == 'refund_unanswered' and not answers_count)
+
+
+def expire_chunk(cutoff, batch_size, policy):
+    """
+    cutoff より前に投稿された受付中の質問を古い順に最大 batch_size 件期限切れにし、
+    (期限切れにした質問数, 返還したポイント数) を返す
+    """
+    with transaction.atomic():
+        rows = list(
+            Question.objects.filter(status='open', created_at__lt=cutoff)
+            .select_for_update(skip_locked=True).order_by('created_at')
+            .values_list('pk', 'answers_count')[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+
+        Question.objects.filter(pk__in=[pk for pk, _ in rows]).update(
+            status='expired', updated_at=timezone.now()
+        )
+        refund_ids = [pk for pk, answers_count in rows if _refundable(policy, answers_count)]
+        forfeit_ids = [pk for pk, answers_count in rows if not _refundable(policy, answers_count)]
+        refunded = escrow.settle_expired(refund_ids, forfeit_ids, REFUND_REASON)
+
+    increment('questions_expired_total', len(refund_ids), reward='refunded')
+    increment('questions_expired_total', len(forfeit_ids), reward='forfeited')
+    return len(rows), refunded
+
+
+def expire_questions(now=None, after_days=None, batch_size=None, policy=None):
+    """期限を過ぎた受付中の質問をすべて期限切れにして (期限切れにした質問数, 返還したポイント数) を返す"""
+    config = get_config()
+    after_days = config['AFTER_DAYS'] if after_days is None else after_days
+    batch_size = batch_size or config['BATCH_SIZE']
+    policy = policy or config['REWARD_POLICY']
+    if policy not in REWARD_POLICIES:
+        raise ValueError(f'Unknown reward policy: {policy!r}')
+
+    cutoff = (now or timezone.now()) - timedelta(days=after_days)
+    expired = refunded = 0
+    while True:
+        questions, points = expire_chunk(cutoff, batch_size, policy)
+        expired += questions
+        refunded += points
+        if questions < batch_size:
+            return expired, refunded
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from answers.expiry import REWARD_POLICIES, expire_questions, get_config
+
+
+class Command(BaseCommand):
+    help = '期限を過ぎた受付中の質問を期限切れにして報酬ポイントを返還・没収します（--loop で常駐）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='期限切れにするまでの日数（既定は QUESTION_EXPIRY の AFTER_DAYS）')
+        parser.add_argument('--batch-size', type=int, help='1トランザクションで期限切れにする質問数')
+        parser.add_argument('--policy', choices=REWARD_POLICIES, help='報酬ポイントの扱い')
+        parser.add_argument('--loop', action='store_true', help='終了せずに --interval ごとに実行し続ける')
+        parser.add_argument('--interval', type=float, default=3600, help='実行の間隔（秒、--loop）')
+
+    def handle(self, *args, **options):
+        config = get_config()
+        policy = options['policy'] or config['REWARD_POLICY']
+        try:
+            while True:
+                started = time.perf_counter()
+                expired, refunded = expire_questions(
+                    after_days=options['days'], batch_size=options['batch_size'], policy=policy,
+                )
+                self.stdout.write(self.style.SUCCESS(
+                    f'Expired {expired} questions (policy={policy}, refunded {refunded} points) '
+                    f'in {(time.perf_counter() - started) * 1000:.0f}ms'
+                ))
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
@@ -1,23 +1,30 @@
 from django.core.management.base import BaseCommand
+from django.db.models import Count, F
 from answers.models import Question
 
 
 class Command(BaseCommand):
     help = 'Update answer counts for all questions'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='一度に取得する質問数')
+
     def handle(self, *args, **options):
-        questions = Question.objects.all()
+        # 件数がずれている質問だけを、PostgreSQL ではサーバーサイドカーソルで少しずつ取得する
+        questions = (
+            Question.objects.annotate(actual_count=Count('answers'))
+            .exclude(answers_count=F('actual_count'))
+            .only('id', 'title', 'answers_count')
+            .order_by()
+        )
         updated_count = 0
         
-        for question in questions:
-            actual_count = question.answers.count()
-            if question.answers_count != actual_count:
-                question.answers_count = actual_count
-                question.save(update_fields=['answers_count'])
-                updated_count += 1
-                self.stdout.write(
-                    f'Updated question "{question.title}" - answers_count: {actual_count}'
-                )
+        for question in questions.iterator(chunk_size=options['batch_size']):
+            Question.objects.filter(pk=question.pk).update(answers_count=question.actual_count)
+            updated_count += 1
+            self.stdout.write(
+                f'Updated question "{question.title}" - answers_count: {question.actual_count}'
+            )
         
         self.stdout.write(
             self.style.SUCCESS(f'Successfully updated {updated_count} questions')
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('answers', '0002_add_recommended_products'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('status', 'open')), fields=['status', 'created_at'], name='question_open_created_idx'),
+        ),
+    ]
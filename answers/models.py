@@ -43,6 +43,13 @@ class Question(models.Model):
         verbose_name = '質問'
         verbose_name_plural = '質問'
         ordering = ['-created_at']
+        indexes = [
+            # 期限切れの掃除（answers.expiry）で受付中の古い質問だけを範囲スキャンする
+            models.Index(
+                fields=['status', 'created_at'], name='question_open_created_idx',
+                condition=models.Q(status='open'),
+            ),
+        ]
     
     def __str__(self):
         return self.title
@@ -1,4 +1,6 @@
+from django.db import models, transaction
 from rest_framework import serializers
+from accounts import escrow
 from .models import Question, Answer, AnswerVote
 from django.contrib.auth import get_user_model
 import sys
@@ -15,6 +17,33 @@ class AnswerVoteSerializer(serializers.ModelSerializer):
         model = AnswerVote
         fields = ['id', 'is_helpful', 'created_at']
 
+class AnswerListSerializer(serializers.ListSerializer):
+    """回答一覧の推奨商品を1回のクエリでまとめて取得する"""
+    
+    def to_representation(self, data):
+        answers = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        product_ids = {
+            product_id
+            for answer in answers
+            for product_id in (answer.recommended_products or [])
+        }
+        # 非同期ビューは事前に取得した辞書を context に入れて渡す（シリアライズ中にクエリを実行しない）
+        if 'recommended_products' not in self.child.context:
+            self.child.context['recommended_products'] = recommended_products_map(product_ids)
+        return super().to_representation(answers)
+
+
+def recommended_products_map(product_ids):
+    """商品ID→商品（ブランド付き）の辞書"""
+    from items.models import Item
+    if not product_ids:
+        return {}
+    return {
+        product.id: product
+        for product in Item.objects.filter(id__in=product_ids, is_available=True).select_related('brand')
+    }
+
+
 class AnswerSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     votes = AnswerVoteSerializer(many=True, read_only=True)
@@ -28,6 +57,7 @@ class AnswerSerializer(serializers.ModelSerializer):
             'user', 'is_best_answer', 'helpful_votes',
             'created_at', 'updated_at', 'votes', 'votes_count'
         ]
+        list_serializer_class = AnswerListSerializer
     
     def get_votes_count(self, obj):
         return obj.votes.count()
@@ -38,8 +68,14 @@ class AnswerSerializer(serializers.ModelSerializer):
             return []
         
         try:
-            from items.models import Item
-            products = Item.objects.filter(id__in=obj.recommended_products, is_available=True)
+            products_by_id = self.context.get('recommended_products')
+            if products_by_id is None:
+                products_by_id = recommended_products_map(obj.recommended_products)
+            products = [
+                products_by_id[product_id]
+                for product_id in obj.recommended_products
+                if product_id in products_by_id
+            ]
             return [
                 {
                     'id': product.id,
@@ -196,6 +232,16 @@ class QuestionCreateSerializer(serializers.ModelSerializer):
         if value < 10 or value > 1000:
             raise serializers.ValidationError("報酬ポイントは10から1000の間で設定してください。")
         return value
+    
+    def create(self, validated_data):
+        # 報酬ポイントは質問の作成と同じトランザクションで預かり、残高が足りなければ作成しない
+        with transaction.atomic():
+            question = super().create(validated_data)
+            try:
+                escrow.hold(question)
+            except escrow.InsufficientPoints:
+                raise serializers.ValidationError({'reward_points': ['所持ポイントが足りません。']})
+        return question
 
 class QuestionListSerializer(serializers.ModelSerializer):
     """質問一覧用の軽量シリアライザー"""
@@ -1,20 +1,34 @@
+from django.db.models import F
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+
+from accounts.notifications import enqueue_answer_created
+from . import events
 from .models import Answer, Question
+from .tasks import process_image, recount_question_answers
 
 
 @receiver(post_save, sender=Answer)
 def update_answer_count_on_save(sender, instance, created, **kwargs):
-    """回答が作成された時に質問の回答数を更新"""
+    """回答が作成された時に質問の回答数を更新（数え直しはジョブで行う）"""
     if created:
-        question = instance.question
-        question.answers_count = question.answers.count()
-        question.save(update_fields=['answers_count'])
+        Question.objects.filter(pk=instance.question_id).update(answers_count=F('answers_count') + 1)
+        recount_question_answers.enqueue(instance.question_id)
+        events.answer_created(instance)
+        enqueue_answer_created(instance)
+        if instance.image:
+            process_image.enqueue('answers.Answer', instance.pk)
+
+
+@receiver(post_save, sender=Question)
+def process_question_image(sender, instance, created, **kwargs):
+    """質問の画像をジョブで縮小"""
+    if created and instance.image:
+        process_image.enqueue('answers.Question', instance.pk)
 
 
 @receiver(post_delete, sender=Answer)
 def update_answer_count_on_delete(sender, instance, **kwargs):
-    """回答が削除された時に質問の回答数を更新"""
-    question = instance.question
-    question.answers_count = question.answers.count()
-    question.save(update_fields=['answers_count'])
+    """回答が削除された時に質問の回答数を更新（数え直しはジョブで行う）"""
+    Question.objects.filter(pk=instance.question_id, answers_count__gt=0).update(answers_count=F('answers_count') - 1)
+    recount_question_answers.enqueue(instance.question_id)
@@ -0,0 +1,69 @@
+"""
+Q&Aのバックグラウンドジョブ（jobs.queue）
+
+リクエストの応答に必要ない処理をワーカーで実行する:
+
+- recount_question_answers: 回答の追加・削除後の回答数の再集計（同じ質問の連続した書き込みは1回にまとめる）
+- process_image: アップロードされた画像の向きの補正と縮小
+"""
+
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from jobs.queue import job
+from .models import Answer, Question
+
+# 保存する画像の長辺の上限（ピクセル）
+MAX_IMAGE_SIZE = 1600
+JPEG_QUALITY = 85
+
+
+@job(unique=True)
+def recount_question_answers(question_id):
+    """質問の回答数を1回のUPDATEで数え直す"""
+    answers = (
+        Answer.objects.filter(question_id=OuterRef('pk'))
+        .order_by().values('question_id').annotate(count=Count('pk')).values('count')
+    )
+    Question.objects.filter(pk=question_id).update(answers_count=Coalesce(Subquery(answers), 0))
+
+
+@job(priority=-5, atomic=False)
+def process_image(model_label, pk, field_name='image'):
+    """
+    画像を EXIF の向きに合わせて回転し、長辺が MAX_IMAGE_SIZE を超える場合は縮小して保存し直す
+
+    処理中に画像が差し替えられていた場合は新しいファイルを削除し、差し替え後の画像を残す。
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only('pk', field_name).first()
+    field_file = getattr(instance, field_name, None) if instance else None
+    if not field_file:
+        return
+
+    try:
+        with field_file.open('rb') as f, Image.open(f) as image:
+            image_format = image.format
+            transposed = ImageOps.exif_transpose(image)
+            if transposed is image and max(image.size) <= MAX_IMAGE_SIZE:
+                return
+            transposed.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE))
+            buffer = BytesIO()
+            if image_format == 'JPEG':
+                transposed.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            else:
+                transposed.save(buffer, image_format)
+    except (FileNotFoundError, UnidentifiedImageError):
+        return
+
+    old_name = field_file.name
+    new_name = field_file.storage.save(old_name, ContentFile(buffer.getvalue()))
+    if model.objects.filter(pk=pk, **{field_name: old_name}).update(**{field_name: new_name}):
+        field_file.storage.delete(old_name)
+    else:
+        field_file.storage.delete(new_name)
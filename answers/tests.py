@@ -1,3 +1,350 @@
-from django.test import TestCase
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from accounts import escrow
+from accounts.models import PointEscrow, PointHistory
+from jobs.worker import run_pending
+from oshare_style_answers.pubsub import InProcessBroker, SubscriptionOverflow
+from oshare_style_answers.query_budget import QueryBudgetExceeded
+from .best_answers import QuestionNotOpen, mark_best_answer
+from .expiry import expire_questions
+from .models import Answer, AnswerVote, Question
+from .views import AnswerListView
+from .votes import cast_vote
+
+User = get_user_model()
+
+
+def create_answer(author):
+    asker = User.objects.create_user(username=f'asker-{author.username}')
+    question = Question.objects.create(user=asker, title='質問', content='内容')
+    return Answer.objects.create(question=question, user=author, content='回答')
+
+
+class VoteAnswerTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.voter = User.objects.create_user(username='voter')
+        self.answer = create_answer(self.author)
+
+    def test_new_vote_flip_and_noop(self):
+        self.assertEqual(cast_vote(self.answer, self.voter, True).delta, 1)
+        self.assertEqual(cast_vote(self.answer, self.voter, True).delta, 0)
+        self.assertEqual(cast_vote(self.answer, self.voter, False).delta, -1)
+        self.assertEqual(cast_vote(self.answer, User.objects.create_user(username='other'), False).delta, 0)
+
+        self.answer.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.answer.helpful_votes, 0)
+        self.assertFalse(self.answer.is_helpful)
+        self.assertEqual(self.author.helpful_answers_count, 0)
+
+    def test_vote_api_does_not_recount(self):
+        self.client.force_authenticate(self.voter)
+        url = f'/api/accounts/answers/{self.answer.pk}/vote/'
+        self.client.post(url, {'is_helpful': True}, format='json')
+
+        # 反転: 投票の UPDATE、回答の UPDATE（1→0）、回答者の UPDATE、件数の取得 + セーブポイント
+        with self.assertNumQueries(7):
+            response = self.client.post(url, {'is_helpful': False}, format='json')
+        self.assertEqual(response.data['helpful_votes'], 0)
+
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.helpful_answers_count, 0)
+
+
+class MarkBestAnswerTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.answer = create_answer(self.author)
+        self.other = Answer.objects.create(
+            question=self.answer.question, user=User.objects.create_user(username='other'),
+            content='別の回答', is_best_answer=True
+        )
+        self.url = f'/api/accounts/answers/{self.answer.pk}/best/'
+        question = self.answer.question
+        User.objects.filter(pk=question.user_id).update(points=10)
+        escrow.hold(question)
+        self.asker = question.user
+        self.client.force_authenticate(self.asker)
+
+    def test_marks_best_answer_within_query_budget(self):
+        # ロック付き取得、ベストアンサーの付け替え、預かりの支払い待ち化、支払いジョブ、質問の更新、
+        # 通知イベント、配信ジョブ + セーブポイント
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url)
+        self.assertTrue(response.data['success'])
+        self.assertEqual((response.data['status'], response.data['best_answer_id']), ('closed', self.answer.pk))
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.points, 0)
+        self.assertEqual(run_pending(), {'succeeded': 3})
+
+        self.answer.refresh_from_db()
+        self.other.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertTrue(self.answer.is_best_answer)
+        self.assertFalse(self.other.is_best_answer)
+        self.assertEqual((self.author.points, self.author.total_earned_points), (10, 10))
+        self.assertEqual(PointHistory.objects.get(user=self.author).balance_after, 10)
+        self.assertEqual(Question.objects.get().status, 'closed')
+        self.assertEqual(PointEscrow.objects.get().status, 'released')
+
+    def test_already_best_answer_is_noop(self):
+        self.client.post(self.url)
+        # ロック付き取得で対象外になり、理由を判定する取得 + セーブポイント
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url)
+        self.assertTrue(response.data['success'])
+        run_pending()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.points, 10)
+
+    def test_closed_question_cannot_change_best_answer(self):
+        self.client.post(self.url)
+        response = self.client.post(f'/api/accounts/answers/{self.other.pk}/best/')
+        self.assertEqual(response.status_code, 409)
+        run_pending()
+        self.assertEqual(
+            dict(User.objects.filter(username__in=['author', 'other']).values_list('username', 'points')),
+            {'author': 10, 'other': 0},
+        )
+
+    def test_only_the_asker_can_mark_best_answer(self):
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.post(self.url).status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.post(self.url).status_code, 401)
+        self.assertEqual(self.client.post('/api/accounts/answers/999/best/').status_code, 401)
+
+        self.assertEqual(Question.objects.get().status, 'open')
+        self.assertEqual(PointEscrow.objects.get().status, 'held')
+        self.answer.refresh_from_db()
+        self.assertFalse(self.answer.is_best_answer)
+
+    def test_expired_question_is_not_closed(self):
+        Question.objects.update(status='expired')
+        self.assertEqual(self.client.post(self.url).status_code, 409)
+        self.assertEqual(Question.objects.get().status, 'expired')
+        self.assertEqual(PointEscrow.objects.get().status, 'held')
+
+
+class QuestionExpiryTest(TestCase):
+    def setUp(self):
+        self.asker = User.objects.create_user(username='asker', points=100)
+        self.answerer = User.objects.create_user(username='answerer')
+        old = timezone.now() - timedelta(days=31)
+        self.unanswered = Question.objects.create(user=self.asker, title='回答なし', content='内容', reward_points=50)
+        self.answered = Question.objects.create(user=self.asker, title='回答あり', content='内容', reward_points=30)
+        Answer.objects.create(question=self.answered, user=self.answerer, content='回答')
+        self.closed = Question.objects.create(user=self.asker, title='解決済み', content='内容', status='closed')
+        self.fresh = Question.objects.create(user=self.asker, title='新しい質問', content='内容')
+        for question in (self.unanswered, self.answered, self.fresh):
+            escrow.hold(question)
+        Question.objects.exclude(pk=self.fresh.pk).update(created_at=old)
+
+    def refunds(self):
+        return list(PointHistory.objects.filter(points__gt=0).values_list('user__username', 'points', 'balance_after'))
+
+    def escrows(self):
+        return dict(PointEscrow.objects.values_list('question__title', 'status'))
+
+    def statuses(self):
+        return dict(Question.objects.values_list('title', 'status'))
+
+    def test_expires_old_open_questions_in_chunks(self):
+        self.assertEqual(expire_questions(batch_size=1, policy='refund_unanswered'), (2, 50))
+        self.assertEqual(self.statuses(), {
+            '回答なし': 'expired', '回答あり': 'expired', '解決済み': 'closed', '新しい質問': 'open',
+        })
+        self.asker.refresh_from_db()
+        self.assertEqual((self.asker.points, self.asker.total_earned_points), (60, 0))
+        self.assertEqual(self.refunds(), [('asker', 50, 60)])
+        self.assertEqual(self.escrows(), {'回答なし': 'refunded', '回答あり': 'forfeited', '新しい質問': 'held'})
+
+        self.assertEqual(expire_questions(policy='refund'), (0, 0))
+        self.assertEqual(self.client.get('/api/stats/').data['expired_questions'], 2)
+
+    def test_refund_is_one_ledger_entry_per_asker(self):
+        self.assertEqual(expire_questions(policy='refund'), (2, 80))
+        self.assertEqual(self.refunds(), [('asker', 80, 90)])
+
+    def test_forfeit_keeps_points(self):
+        self.assertEqual(expire_questions(policy='forfeit'), (2, 0))
+        self.assertEqual(self.refunds(), [])
+        self.assertEqual(self.escrows(), {'回答なし': 'forfeited', '回答あり': 'forfeited', '新しい質問': 'held'})
+
+    def test_unfunded_escrow_is_forfeited_instead_of_refunded(self):
+        PointEscrow.objects.filter(question=self.unanswered).update(funded=False)
+        self.assertEqual(expire_questions(policy='refund'), (2, 30))
+        self.assertEqual(self.refunds(), [('asker', 30, 40)])
+        self.assertEqual(self.escrows(), {'回答なし': 'forfeited', '回答あり': 'refunded', '新しい質問': 'held'})
+
+    def test_best_answer_after_expiry_pays_nothing(self):
+        answer = self.answered.answers.get()
+        expire_questions(policy='refund')
+        with self.assertRaises(QuestionNotOpen):
+            mark_best_answer(answer.pk, self.asker.pk)
+        run_pending()
+        self.assertEqual(User.objects.get(pk=self.answerer.pk).points, 0)
+        self.assertEqual(Question.objects.get(pk=self.answered.pk).status, 'expired')
+
+
+@override_settings(QUERY_BUDGET={**settings.QUERY_BUDGET, 'ENABLED': True, 'RAISE': True})
+class QueryBudgetTest(APITestCase):
+    def setUp(self):
+        self.answer = create_answer(User.objects.create_user(username='author'))
+
+    def test_query_count_does_not_grow_with_answers(self):
+        first = self.client.get('/api/answers/')['X-Query-Count']
+        for i in range(5):
+            Answer.objects.create(
+                question=self.answer.question, content='回答',
+                user=User.objects.create_user(username=f'user-{i}')
+            )
+        self.assertEqual(self.client.get('/api/answers/')['X-Query-Count'], first)
+
+    def test_detail_view_increments_views_count_in_database(self):
+        question = self.answer.question
+        # 他のリクエストが先に加算した分を上書きしない
+        Question.objects.filter(pk=question.pk).update(views_count=10)
+        response = self.client.get(f'/api/questions/{question.pk}/')
+        self.assertEqual(response.data['views_count'], 11)
+        question.refresh_from_db()
+        self.assertEqual(question.views_count, 11)
+
+    def test_exceeding_budget_raises(self):
+        with mock.patch.object(AnswerListView, 'query_budget', 0):
+            with override_settings(QUERY_BUDGET={**settings.QUERY_BUDGET, 'ALLOWANCE': 0}):
+                with self.assertRaises(QueryBudgetExceeded), self.assertLogs('django.request', 'ERROR'):
+                    self.client.get('/api/answers/')
+
+
+class VoteConcurrencyTest(TransactionTestCase):
+    def _vote(self, args):
+        answer_id, user_id, is_helpful = args
+        # SQLiteのテストDBはテーブルロックで即時エラーになるため、確定するまで再試行
+        try:
+            while True:
+                try:
+                    return cast_vote(Answer(pk=answer_id, user_id=self.author.pk), User(pk=user_id), is_helpful)
+                except OperationalError:
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_concurrent_votes_keep_counts_exact(self):
+        self.author = User.objects.create_user(username='author')
+        answers = [create_answer(self.author), create_answer(User.objects.create_user(username='author2'))]
+        answers[1].user = self.author
+        answers[1].save()
+        voters = [User.objects.create_user(username=f'voter-{i}') for i in range(20)]
+
+        # 各投票者が同じ回答に対して賛成・反対・賛成を繰り返す
+        jobs = [
+            (answer.pk, voter.pk, is_helpful)
+            for is_helpful in (True, False, True, True, False, True)
+            for answer in answers
+            for voter in voters
+        ]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(self._vote, jobs))
+
+        for answer in answers:
+            answer.refresh_from_db()
+            self.assertEqual(
+                answer.helpful_votes,
+                AnswerVote.objects.filter(answer=answer, is_helpful=True).count()
+            )
+        self.author.refresh_from_db()
+        self.assertEqual(
+            self.author.helpful_answers_count,
+            Answer.objects.filter(user=self.author, helpful_votes__gt=0).count()
+        )
+
+
+class QuestionEventsTest(APITestCase):
+    def setUp(self):
+        self.answer = create_answer(User.objects.create_user(username='author'))
+        self.url = f'/api/async/questions/{self.answer.question_id}/events/'
+
+    def _write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cast_vote(self.answer, User.objects.create_user(username='voter'), True)
+            mark_best_answer(self.answer.pk, self.answer.question.user_id)
+            Answer.objects.create(
+                question_id=self.answer.question_id, user=self.answer.user, content='追加の回答です'
+            )
+
+    def test_write_apis_return_deltas(self):
+        # WSGI など差分を受信できない場合も、フロントエンドは書き込みAPIの応答だけで画面を更新する
+        self.client.force_authenticate(self.answer.user)
+        response = self.client.post(
+            '/api/answers/create/', {'question': self.answer.question_id, 'content': 'この色の組み合わせがおすすめです'}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['user']['username'], 'author')
+        self.assertEqual((response.data['question'], response.data['helpful_votes']), (self.answer.question_id, 0))
+        self.assertEqual(response.data['votes'], [])
+
+        self.client.force_authenticate(User.objects.create_user(username='voter'))
+        response = self.client.post(f'/api/accounts/answers/{self.answer.pk}/vote/', {'is_helpful': True}, format='json')
+        self.assertEqual(response.data['helpful_votes'], 1)
+
+    def test_streams_changes_as_events(self):
+        async def receive():
+            response = await self.async_client.get(self.url)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = aiter(response.streaming_content)
+            try:
+                self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+                await sync_to_async(self._write)()
+                return [(await anext(stream)).decode() for _ in range(3)]
+            finally:
+                await stream.aclose()
+
+        events = []
+        for message in async_to_sync(receive)():
+            name, data = message.strip().split('\n')
+            events.append((name.removeprefix('event: '), json.loads(data.removeprefix('data: '))))
+
+        self.assertEqual(events[0], ('vote_changed', {'answer_id': self.answer.pk, 'helpful_votes': 1}))
+        self.assertEqual(events[1][0], 'question_closed')
+        self.assertEqual(events[1][1]['best_answer_id'], self.answer.pk)
+        self.assertEqual(events[2][0], 'answer_created')
+        self.assertEqual(events[2][1]['answers_count'], 2)
+        self.assertEqual(events[2][1]['answer']['content'], '追加の回答です')
+
+    def test_requires_asgi(self):
+        with self.assertLogs('django.request', 'ERROR'):
+            self.assertEqual(self.client.get(self.url).status_code, 501)
+        with self.assertLogs('django.request', 'WARNING'):
+            response = async_to_sync(self.async_client.get)('/api/async/questions/999/events/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_slow_subscriber_is_told_to_resync(self):
+        broker = InProcessBroker(max_queue=2)
+
+        async def receive():
+            async with broker.subscribe('question:1') as subscription:
+                for i in range(3):
+                    broker.publish('question:1', str(i))
+                await asyncio.sleep(0)
+                received = [await subscription.get(), await subscription.get()]
+                with self.assertRaises(SubscriptionOverflow):
+                    await subscription.get()
+            return received
+
+        self.assertEqual(async_to_sync(receive)(), ['0', '1'])
+        self.assertEqual(broker._channels, {})
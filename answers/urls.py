@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # 質問関連API
@@ -12,6 +12,12 @@ urlpatterns = [
     
     # 統計API
     path('stats/', views.qa_stats, name='qa_stats'),
+
+    # 非同期版（ASGI で配信する読み込みAPI）
+    path('async/questions/', async_views.question_list, name='question_list_async'),
+    path('async/questions/<int:pk>/', async_views.question_detail, name='question_detail_async'),
+    path('async/questions/<int:pk>/events/', async_views.question_events, name='question_events'),
+    path('async/stats/', async_views.qa_stats, name='qa_stats_async'),
     
     # テスト用API
     path('formdata-test/', views.FormDataTestView.as_view(), name='formdata_test'),
@@ -5,17 +5,20 @@ from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.views import APIView
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.db.models import Count, F, Q
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import Question, Answer, AnswerVote
 from .serializers import (
     QuestionSerializer, QuestionListSerializer, 
     AnswerSerializer, QuestionCreateSerializer, AnswerCreateSerializer
 )
+from oshare_style_answers.query_budget import query_budget
 import logging
 import sys
 
 logger = logging.getLogger(__name__)
 
+@query_budget({'GET': 1, 'POST': 10})
 @method_decorator(csrf_exempt, name='dispatch')
 class QuestionListCreateView(generics.ListCreateAPIView):
     """質問一覧・作成API"""
@@ -107,6 +110,7 @@ class QuestionListCreateView(generics.ListCreateAPIView):
         logger.info(f"=== perform_create completed ===")
         return question
 
+@query_budget(6)
 class QuestionDetailView(generics.RetrieveAPIView):
     """質問詳細API"""
     queryset = Question.objects.select_related('user').prefetch_related(
@@ -117,13 +121,14 @@ class QuestionDetailView(generics.RetrieveAPIView):
     def retrieve(self, request, *args, **kwargs):
         """質問を取得する際に閲覧数を増やす"""
         instance = self.get_object()
-        # 閲覧数を増やす
+        # 閲覧数を増やす（同時アクセスで加算が失われないようにDB側で加算する）
+        Question.objects.filter(pk=instance.pk).update(views_count=F('views_count') + 1)
         instance.views_count += 1
-        instance.save(update_fields=['views_count'])
         
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
 
+@query_budget(3)
 class AnswerListView(generics.ListAPIView):
     """回答一覧API"""
     serializer_class = AnswerSerializer
@@ -135,18 +140,31 @@ class AnswerListView(generics.ListAPIView):
     def get_queryset(self):
         return Answer.objects.select_related('user').prefetch_related('votes')
 
+def question_stats():
+    return Question.objects.aggregate(
+        total_questions=Count('id'),
+        open_questions=Count('id', filter=Q(status='open')),
+        closed_questions=Count('id', filter=Q(status='closed')),
+        expired_questions=Count('id', filter=Q(status='expired')),
+    )
+
+
+def answer_stats():
+    return Answer.objects.aggregate(
+        total_answers=Count('id'),
+        best_answers=Count('id', filter=Q(is_best_answer=True)),
+    )
+
+
+@query_budget(2)
 @api_view(['GET'])
 def qa_stats(request):
     """Q&A統計情報API"""
-    stats = {
-        'total_questions': Question.objects.count(),
-        'open_questions': Question.objects.filter(status='open').count(),
-        'closed_questions': Question.objects.filter(status='closed').count(),
-        'total_answers': Answer.objects.count(),
-        'best_answers': Answer.objects.filter(is_best_answer=True).count(),
-    }
+    stats = question_stats()
+    stats.update(answer_stats())
     return Response(stats)
 
+@query_budget(0)
 class FormDataTestView(APIView):
     """FormDataテスト用ビュー"""
     parser_classes = [MultiPartParser, FormParser, JSONParser]
@@ -158,6 +176,7 @@ class FormDataTestView(APIView):
         print(f"Request FILES: {request.FILES}")
         return Response({"message": "FormData test successful", "data": dict(request.data)})
     
+@query_budget(9)
 @method_decorator(csrf_exempt, name='dispatch')
 class AnswerCreateView(generics.CreateAPIView):
     """回答投稿API"""
@@ -209,7 +228,15 @@ class AnswerCreateView(generics.CreateAPIView):
                 print(f"  Field '{field}' errors: {errors}", file=sys.stderr)
         
         print("=== End Debug ===", file=sys.stderr)
-        return super().create(request, *args, **kwargs)
+        response = super().create(request, *args, **kwargs)
+        # 画面に追加できるよう、回答一覧（answer_created イベント）と同じ形式で返す
+        answer = self.created_answer
+        answer._prefetched_objects_cache = {'votes': AnswerVote.objects.none()}
+        response.data = {
+            **AnswerSerializer(answer, context=self.get_serializer_context()).data,
+            'question': answer.question_id,
+        }
+        return response
     
     def perform_create(self, serializer):
         # ユーザー認証の確認とログイン中のユーザーを設定
@@ -248,6 +275,7 @@ class AnswerCreateView(generics.CreateAPIView):
         print(f"Using user: {user.username} (ID: {user.id})", file=sys.stderr)
         
         instance = serializer.save(user=user)
+        self.created_answer = instance
         
         print(f"Saved instance: {instance}", file=sys.stderr)
         print(f"Saved instance user: {instance.user.username} (ID: {instance.user.id})", file=sys.stderr)
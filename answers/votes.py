@@ -0,0 +1,86 @@
+"""
+回答への投票
+
+投票の変化（新規・反転・変化なし）を1回の条件付き UPDATE か INSERT で判定し、
+Answer.helpful_votes を F() で ±1 する。件数を数え直さないため、投票数に関係なく一定のクエリ数で済む。
+回答の helpful_votes が 0 と 1 の間で変わったときだけ、回答者の helpful_answers_count と
+Answer.is_helpful を更新する。
+投票数が変わった場合は確定後に質問ページへ vote_changed を配信する（answers.events）。
+"""
+
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from accounts.authentication import invalidate_users
+from . import events
+from .models import Answer, AnswerVote
+
+
+@dataclass
+class VoteResult:
+    """投票結果（delta は helpful_votes の増減）"""
+    delta: int
+    helpful_votes: int
+
+
+def _upsert_vote(answer_id, user_id, is_helpful):
+    """投票を反映し、役立った票の増減（-1, 0, +1）を返す"""
+    delta = 1 if is_helpful else -1
+    # 既存の投票と値が異なる場合のみ反転する
+    if AnswerVote.objects.filter(answer_id=answer_id, user_id=user_id).exclude(
+        is_helpful=is_helpful
+    ).update(is_helpful=is_helpful):
+        return delta
+
+    try:
+        with transaction.atomic():
+            AnswerVote.objects.create(answer_id=answer_id, user_id=user_id, is_helpful=is_helpful)
+    except IntegrityError:
+        # 同じ値の投票が既にある（または同時に作成された）場合
+        if AnswerVote.objects.filter(answer_id=answer_id, user_id=user_id).exclude(
+            is_helpful=is_helpful
+        ).update(is_helpful=is_helpful):
+            return delta
+        return 0
+    return 1 if is_helpful else 0
+
+
+def _apply_delta(answer, delta):
+    User = get_user_model()
+    answers = Answer.objects.filter(pk=answer.pk)
+
+    if delta > 0:
+        became_helpful = answers.filter(helpful_votes=0).update(helpful_votes=1, is_helpful=True)
+        if became_helpful:
+            User.objects.filter(pk=answer.user_id).update(
+                helpful_answers_count=F('helpful_answers_count') + 1
+            )
+            invalidate_users([answer.user_id])
+        else:
+            answers.update(helpful_votes=F('helpful_votes') + 1)
+    elif delta < 0:
+        lost_helpful = answers.filter(helpful_votes=1).update(helpful_votes=0, is_helpful=False)
+        if lost_helpful:
+            User.objects.filter(pk=answer.user_id, helpful_answers_count__gt=0).update(
+                helpful_answers_count=F('helpful_answers_count') - 1
+            )
+            invalidate_users([answer.user_id])
+        else:
+            answers.filter(helpful_votes__gt=0).update(helpful_votes=F('helpful_votes') - 1)
+
+
+def cast_vote(answer, user, is_helpful=True):
+    """回答に投票して VoteResult を返す"""
+    with transaction.atomic():
+        delta = _upsert_vote(answer.pk, user.pk, is_helpful)
+        if delta:
+            _apply_delta(answer, delta)
+        helpful_votes, question_id = (
+            Answer.objects.filter(pk=answer.pk).values_list('helpful_votes', 'question_id').get()
+        )
+        if delta:
+            events.vote_changed(question_id, answer.pk, helpful_votes)
+    return VoteResult(delta=delta, helpful_votes=helpful_votes)
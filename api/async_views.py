@@ -0,0 +1,72 @@
+"""
+商品・トップページの読み込みAPIの非同期版（ASGI で配信する）
+
+同期版（views.py）と同じ形式の JSON を返し、互いに独立したクエリを同時に実行する。
+"""
+
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+
+from answers.models import Question
+from answers.serializers import QuestionListSerializer
+from answers.views import answer_stats, question_stats
+from items.models import Item, ItemImage
+from oshare_style_answers.async_views import filtered_queryset, gather_queries, json_response, not_found_response
+from oshare_style_answers.query_budget import query_budget
+from .serializers import ItemImageSerializer, ItemListSerializer, ItemSerializer
+from .views import ItemListView
+
+# トップページに表示する件数
+HOME_FEATURED_ITEMS = 8
+HOME_LATEST_QUESTIONS = 10
+
+
+@query_budget(1)
+@require_GET
+async def item_list(request):
+    """商品一覧API（ItemListView と同じ絞り込み・検索・並び替え）"""
+    try:
+        items, = await gather_queries(lambda: list(filtered_queryset(ItemListView, request)))
+    except ValidationError as exc:
+        return json_response(exc.detail, status=400)
+    return json_response(ItemListSerializer(items, many=True, context={'request': request}).data)
+
+
+@query_budget(2)
+@require_GET
+async def item_detail(request, pk):
+    """商品詳細API（商品と追加画像を同時に取得する）"""
+    item, images = await gather_queries(
+        lambda: Item.objects.filter(pk=pk, is_available=True).select_related('brand', 'category').first(),
+        lambda: list(ItemImage.objects.filter(item_id=pk)),
+    )
+    if item is None:
+        return not_found_response(Item)
+
+    context = {'request': request}
+    serializer = ItemSerializer(item, context=context)
+    del serializer.fields['additional_images']
+    data = serializer.data
+    data['additional_images'] = ItemImageSerializer(images, many=True, context=context).data
+    return json_response({name: data[name] for name in ItemSerializer.Meta.fields})
+
+
+@query_budget(4)
+@require_GET
+async def home(request):
+    """トップページ用API（おすすめ商品・新着の質問・Q&A統計をまとめて同時に取得する）"""
+    items, questions, question_counts, answer_counts = await gather_queries(
+        lambda: list(
+            Item.objects.filter(is_available=True, is_featured=True)
+            .select_related('brand', 'category').order_by('-created_at')[:HOME_FEATURED_ITEMS]
+        ),
+        lambda: list(Question.objects.select_related('user').order_by('-created_at')[:HOME_LATEST_QUESTIONS]),
+        question_stats,
+        answer_stats,
+    )
+    context = {'request': request}
+    return json_response({
+        'featured_items': ItemListSerializer(items, many=True, context=context).data,
+        'latest_questions': QuestionListSerializer(questions, many=True, context=context).data,
+        'stats': {**question_counts, **answer_counts},
+    })
@@ -0,0 +1 @@
+# 空のファイル
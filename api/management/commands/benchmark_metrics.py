@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, override_settings
+from django.urls import resolve
+
+from oshare_style_answers.metrics import MetricsMiddleware, registry
+
+METRICS_MIDDLEWARE = 'oshare_style_answers.metrics.MetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = 'MetricsMiddleware のオーバーヘッドを、ミドルウェアを外した場合と比較して計測します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='計測するパス（複数指定可、既定は /api/test/ /api/items/ /api/questions/）'
+        )
+        parser.add_argument('--requests', type=int, default=500, help='1ラウンドあたりのリクエスト数')
+        parser.add_argument('--rounds', type=int, default=5, help='ラウンド数（各モードの最速ラウンドを採用）')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/api/test/', '/api/items/', '/api/questions/']
+        without_metrics = [name for name in settings.MIDDLEWARE if name != METRICS_MIDDLEWARE]
+        modes = (
+            ('without', without_metrics),
+            ('with', [METRICS_MIDDLEWARE] + without_metrics),
+        )
+        
+        for path in paths:
+            best = {}
+            for _ in range(options['rounds']):
+                # 順番による偏りを避けるため、ラウンドごとに両方のモードを交互に計測する
+                for mode, middleware in modes:
+                    with override_settings(MIDDLEWARE=middleware):
+                        client = Client(HTTP_HOST='localhost')
+                        client.get(path)  # ミドルウェアの読み込みとウォームアップ
+                        started = time.perf_counter()
+                        for _ in range(options['requests']):
+                            client.get(path)
+                        elapsed = time.perf_counter() - started
+                    best[mode] = min(best.get(mode, elapsed), elapsed)
+            
+            per_request = {mode: elapsed / options['requests'] * 1e6 for mode, elapsed in best.items()}
+            overhead = (per_request['with'] - per_request['without']) / per_request['without'] * 100
+            self.stdout.write(
+                f'{path:24} without={per_request["without"]:.0f}us/req  '
+                f'with={per_request["with"]:.0f}us/req  overhead={overhead:+.2f}%'
+            )
+        
+        # 実際のリクエストはばらつきが大きいため、ミドルウェア単体のコストも計測する
+        request = RequestFactory().get(paths[0])
+        request.resolver_match = resolve(paths[0])
+        response = HttpResponse(b'x' * 1000)
+        middleware = MetricsMiddleware(lambda request: response)
+        iterations = options['requests'] * 20
+        started = time.perf_counter()
+        for _ in range(iterations):
+            middleware(request)
+        self.stdout.write(f'MetricsMiddleware alone: {(time.perf_counter() - started) / iterations * 1e6:.1f}us/req')
+        
+        registry.reset()
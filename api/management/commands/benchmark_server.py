@@ -0,0 +1,196 @@
+"""
+アプリケーションサーバーの起動時間と負荷テストのベンチマーク
+
+runserver と gunicorn（gunicorn.conf.py）をそれぞれ子プロセスとして空きポートで起動し、
+/api/test/ が最初に 200 を返すまでの時間と、複数スレッドからキープアライブ接続で
+API を呼び続けたときのスループット・レイテンシ（p50/p95/p99）を比較する::
+
+    python manage.py benchmark_server --duration 10 --concurrency 16
+
+非同期ビューは uvicorn ワーカーで同期版と比較する::
+
+    python manage.py benchmark_server --server gunicorn --worker-class uvicorn --paths async --concurrency 64
+
+既定では本番設定（oshare_style_answers.settings_production、DEBUG=False）で起動する。
+"""
+
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+READY_PATH = '/api/test/'
+
+# 負荷テストで順番に呼び出すパス
+LOAD_PATHS = {
+    # DBを使わない応答・商品一覧・質問一覧
+    'default': ('/api/test/', '/api/items/', '/api/questions/'),
+    # 非同期版と同じ読み込みAPIの同期版
+    'sync': ('/api/items/', '/api/questions/', '/api/stats/'),
+    # 非同期版（GUNICORN_WORKER_CLASS=uvicorn で配信する）
+    'async': ('/api/async/items/', '/api/async/questions/', '/api/async/stats/'),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_commands(port, options):
+    manage = str(settings.BASE_DIR / 'manage.py')
+    return {
+        # 計測中にファイル監視で再起動しないよう --noreload を付ける
+        'runserver': [sys.executable, manage, 'runserver', f'127.0.0.1:{port}', '--noreload'],
+        'gunicorn': [
+            sys.executable, '-m', 'gunicorn',
+            '--config', str(settings.BASE_DIR / 'gunicorn.conf.py'),
+            '--bind', f'127.0.0.1:{port}',
+        ],
+    }
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def load_worker(port, paths, deadline, offset, result, lock):
+    """キープアライブ接続でパスを順番に呼び出し、レイテンシを記録する"""
+    latencies, statuses = [], Counter()
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    index = offset
+    try:
+        while time.monotonic() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Host': 'localhost'})
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                statuses['error'] += 1
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status] += 1
+            if response.will_close:
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    finally:
+        connection.close()
+    with lock:
+        result['latencies'].extend(latencies)
+        result['statuses'].update(statuses)
+
+
+class Command(BaseCommand):
+    help = 'runserver と gunicorn の起動時間と負荷テスト時のスループット・レイテンシを比較します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', choices=['runserver', 'gunicorn'], action='append', dest='servers', help='計測するサーバー'
+        )
+        parser.add_argument(
+            '--settings-module', default='oshare_style_answers.settings_production', help='サーバーで使う設定モジュール'
+        )
+        parser.add_argument('--duration', type=float, default=10, help='負荷テストの秒数')
+        parser.add_argument('--concurrency', type=int, default=8, help='同時に接続するクライアント数')
+        parser.add_argument('--workers', type=int, help='gunicorn のワーカー数（既定は gunicorn.conf.py の値）')
+        parser.add_argument(
+            '--worker-class', choices=['gthread', 'uvicorn'], default='gthread', help='gunicorn のワーカーの種類'
+        )
+        parser.add_argument(
+            '--paths', choices=list(LOAD_PATHS), default='default', help='負荷テストで呼び出すパスの組み合わせ'
+        )
+        parser.add_argument('--startup-timeout', type=float, default=60, help='起動を待つ最大秒数')
+
+    def handle(self, *args, **options):
+        for server in options['servers'] or ['runserver', 'gunicorn']:
+            port = free_port()
+            env = {
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': options['settings_module'],
+                'GUNICORN_WORKER_CLASS': options['worker_class'],
+                'GUNICORN_ACCESS_LOG': '',
+            }
+            if options['workers']:
+                env['GUNICORN_WORKERS'] = str(options['workers'])
+
+            with tempfile.TemporaryFile() as log:
+                process = subprocess.Popen(
+                    server_commands(port, options)[server],
+                    cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+                )
+                try:
+                    startup = self._wait_until_ready(process, port, options['startup_timeout'], log)
+                    result = self._load(port, options)
+                finally:
+                    self._stop(process)
+            self._report(server, startup, result, options['duration'])
+
+    def _wait_until_ready(self, process, port, timeout, log):
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'サーバーが起動できませんでした:\n{log.read().decode(errors="replace")[-2000:]}')
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+                connection.request('GET', READY_PATH, headers={'Host': 'localhost'})
+                if connection.getresponse().status == 200:
+                    return time.perf_counter() - started
+            except OSError:
+                pass
+            finally:
+                connection.close()
+            time.sleep(0.02)
+        raise CommandError(f'{timeout}秒以内にサーバーが起動しませんでした')
+
+    def _load(self, port, options):
+        result = {'latencies': [], 'statuses': Counter()}
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+        threads = [
+            threading.Thread(
+                target=load_worker, args=(port, LOAD_PATHS[options['paths']], deadline, offset, result, lock)
+            )
+            for offset in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return result
+
+    def _stop(self, process):
+        # gunicorn はマスターが SIGTERM を受けるとワーカーを graceful に停止する
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=35)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+
+    def _report(self, server, startup, result, duration):
+        latencies = sorted(result['latencies'])
+        statuses = ' '.join(f'{status}={count}' for status, count in sorted(result['statuses'].items(), key=str))
+        self.stdout.write(
+            f'{server:9} startup={startup * 1000:7.0f}ms  {len(latencies) / duration:7.0f} req/s  '
+            f'p50={percentile(latencies, 0.50) * 1000:.1f}ms  p95={percentile(latencies, 0.95) * 1000:.1f}ms  '
+            f'p99={percentile(latencies, 0.99) * 1000:.1f}ms  ({statuses})'
+        )
@@ -0,0 +1,164 @@
+"""
+SQLite の同時実行プロファイルのベンチマーク
+
+db.sqlite3 のコピーに対して、複数プロセスから読み込みと書き込み（閲覧数・投票・回答）を混ぜて実行し、
+チューニングなし（rollback journal・DEFERRED）と oshare_style_answers.databases の設定
+（WAL・synchronous=NORMAL・busy_timeout・BEGIN IMMEDIATE）のスループットとエラー数を比較する。
+元の db.sqlite3 は変更しない。
+"""
+
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+
+from answers.models import Answer, AnswerVote, Question
+from oshare_style_answers.databases import register_database, sqlite_database
+
+PROFILES = {
+    'plain': False,
+    'tuned': True,
+}
+
+# 操作と実行割合
+OPERATIONS = (
+    ('read', 0.6),
+    ('view', 0.2),
+    ('vote', 0.1),
+    ('answer', 0.1),
+)
+
+
+def _read(alias, ids, rng):
+    list(Question.objects.using(alias).select_related('user').order_by('-created_at')[:20])
+    list(Answer.objects.using(alias).filter(question_id=rng.choice(ids['questions'])).select_related('user'))
+
+
+def _view(alias, ids, rng):
+    Question.objects.using(alias).filter(pk=rng.choice(ids['questions'])).update(views_count=F('views_count') + 1)
+
+
+def _vote(alias, ids, rng):
+    # 読み込んでから書き込むトランザクション（DEFERRED ではロックの昇格に失敗しやすい）
+    answer_id, user_id = rng.choice(ids['answers']), rng.choice(ids['users'])
+    with transaction.atomic(using=alias):
+        vote = AnswerVote.objects.using(alias).filter(answer_id=answer_id, user_id=user_id).first()
+        if vote is None:
+            AnswerVote.objects.using(alias).create(answer_id=answer_id, user_id=user_id, is_helpful=True)
+            delta = 1
+        else:
+            vote.is_helpful = not vote.is_helpful
+            vote.save(update_fields=['is_helpful'])
+            delta = 1 if vote.is_helpful else -1
+        answers = Answer.objects.using(alias).filter(pk=answer_id)
+        if delta < 0:
+            answers = answers.filter(helpful_votes__gt=0)
+        answers.update(helpful_votes=F('helpful_votes') + delta)
+
+
+def _answer(alias, ids, rng):
+    question_id = rng.choice(ids['questions'])
+    with transaction.atomic(using=alias):
+        Answer.objects.using(alias).bulk_create([
+            Answer(question_id=question_id, user_id=rng.choice(ids['users']), content='ベンチマーク回答')
+        ])
+        Question.objects.using(alias).filter(pk=question_id).update(answers_count=F('answers_count') + 1)
+
+
+HANDLERS = {'read': _read, 'view': _view, 'vote': _vote, 'answer': _answer}
+
+
+def run_worker(args):
+    alias, ids, duration, seed = args
+    rng = random.Random(seed)
+    names = [name for name, _ in OPERATIONS]
+    weights = [weight for _, weight in OPERATIONS]
+    completed, failed, latency = Counter(), Counter(), Counter()
+
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                HANDLERS[name](alias, ids, rng)
+            except OperationalError:
+                # database is locked
+                failed[name] += 1
+            else:
+                completed[name] += 1
+                latency[name] += time.perf_counter() - started
+    finally:
+        connections.close_all()
+    return completed, failed, latency
+
+
+class Command(BaseCommand):
+    help = 'SQLite の同時実行設定（WAL・BEGIN IMMEDIATE など）の有無で読み書き混在時のスループットを比較します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', default=str(settings.BASE_DIR / 'db.sqlite3'), help='コピーして使う SQLite ファイル'
+        )
+        parser.add_argument('--processes', type=int, default=4, help='同時に実行するプロセス数')
+        parser.add_argument('--duration', type=float, default=10, help='プロファイルごとの計測秒数')
+        parser.add_argument(
+            '--profile', choices=list(PROFILES), action='append', dest='profiles', help='計測するプロファイル'
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['source']):
+            raise CommandError(f"SQLite ファイルが見つかりません: {options['source']}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options['profiles'] or list(PROFILES):
+                path = os.path.join(directory, f'{profile}.sqlite3')
+                shutil.copyfile(options['source'], path)
+                alias = f'benchmark_{profile}'
+                register_database(alias, sqlite_database(path, tuned=PROFILES[profile]))
+                self._report(profile, self._run(alias, options))
+
+    def _run(self, alias, options):
+        ids = {
+            'questions': list(Question.objects.using(alias).values_list('pk', flat=True)),
+            'answers': list(Answer.objects.using(alias).values_list('pk', flat=True)),
+            'users': list(
+                Question.objects.using(alias).values_list('user_id', flat=True).distinct()
+            ),
+        }
+        if not ids['questions'] or not ids['answers']:
+            raise CommandError('質問と回答のデータが必要です（create_qa_sample_data を実行してください）')
+        # fork 前に接続を閉じ、各プロセスで開き直す
+        connections.close_all()
+
+        context = multiprocessing.get_context('fork')
+        jobs = [(alias, ids, options['duration'], seed) for seed in range(options['processes'])]
+        with context.Pool(options['processes']) as pool:
+            results = pool.map(run_worker, jobs)
+
+        completed, failed, latency = Counter(), Counter(), Counter()
+        for worker_completed, worker_failed, worker_latency in results:
+            completed.update(worker_completed)
+            failed.update(worker_failed)
+            latency.update(worker_latency)
+        return completed, failed, latency, options['duration']
+
+    def _report(self, profile, result):
+        completed, failed, latency, duration = result
+        total = sum(completed.values())
+        self.stdout.write(
+            f'{profile:6} {total / duration:8.0f} ops/s  completed={total}  locked errors={sum(failed.values())}'
+        )
+        for name, _ in OPERATIONS:
+            mean = latency[name] / completed[name] * 1000 if completed[name] else 0
+            self.stdout.write(
+                f'    {name:7} completed={completed[name]:6}  errors={failed[name]:5}  mean={mean:.2f}ms'
+            )
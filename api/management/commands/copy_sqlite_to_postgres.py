@@ -0,0 +1,145 @@
+"""
+db.sqlite3 のデータを PostgreSQL にコピーする
+
+コピー先は migrate 済みであること::
+
+    DB_ENGINE=postgresql python manage.py migrate
+    DB_ENGINE=postgresql python manage.py copy_sqlite_to_postgres --source db.sqlite3 --workers 4
+
+テーブルは COPY FROM STDIN で一括投入する。外部キーの参照先を先に読み込むよう依存関係で段階に分け、
+同じ段階のテーブルは並列に読み込む。循環参照するテーブルは1つのトランザクションでまとめて読み込む
+（Django が作成する外部キー制約は DEFERRABLE INITIALLY DEFERRED のため、コミット時に検査される）。
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from oshare_style_answers.databases import register_database, sqlite_database
+
+SOURCE_ALIAS = 'sqlite_source'
+
+
+def load_levels(models):
+    """
+    外部キーの依存関係に従って、読み込みの段階ごとにジョブ（同じトランザクションで読み込むモデルのリスト）を返す
+    """
+    remaining = {
+        model: {
+            field.related_model for field in model._meta.concrete_fields
+            if field.is_relation and field.related_model in models and field.related_model is not model
+        }
+        for model in models
+    }
+    levels = []
+    while remaining:
+        ready = [model for model, dependencies in remaining.items() if not dependencies & remaining.keys()]
+        if not ready:
+            # 循環参照: 残りをまとめて1つのトランザクションで読み込む
+            levels.append([list(remaining)])
+            break
+        levels.append([[model] for model in ready])
+        for model in ready:
+            del remaining[model]
+    return levels
+
+
+class Command(BaseCommand):
+    help = 'SQLite（db.sqlite3）のデータを PostgreSQL に一括コピーします'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', default=str(settings.BASE_DIR / 'db.sqlite3'), help='コピー元の SQLite ファイル'
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='コピー先のデータベース（PostgreSQL）')
+        parser.add_argument('--workers', type=int, default=4, help='並列に読み込むテーブル数')
+        parser.add_argument('--batch-size', type=int, default=5000, help='コピー元から一度に取得する行数')
+        parser.add_argument(
+            '--noinput', '--no-input', action='store_false', dest='interactive',
+            help='コピー先の既存データを確認なしで削除する'
+        )
+
+    def handle(self, *args, **options):
+        self.target_alias = options['database']
+        self.batch_size = options['batch_size']
+        target = connections[self.target_alias]
+        if target.vendor != 'postgresql':
+            raise CommandError(f"コピー先 '{self.target_alias}' は PostgreSQL ではありません（DB_ENGINE=postgresql を指定してください）")
+        if not os.path.exists(options['source']):
+            raise CommandError(f"コピー元のファイルが見つかりません: {options['source']}")
+
+        register_database(SOURCE_ALIAS, sqlite_database(options['source'], tuned=False))
+        source_tables = set(connections[SOURCE_ALIAS].introspection.table_names())
+        target_tables = set(target.introspection.table_names())
+        models = [
+            model for model in apps.get_models(include_auto_created=True)
+            if model._meta.managed and not model._meta.proxy and model._meta.db_table in source_tables
+        ]
+        missing = sorted(model._meta.db_table for model in models if model._meta.db_table not in target_tables)
+        if missing:
+            raise CommandError(f"コピー先にテーブルがありません（migrate を実行してください）: {', '.join(missing)}")
+
+        if options['interactive']:
+            answer = input(
+                f"'{target.settings_dict['NAME']}' の {len(models)} テーブルの既存データを削除してコピーします。"
+                "よろしいですか？ [y/N]: "
+            )
+            if answer.lower() not in ('y', 'yes'):
+                raise CommandError('中止しました')
+
+        # migrate が作成したコンテンツタイプ・権限なども削除し、コピー元のIDをそのまま使う
+        tables = [model._meta.db_table for model in models]
+        target.ops.execute_sql_flush(
+            target.ops.sql_flush(no_style(), tables, reset_sequences=False, allow_cascade=True)
+        )
+
+        started = time.perf_counter()
+        total = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for level in load_levels(models):
+                for results in executor.map(self._copy_job, level):
+                    for model, rows, elapsed in results:
+                        total += rows
+                        self.stdout.write(f'{model._meta.db_table:40} {rows:>10} rows  {elapsed:.2f}s')
+
+        with target.cursor() as cursor:
+            for sql in target.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Copied {total} rows from {len(models)} tables in {time.perf_counter() - started:.2f}s'
+        ))
+
+    def _copy_job(self, models):
+        # ワーカースレッドごとに接続が作られるため、ジョブの終わりに閉じる
+        try:
+            with transaction.atomic(using=self.target_alias):
+                return [self._copy_table(model) for model in models]
+        finally:
+            connections.close_all()
+
+    def _copy_table(self, model):
+        target = connections[self.target_alias]
+        quote = target.ops.quote_name
+        fields = model._meta.concrete_fields
+        columns = ', '.join(quote(field.column) for field in fields)
+        rows = model._base_manager.using(SOURCE_ALIAS).order_by().values_list(
+            *[field.attname for field in fields]
+        )
+
+        started = time.perf_counter()
+        count = 0
+        with target.cursor() as cursor:
+            with cursor.copy(f'COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN') as copy:
+                for row in rows.iterator(chunk_size=self.batch_size):
+                    copy.write_row([
+                        field.get_db_prep_save(value, connection=target) for field, value in zip(fields, row)
+                    ])
+                    count += 1
+        return model, count, time.perf_counter() - started
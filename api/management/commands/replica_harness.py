@@ -0,0 +1,167 @@
+"""
+リードレプリカの振り分けと read-your-writes をローカルで確認するハーネス
+
+db.sqlite3 をプライマリ用とレプリカ用の2つの SQLite ファイルにコピーし、
+DB_SQLITE_PATH / DB_SQLITE_REPLICAS を指定した子プロセスで実際のAPIにリクエストを送って確認する。
+レプリカへの複製はこのハーネスが明示的に行うため、複製前はレプリカが古いままの状態（遅延）を再現できる。
+元の db.sqlite3 は変更しない::
+
+    python manage.py replica_harness
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from oshare_style_answers.db_router import get_config
+
+HARNESS_ENV = 'REPLICA_HARNESS_DIR'
+REPLICA_ALIAS = 'replica_1'
+
+
+def copy_database(source, destination):
+    """SQLite のバックアップAPIで、書き込み中でも一貫した状態をコピーする"""
+    with sqlite3.connect(source) as source_connection, sqlite3.connect(destination) as destination_connection:
+        source_connection.backup(destination_connection)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.counts = {}
+
+    def wrapper(self, alias):
+        def count(execute, sql, params, many, context):
+            self.counts[alias] = self.counts.get(alias, 0) + 1
+            return execute(sql, params, many, context)
+        return count
+
+
+class Command(BaseCommand):
+    help = 'リードレプリカの振り分けと書き込み後のプライマリ固定（read-your-writes）を2つの SQLite ファイルで確認します'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', default=str(settings.BASE_DIR / 'db.sqlite3'), help='コピー元の SQLite ファイル（migrate 済み）'
+        )
+
+    def handle(self, *args, **options):
+        if os.environ.get(HARNESS_ENV):
+            self._run_checks(os.environ[HARNESS_ENV])
+        else:
+            self._spawn(options['source'])
+
+    def _spawn(self, source):
+        if not os.path.exists(source):
+            raise CommandError(f'SQLite ファイルが見つかりません: {source}')
+        with tempfile.TemporaryDirectory() as directory:
+            primary = os.path.join(directory, 'primary.sqlite3')
+            replica = os.path.join(directory, 'replica.sqlite3')
+            copy_database(source, primary)
+            copy_database(source, replica)
+
+            env = {
+                **os.environ,
+                'DB_ENGINE': 'sqlite',
+                'DB_SQLITE_PATH': primary,
+                'DB_SQLITE_REPLICAS': replica,
+                HARNESS_ENV: directory,
+            }
+            result = subprocess.run(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'replica_harness'], env=env
+            )
+        if result.returncode:
+            raise CommandError('レプリカの振り分けの確認に失敗しました')
+
+    def _replicate(self):
+        """プライマリの内容をレプリカに複製する"""
+        connections[REPLICA_ALIAS].close()
+        copy_database(
+            connections[DEFAULT_DB_ALIAS].settings_dict['NAME'], connections[REPLICA_ALIAS].settings_dict['NAME']
+        )
+
+    def _run_checks(self, directory):
+        if get_config()['REPLICAS'] != [REPLICA_ALIAS]:
+            raise CommandError(f'レプリカ {REPLICA_ALIAS} が設定されていません')
+
+        User = get_user_model()
+        user = User.objects.create_user(username=f'replica-harness-{int(time.time())}')
+        token = Token.objects.create(user=user)
+        self._replicate()
+
+        self.failures = 0
+        self.counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in (DEFAULT_DB_ALIAS, REPLICA_ALIAS):
+                stack.enter_context(connections[alias].execute_wrapper(self.counter.wrapper(alias)))
+            stack.enter_context(override_settings(
+                REPLICA_ROUTING={**settings.REPLICA_ROUTING, 'PIN_SECONDS': 1}
+            ))
+
+            browser = APIClient(HTTP_HOST='localhost')
+            browser.force_authenticate(user)
+            api = APIClient(HTTP_HOST='localhost', HTTP_AUTHORIZATION=f'Token {token.key}')
+            anonymous = APIClient(HTTP_HOST='localhost')
+            payload = {'title': 'レプリカ確認の質問', 'content': 'レプリカの遅延を確認します', 'category': 'styling'}
+
+            self._check('GET without a recent write reads from the replica',
+                        anonymous, 'get', '/api/questions/', 200, REPLICA_ALIAS)
+
+            detail = self._create_question('POST writes to the primary', browser, payload)
+            self._check('GET with the pin cookie reads its own write from the primary',
+                        browser, 'get', detail, 200, DEFAULT_DB_ALIAS)
+            self._check('GET from another client reads the stale replica',
+                        anonymous, 'get', detail, 404, REPLICA_ALIAS)
+
+            api_detail = self._create_question('Token POST writes to the primary', api, payload)
+            api.cookies.clear()
+            self._check('Token GET without cookies is pinned by the Authorization header',
+                        api, 'get', api_detail, 200, DEFAULT_DB_ALIAS)
+
+            time.sleep(1.1)
+            self._check('After PIN_SECONDS the Token client reads the replica again',
+                        api, 'get', api_detail, 404, REPLICA_ALIAS)
+
+            self._replicate()
+            self._check('After replication the replica serves the new question',
+                        anonymous, 'get', api_detail, 200, REPLICA_ALIAS)
+
+        if self.failures:
+            raise CommandError(f'{self.failures} checks failed')
+        self.stdout.write(self.style.SUCCESS('All replica routing checks passed'))
+
+    def _create_question(self, label, client, payload):
+        response = self._check(label, client, 'post', '/api/questions/', 201, DEFAULT_DB_ALIAS, payload)
+        if response.status_code != 201:
+            raise CommandError(f'質問を作成できませんでした: {response.content[:200]!r}')
+        return f"/api/questions/{response.data['id']}/"
+
+    def _check(self, label, client, method, path, expected_status, expected_alias, data=None):
+        self.counter.counts.clear()
+        response = getattr(client, method)(path, data, format='json') if data else getattr(client, method)(path)
+        counts = dict(self.counter.counts)
+        # 閲覧数の UPDATE などの書き込みは常にプライマリで行われるため、SELECT の振り分け先で判定する
+        reads = counts.get(expected_alias, 0)
+        other = REPLICA_ALIAS if expected_alias == DEFAULT_DB_ALIAS else DEFAULT_DB_ALIAS
+        passed = response.status_code == expected_status and reads > 0 and (
+            expected_alias == REPLICA_ALIAS or not counts.get(other)
+        )
+        if not passed:
+            self.failures += 1
+        status = self.style.SUCCESS('PASS') if passed else self.style.ERROR('FAIL')
+        self.stdout.write(
+            f'{status} {label}: {method.upper()} {path} -> {response.status_code} '
+            f'(queries: primary={counts.get(DEFAULT_DB_ALIAS, 0)} replica={counts.get(REPLICA_ALIAS, 0)})'
+        )
+        return response
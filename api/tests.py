@@ -1,3 +1,169 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from accounts.models import CustomUser
+from answers.models import Answer, Question
+from items.models import Brand, Category, Item, ItemImage
+from oshare_style_answers.db_router import ReplicaPinMiddleware, ReplicaRouter, use_primary, use_replica
+from oshare_style_answers.metrics import mark_process_dead, registry
+
+
+@override_settings(DEBUG=True)
+class MetricsTest(TestCase):
+    def setUp(self):
+        registry.reset()
+
+    def test_records_route_metrics(self):
+        self.client.get('/api/items/')
+        self.client.get('/api/items/')
+        body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('http_requests_total{method="GET",route="api/items/",status="200"} 2', body)
+        self.assertIn('db_queries_per_request_count{method="GET",route="api/items/"} 2', body)
+        self.assertIn('serializer_duration_seconds_count{method="GET",route="api/items/"} 2', body)
+        self.assertIn('http_response_size_bytes_bucket{method="GET",route="api/items/",le="+Inf"} 2', body)
+
+    def test_aggregates_worker_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # 別のワーカー（終了済みを含む）が書き出した集計値
+            with open(os.path.join(directory, 'metrics-1.json'), 'w') as f:
+                json.dump({
+                    'counters': [['http_requests_total', [['method', 'GET'], ['route', 'api/test/'], ['status', '200']], 5]],
+                    'histograms': [],
+                }, f)
+
+            with override_settings(METRICS={**settings.METRICS, 'MULTIPROCESS_DIR': directory}):
+                self.client.get('/api/test/')
+                body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('http_requests_total{method="GET",route="api/test/",status="200"} 6', body)
+
+    def test_dead_worker_files_are_folded_into_aggregate(self):
+        counter = ['http_requests_total', [['method', 'GET'], ['route', 'api/test/'], ['status', '200']]]
+        with tempfile.TemporaryDirectory() as directory:
+            for pid, value in ((1, 5), (2, 3)):
+                with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as f:
+                    json.dump({'counters': [[*counter, value]], 'histograms': []}, f)
+            self.assertTrue(mark_process_dead(1, directory))
+            self.assertTrue(mark_process_dead(2, directory))
+            self.assertFalse(mark_process_dead(3, directory))
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if name.endswith('.json')), ['metrics-aggregate.json']
+            )
+
+            with override_settings(METRICS={**settings.METRICS, 'MULTIPROCESS_DIR': directory}):
+                body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('http_requests_total{method="GET",route="api/test/",status="200"} 8', body)
+
+    @override_settings(DEBUG=False, METRICS={**settings.METRICS, 'TOKEN': ''})
+    def test_denied_without_token_in_production(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    @override_settings(DEBUG=False, METRICS={**settings.METRICS, 'TOKEN': 'scrape-token'})
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(REPLICA_ROUTING={**settings.REPLICA_ROUTING, 'REPLICAS': ['replica_1']})
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def request(self, method='get', **extra):
+        """ミドルウェアを通したリクエストと、その中での読み込み先を返す"""
+        routed = []
+
+        def view(request):
+            routed.append(self.router.db_for_read(Question))
+            return HttpResponse(status=201 if method == 'post' else 200)
+
+        response = ReplicaPinMiddleware(view)(getattr(self.factory, method)('/api/questions/', **extra))
+        return response, routed[0]
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Question), 'default')
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(Question), 'replica_1')
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Question), 'default')
+        self.assertEqual(self.router.db_for_write(Question), 'default')
+
+    def test_pins_writer_to_primary(self):
+        self.assertEqual(self.request()[1], 'replica_1')
+
+        response, routed = self.request('post')
+        self.assertEqual(routed, 'default')
+        self.assertEqual(response.cookies['primary_pin']['max-age'], 5)
+
+        self.factory.cookies['primary_pin'] = '1'
+        self.assertEqual(self.request()[1], 'default')
+
+    def test_pins_token_clients_without_cookies(self):
+        self.request('post', HTTP_AUTHORIZATION='Token abc')
+        self.assertEqual(self.request(HTTP_AUTHORIZATION='Token abc')[1], 'default')
+        self.assertEqual(self.request(HTTP_AUTHORIZATION='Token other')[1], 'replica_1')
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """非同期版のAPIが同期版と同じ JSON を返す（クエリは別スレッドの接続で実行される）"""
+
+    def setUp(self):
+        brand = Brand.objects.create(name='ZARA')
+        category = Category.objects.create(name='トップス')
+        self.item = Item.objects.create(
+            name='シャツ', brand=brand, category=category, price=3000, description='説明',
+            condition='new', size='M', color='白', main_image_url='https://example.com/a.jpg', is_featured=True,
+        )
+        ItemImage.objects.create(item=self.item, image='items/b.jpg', order=1)
+        user = CustomUser.objects.create_user(username='asker')
+        self.question = Question.objects.create(user=user, title='質問です', content='内容です')
+        Answer.objects.create(
+            question=self.question, user=user, content='回答です', recommended_products=[self.item.pk]
+        )
+
+    def get(self, path):
+        return async_to_sync(self.async_client.get)(path)
+
+    def test_matches_sync_views(self):
+        for sync_path, async_path in (
+            ('/api/items/?ordering=price&search=シャツ', '/api/async/items/?ordering=price&search=シャツ'),
+            ('/api/items/?brand=999', '/api/async/items/?brand=999'),
+            (f'/api/items/{self.item.pk}/', f'/api/async/items/{self.item.pk}/'),
+            ('/api/items/999/', '/api/async/items/999/'),
+            ('/api/questions/?status=open', '/api/async/questions/?status=open'),
+            ('/api/stats/', '/api/async/stats/'),
+        ):
+            expected = self.client.get(sync_path)
+            response = self.get(async_path)
+            self.assertEqual(response.status_code, expected.status_code, async_path)
+            self.assertEqual(response.content, expected.content, async_path)
+
+    def test_question_detail(self):
+        expected = self.client.get(f'/api/questions/{self.question.pk}/').json()
+        response = self.get(f'/api/async/questions/{self.question.pk}/')
+        data = response.json()
+
+        self.assertEqual(data['views_count'], expected['views_count'] + 1)
+        self.assertEqual({**data, 'views_count': expected['views_count']}, expected)
+        self.assertEqual(data['answers'][0]['recommended_products_details'][0]['id'], self.item.pk)
+        # 別スレッドで実行したクエリ（閲覧数の更新・質問・回答・投票・推奨商品）も記録される
+        self.assertEqual(response['X-Query-Count'], '5')
+        self.assertEqual(self.get('/api/async/questions/999/').status_code, 404)
+
+    def test_home(self):
+        data = self.get('/api/async/home/').json()
+        self.assertEqual([item['id'] for item in data['featured_items']], [self.item.pk])
+        self.assertEqual([question['id'] for question in data['latest_questions']], [self.question.pk])
+        self.assertEqual(data['stats']['total_answers'], 1)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('test/', views.api_test, name='api_test'),
@@ -13,4 +13,9 @@ urlpatterns = [
     # ブランド・カテゴリAPI
     path('brands/', views.BrandListView.as_view(), name='brand_list'),
     path('categories/', views.CategoryListView.as_view(), name='category_list'),
+
+    # 非同期版（ASGI で配信する読み込みAPI）
+    path('async/home/', async_views.home, name='home_async'),
+    path('async/items/', async_views.item_list, name='item_list_async'),
+    path('async/items/<int:pk>/', async_views.item_detail, name='item_detail_async'),
 ]
@@ -7,11 +7,13 @@ from rest_framework import generics, filters
 from django_filters.rest_framework import DjangoFilterBackend
 from items.models import Item, Brand, Category
 from .serializers import ItemSerializer, ItemListSerializer, BrandSerializer, CategorySerializer
+from oshare_style_answers.query_budget import query_budget
 import logging
 
 # ログ設定
 logger = logging.getLogger(__name__)
 
+@query_budget(0)
 @api_view(['GET'])
 def api_test(request):
     """API接続テスト用のエンドポイント"""
@@ -20,6 +22,7 @@ def api_test(request):
         'status': 'success'
     })
 
+@query_budget(0)
 class StyleListView(APIView):
     """スタイル一覧を返すAPI"""
     
@@ -47,6 +50,7 @@ class StyleListView(APIView):
         ]
         return Response({'styles': styles})
 
+@query_budget(1)
 class ItemListView(generics.ListAPIView):
     """商品一覧API"""
     queryset = Item.objects.filter(is_available=True).select_related('brand', 'category')
@@ -68,21 +72,25 @@ class ItemListView(generics.ListAPIView):
         
         return response
 
+@query_budget(2)
 class ItemDetailView(generics.RetrieveAPIView):
     """商品詳細API"""
     queryset = Item.objects.filter(is_available=True).select_related('brand', 'category').prefetch_related('additional_images')
     serializer_class = ItemSerializer
 
+@query_budget(1)
 class BrandListView(generics.ListAPIView):
     """ブランド一覧API"""
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
 
+@query_budget(1)
 class CategoryListView(generics.ListAPIView):
     """カテゴリ一覧API"""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
+@query_budget(1)
 class FeaturedItemsView(generics.ListAPIView):
     """おすすめ商品一覧API"""
     queryset = Item.objects.filter(is_available=True, is_featured=True).select_related('brand', 'category')
@@ -5,6 +5,7 @@ import { useAuth } from '@/contexts/AuthContext';
 import { Button } from '@/components/ui/button';
 import { DropdownMenu, DropdownMenuContent, DropdownMenuItem, DropdownMenuSeparator, DropdownMenuTrigger } from '@/components/ui/dropdown-menu';
 import { Avatar, AvatarFallback, AvatarImage } from '@/components/ui/avatar';
+import Notification from '@/components/Notification';
 import { NavigationMenu, NavigationMenuContent, NavigationMenuItem, NavigationMenuLink, NavigationMenuList, NavigationMenuTrigger } from '@/components/ui/navigation-menu';
 import { Menu, X, Sparkles, MessageCircle, Users, Recycle, Star, User, LogOut, Settings, Coins, ShoppingCart } from 'lucide-react';
 
@@ -90,6 +91,9 @@ const Header = () => {
                   </Button>
                 </Link>
                 
+                {/* 通知 */}
+                <Notification />
+                
                 {/* ポイント表示 */}
                 <div className="flex items-center space-x-1 text-sm text-gray-600">
                   <Coins className="w-4 h-4 text-yellow-500" />
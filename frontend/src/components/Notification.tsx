@@ -0,0 +1,136 @@
+import { useCallback, useEffect, useState } from 'react';
+import { Link } from 'react-router-dom';
+import { Bell } from 'lucide-react';
+import { Button } from '@/components/ui/button';
+import {
+  DropdownMenu,
+  DropdownMenuContent,
+  DropdownMenuItem,
+  DropdownMenuLabel,
+  DropdownMenuSeparator,
+  DropdownMenuTrigger,
+} from '@/components/ui/dropdown-menu';
+import { accountAPI } from '@/lib/api';
+
+interface NotificationItem {
+  id: number;
+  kind: number;
+  kind_display: string;
+  question_id: number;
+  answer_id: number;
+  question_title: string;
+  points: number | null;
+  is_read: boolean;
+  created_at: string;
+}
+
+// 未読数を取得し直す間隔（ミリ秒）
+const UNREAD_POLL_INTERVAL = 60000;
+
+const Notification = () => {
+  const [unreadCount, setUnreadCount] = useState(0);
+  const [notifications, setNotifications] = useState<NotificationItem[]>([]);
+  const [loading, setLoading] = useState(false);
+
+  const fetchUnreadCount = useCallback(async () => {
+    try {
+      const data = await accountAPI.getUnreadNotificationCount();
+      setUnreadCount(data.unread_count);
+    } catch (error) {
+      console.error('未読通知数の取得に失敗しました:', error);
+    }
+  }, []);
+
+  useEffect(() => {
+    fetchUnreadCount();
+    const timer = window.setInterval(fetchUnreadCount, UNREAD_POLL_INTERVAL);
+    return () => window.clearInterval(timer);
+  }, [fetchUnreadCount]);
+
+  const handleOpenChange = async (open: boolean) => {
+    if (!open) return;
+    setLoading(true);
+    try {
+      const data = await accountAPI.getNotifications();
+      setNotifications(data.results);
+      setUnreadCount(data.unread_count);
+    } catch (error) {
+      console.error('通知の取得に失敗しました:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const handleReadAll = async () => {
+    try {
+      const data = await accountAPI.readNotifications();
+      setUnreadCount(data.unread_count);
+      setNotifications(prev => prev.map(n => ({ ...n, is_read: true })));
+    } catch (error) {
+      console.error('通知の既読化に失敗しました:', error);
+    }
+  };
+
+  const handleRead = async (notification: NotificationItem) => {
+    if (notification.is_read) return;
+    try {
+      const data = await accountAPI.readNotifications([notification.id]);
+      setUnreadCount(data.unread_count);
+      setNotifications(prev => prev.map(n => (n.id === notification.id ? { ...n, is_read: true } : n)));
+    } catch (error) {
+      console.error('通知の既読化に失敗しました:', error);
+    }
+  };
+
+  return (
+    <DropdownMenu onOpenChange={handleOpenChange}>
+      <DropdownMenuTrigger asChild>
+        <Button variant="ghost" size="icon" className="relative">
+          <Bell className="w-5 h-5" />
+          {unreadCount > 0 && (
+            <span className="absolute -top-0.5 -right-0.5 min-w-[1.1rem] h-[1.1rem] px-1 rounded-full bg-red-500 text-white text-[10px] leading-[1.1rem] text-center">
+              {unreadCount > 99 ? '99+' : unreadCount}
+            </span>
+          )}
+        </Button>
+      </DropdownMenuTrigger>
+      <DropdownMenuContent className="w-80" align="end" forceMount>
+        <div className="flex items-center justify-between pr-2">
+          <DropdownMenuLabel>通知</DropdownMenuLabel>
+          {unreadCount > 0 && (
+            <Button variant="link" size="sm" className="h-auto p-0 text-xs" onClick={handleReadAll}>
+              すべて既読にする
+            </Button>
+          )}
+        </div>
+        <DropdownMenuSeparator />
+        {loading && notifications.length === 0 ? (
+          <p className="px-2 py-4 text-sm text-center text-gray-500">読み込み中...</p>
+        ) : notifications.length === 0 ? (
+          <p className="px-2 py-4 text-sm text-center text-gray-500">通知はありません</p>
+        ) : (
+          notifications.map(notification => (
+            <DropdownMenuItem key={notification.id} asChild>
+              <Link
+                to={`/qa/${notification.question_id}`}
+                onClick={() => handleRead(notification)}
+                className={`flex flex-col items-start space-y-1 ${notification.is_read ? 'opacity-60' : ''}`}
+              >
+                <span className="text-xs font-medium text-blue-600">
+                  {notification.kind_display}
+                  {notification.points ? `（+${notification.points}pt）` : ''}
+                </span>
+                <span className="text-sm line-clamp-2">{notification.question_title}</span>
+                <span className="text-xs text-gray-400">
+                  {new Date(notification.created_at).toLocaleString('ja-JP')}
+                </span>
+              </Link>
+            </DropdownMenuItem>
+          ))
+        )}
+      </DropdownMenuContent>
+    </DropdownMenu>
+  );
+};
+
+export default Notification;
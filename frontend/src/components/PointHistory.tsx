@@ -2,7 +2,11 @@ import React, { useState, useEffect } from 'react';
 import { useAuth } from '../contexts/AuthContext';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '../components/ui/card';
 import { Badge } from '../components/ui/badge';
+import { Button } from '../components/ui/button';
 import { CoinsIcon, TrendingUpIcon, TrendingDownIcon } from 'lucide-react';
+import { Bar, BarChart, ResponsiveContainer, Tooltip, XAxis, YAxis } from 'recharts';
+
+const POINT_HISTORY_URL = 'http://localhost:8000/api/accounts/point-history/';
 
 interface PointHistory {
   id: number;
@@ -12,34 +16,72 @@ interface PointHistory {
   created_at: string;
 }
 
+// サーバー側で日別に集計されたポイント変動
+interface PointHistorySummary {
+  period: string;
+  total: number;
+  earned: number;
+  spent: number;
+  entries: number;
+  balance_after: number;
+}
+
 export default function PointHistory() {
   const { token } = useAuth();
   const [history, setHistory] = useState<PointHistory[]>([]);
+  const [summary, setSummary] = useState<PointHistorySummary[]>([]);
+  const [nextUrl, setNextUrl] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     if (token) {
-      fetchPointHistory();
+      fetchPointHistory(POINT_HISTORY_URL);
+      fetchSummary();
     }
   }, [token]);
 
-  const fetchPointHistory = async () => {
+  const authHeaders = () => ({
+    'Authorization': `Token ${token}`,
+    'Content-Type': 'application/json',
+  });
+
+  const fetchPointHistory = async (url: string, append = false) => {
     try {
-      const response = await fetch('http://localhost:8000/api/accounts/point-history/', {
-        headers: {
-          'Authorization': `Token ${token}`,
-          'Content-Type': 'application/json',
-        },
-      });
+      const response = await fetch(url, { headers: authHeaders() });
 
       if (response.ok) {
         const data = await response.json();
-        setHistory(data.results || data);
+        const results: PointHistory[] = data.results || data;
+        setHistory(prev => append ? [...prev, ...results] : results);
+        setNextUrl(data.next || null);
       }
     } catch (error) {
       console.error('Point history fetch error:', error);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
+    }
+  };
+
+  const fetchSummary = async () => {
+    try {
+      const response = await fetch(`${POINT_HISTORY_URL}?group=day&limit=30`, { headers: authHeaders() });
+
+      if (response.ok) {
+        const data = await response.json();
+        // グラフは古い日付から表示
+        setSummary([...data.results].reverse());
+      }
+    } catch (error) {
+      console.error('Point history summary fetch error:', error);
+    }
+  };
+
+  const loadMore = () => {
+    if (nextUrl) {
+      setLoadingMore(true);
+      fetchPointHistory(nextUrl, true);
     }
   };
 
@@ -78,6 +120,25 @@ export default function PointHistory() {
         </CardDescription>
       </CardHeader>
       <CardContent>
+        {summary.length > 0 && (
+          <div className="h-40 mb-6">
+            <ResponsiveContainer width="100%" height="100%">
+              <BarChart data={summary}>
+                <XAxis
+                  dataKey="period"
+                  tickFormatter={(value) => new Date(value).toLocaleDateString('ja-JP', { month: 'numeric', day: 'numeric' })}
+                  fontSize={12}
+                />
+                <YAxis fontSize={12} />
+                <Tooltip
+                  labelFormatter={(value) => new Date(value).toLocaleDateString('ja-JP')}
+                  formatter={(value: number) => [`${value}pt`, '増減']}
+                />
+                <Bar dataKey="total" fill="#eab308" />
+              </BarChart>
+            </ResponsiveContainer>
+          </div>
+        )}
         {history.length === 0 ? (
           <div className="text-center py-8 text-gray-500">
             まだポイント履歴がありません
@@ -109,6 +170,13 @@ export default function PointHistory() {
                 </div>
               </div>
             ))}
+            {nextUrl && (
+              <div className="text-center pt-2">
+                <Button variant="outline" size="sm" onClick={loadMore} disabled={loadingMore}>
+                  {loadingMore ? '読み込み中...' : 'もっと見る'}
+                </Button>
+              </div>
+            )}
           </div>
         )}
       </CardContent>
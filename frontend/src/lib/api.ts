@@ -189,4 +189,17 @@ export const accountAPI = {
   // ベストアンサーをマーク
   markBestAnswer: (answerId: number) => 
     apiClient.post(`/accounts/answers/${answerId}/best/`, {}),
+  
+  // 質問ページの変更（回答の追加・投票・解決）を受け取る Server-Sent Events のURL
+  questionEventsUrl: (questionId: number) => `${API_BASE_URL}/async/questions/${questionId}/events/`,
+  
+  // 通知一覧（新しい順、未読数付き）
+  getNotifications: () => apiClient.get('/accounts/notifications/'),
+  
+  // 未読通知数
+  getUnreadNotificationCount: () => apiClient.get('/accounts/notifications/unread-count/'),
+  
+  // 通知を既読にする（idsを省略するとすべて）
+  readNotifications: (ids?: number[]) =>
+    apiClient.post('/accounts/notifications/read/', ids ? { ids } : {}),
 };
@@ -125,7 +125,11 @@ const CreateQuestion = () => {
       
     } catch (err) {
       console.error('Failed to create question:', err);
-      setError('質問の投稿に失敗しました。もう一度お試しください。');
+      // 所持ポイントが報酬ポイントに足りない場合はその旨を表示する
+      const insufficientPoints = err instanceof Error && err.message.includes('所持ポイントが足りません');
+      setError(insufficientPoints
+        ? '所持ポイントが報酬ポイントに足りません。報酬ポイントを減らしてください。'
+        : '質問の投稿に失敗しました。もう一度お試しください。');
     } finally {
       setLoading(false);
     }
@@ -329,7 +333,7 @@ const CreateQuestion = () => {
                     </SelectContent>
                   </Select>
                   <p className="text-sm text-gray-500 mt-1">
-                    ベストアンサーに選ばれた回答者に付与されるポイントです
+                    投稿時に所持ポイントから預かり、ベストアンサーに選ばれた回答者に付与されます（回答がないまま期限切れになった場合は返還されます）
                   </p>
                 </div>
 
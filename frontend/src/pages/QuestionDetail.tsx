@@ -100,6 +100,55 @@ const QuestionDetail = () => {
     }
   }, [id]);
 
+  // 回答の追加・投票・ベストアンサーの選出を、質問全体を取得し直さずに差分で反映する
+  useEffect(() => {
+    if (!id || typeof EventSource === 'undefined') return;
+    
+    const source = new EventSource(accountAPI.questionEventsUrl(parseInt(id)));
+    let reconnecting = false;
+    const parse = (event: Event) => JSON.parse((event as MessageEvent).data);
+    
+    source.onopen = () => {
+      // 切断中の変更を取りこぼさないよう、再接続したときは全体を取得し直す
+      if (reconnecting) {
+        fetchQuestionAndAnswers();
+      }
+    };
+    source.onerror = () => {
+      // ASGI で配信していない場合（runserver など）は接続が閉じられ、自分の操作は書き込みAPIの応答で反映する
+      reconnecting = true;
+    };
+    
+    source.addEventListener('answer_created', (event) => {
+      const { answer, answers_count } = parse(event);
+      setAnswers(prevAnswers => 
+        prevAnswers.some(prev => prev.id === answer.id) ? prevAnswers : [...prevAnswers, answer]
+      );
+      setQuestion(prev => prev && { ...prev, answers_count });
+    });
+    source.addEventListener('vote_changed', (event) => {
+      const { answer_id, helpful_votes } = parse(event);
+      setAnswers(prevAnswers => 
+        prevAnswers.map(answer => answer.id === answer_id ? { ...answer, helpful_votes } : answer)
+      );
+    });
+    source.addEventListener('question_closed', (event) => {
+      const { status, status_display, best_answer_id } = parse(event);
+      setQuestion(prev => prev && { ...prev, status, status_display });
+      setAnswers(prevAnswers => 
+        prevAnswers.map(answer => ({ ...answer, is_best_answer: answer.id === best_answer_id }))
+      );
+    });
+    // 受信が追いつかなかった場合
+    source.addEventListener('resync', () => {
+      fetchQuestionAndAnswers();
+    });
+    
+    return () => {
+      source.close();
+    };
+  }, [id]);
+
   const fetchQuestionAndAnswers = async () => {
     try {
       setLoading(true);
@@ -166,18 +215,25 @@ const QuestionDetail = () => {
       }
       
       console.log('APIリクエスト前');
-      await accountAPI.createAnswer(answerData);
+      const response = await accountAPI.createAnswer(answerData);
       console.log('APIリクエスト完了');
       
+      // 応答の回答を差分として追加する（answer_created で先に届いている場合は追加しない）
+      const answer: Answer = response;
+      const isNew = !answers.some(prev => prev.id === answer.id);
+      setAnswers(prevAnswers => 
+        prevAnswers.some(prev => prev.id === answer.id) ? prevAnswers : [...prevAnswers, answer]
+      );
+      if (isNew) {
+        setQuestion(prev => prev && { ...prev, answers_count: prev.answers_count + 1 });
+      }
+      
       // フォームをリセット
       setNewAnswer('');
       setAnswerImage(null);
       setAnswerImagePreview(null);
       setSelectedProducts([]);
       
-      // 回答一覧を再取得して即座に反映
-      await fetchQuestionAndAnswers();
-      
       toast({
         title: "回答を投稿しました",
         description: "ご回答ありがとうございます！",
@@ -216,24 +272,14 @@ const QuestionDetail = () => {
   const handleVoteAnswer = async (answerId: number, isHelpful: boolean) => {
     try {
       setVotingAnswerId(answerId);
-      await accountAPI.voteAnswer(answerId, isHelpful);
+      const response = await accountAPI.voteAnswer(answerId, isHelpful);
       
-      // 楽観的更新: 即座にUIを更新
+      // 応答の投票数を反映する（vote_changed と同じ差分）
+      const { helpful_votes } = response;
       setAnswers(prevAnswers => 
-        prevAnswers.map(answer => 
-          answer.id === answerId 
-            ? { 
-                ...answer, 
-                helpful_votes: isHelpful ? answer.helpful_votes + 1 : answer.helpful_votes,
-                votes_count: answer.votes_count + 1
-              }
-            : answer
-        )
+        prevAnswers.map(answer => answer.id === answerId ? { ...answer, helpful_votes } : answer)
       );
       
-      // バックグラウンドで正確なデータを再取得
-      await fetchQuestionAndAnswers();
-      
       toast({
         title: "役立った投票をしました",
         description: "投票が反映されました",
@@ -255,19 +301,15 @@ const QuestionDetail = () => {
   const handleMarkBestAnswer = async (answerId: number) => {
     try {
       setMarkingBestAnswerId(answerId);
-      await accountAPI.markBestAnswer(answerId);
+      const response = await accountAPI.markBestAnswer(answerId);
       
-      // 楽観的更新: 即座にUIを更新
+      // 応答の差分（question_closed と同じ形式）でベストアンサーと質問のステータスを反映する
+      const { status, status_display, best_answer_id } = response;
+      setQuestion(prev => prev && { ...prev, status, status_display });
       setAnswers(prevAnswers => 
-        prevAnswers.map(answer => ({
-          ...answer,
-          is_best_answer: answer.id === answerId
-        }))
+        prevAnswers.map(answer => ({ ...answer, is_best_answer: answer.id === best_answer_id }))
       );
       
-      // 質問詳細を再取得
-      await fetchQuestionAndAnswers();
-      
       toast({
         title: "ベストアンサーを設定しました",
         description: "ベストアンサーが設定されました",
@@ -0,0 +1,99 @@
+"""
+gunicorn の本番設定（プロジェクトのルートで ``gunicorn`` を実行すると読み込まれる）
+
+環境変数で調整する:
+
+- GUNICORN_WORKER_CLASS: ``gthread``（既定、WSGI）または ``uvicorn``（ASGI）
+- GUNICORN_WORKERS: ワーカープロセス数（既定は CPU数 × 2 + 1）
+- GUNICORN_THREADS: gthread ワーカーあたりのスレッド数（既定 4）
+- GUNICORN_MAX_REQUESTS: この件数を処理したワーカーを入れ替える（メモリの増加対策、既定 1000）
+- GUNICORN_TIMEOUT / GUNICORN_GRACEFUL_TIMEOUT: 応答のないワーカーの強制終了・再起動時の待ち時間（秒）
+- GUNICORN_PRELOAD: 1 ならマスターでアプリを読み込んでから fork する（既定 1）
+
+質問ページのリアルタイム配信（Server-Sent Events、answers.async_views.question_events）は ASGI でのみ動作する。
+WSGI（gthread）では 501 を返し、フロントエンドは書き込みAPIの応答だけで画面を更新する。
+配信を有効にする本番構成は GUNICORN_WORKER_CLASS=uvicorn と PUBSUB_REDIS_URL（Redis pub/sub）の組み合わせで、
+プロセス内のブローカーは他のワーカーの購読者に届かないため、uvicorn で複数ワーカーを起動する場合は PUBSUB_REDIS_URL を必須にする。
+"""
+
+import glob
+import os
+import tempfile
+
+
+def _cpu_count():
+    # コンテナの CPU 制限（cpuset）を反映する
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+_worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', _cpu_count() * 2 + 1))
+
+if _worker_class == 'uvicorn':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    wsgi_app = 'oshare_style_answers.asgi_production:application'
+    if workers > 1 and not os.environ.get('PUBSUB_REDIS_URL'):
+        raise RuntimeError(
+            'GUNICORN_WORKER_CLASS=uvicorn with multiple workers requires PUBSUB_REDIS_URL: '
+            'the in-process broker cannot deliver question events across worker processes'
+        )
+else:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    wsgi_app = 'oshare_style_answers.wsgi_production:application'
+
+# アプリケーションをマスターで読み込み、ワーカーの起動を速くしてメモリを共有する
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# ワーカーを一定件数ごとに入れ替える（同時に入れ替わらないようばらつかせる）
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# ハートビート用の一時ファイルをメモリ上に置く（Docker のオーバーレイFSでのブロックを避ける）
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+forwarded_allow_ips = os.environ.get('GUNICORN_FORWARDED_ALLOW_IPS', '127.0.0.1')
+# 空文字でアクセスログを無効にする
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+# /metrics で全ワーカーのメトリクスを合算する（oshare_style_answers.metrics）。
+# 設定の読み込みより前に指定する必要があるため、アプリの読み込み前に環境変数に入れておく
+os.environ.setdefault(
+    'METRICS_MULTIPROC_DIR',
+    os.path.join(worker_tmp_dir, 'oshare_style_answers-metrics'),
+)
+
+
+def on_starting(server):
+    # 前回起動時のワーカーのメトリクスを合算しないよう消しておく
+    directory = os.environ['METRICS_MULTIPROC_DIR']
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    # 終了したワーカーのメトリクスを合算用のファイルにまとめ、ワーカーの入れ替えでファイルが増え続けないようにする
+    directory = os.environ.get('METRICS_MULTIPROC_DIR')
+    if directory:
+        from oshare_style_answers.metrics import mark_process_dead
+
+        mark_process_dead(worker.pid, directory)
+
+
+def pre_fork(server, worker):
+    # preload 中にマスターで開いたDB接続をワーカーに引き継がない
+    from django.db import connections
+
+    connections.close_all()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("items", "0002_add_main_image_url"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="stock_quantity",
+            field=models.PositiveIntegerField(default=0, verbose_name="在庫数"),
+        ),
+    ]
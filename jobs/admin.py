@@ -0,0 +1,21 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """ジョブ管理"""
+    list_display = ('name', 'queue', 'priority', 'status', 'attempts', 'run_at', 'started_at', 'created_at')
+    list_filter = ('status', 'queue')
+    search_fields = ('name',)
+    readonly_fields = ('attempts', 'unique_key', 'locked_by', 'last_error', 'started_at', 'created_at')
+    actions = ['retry_jobs']
+    
+    @admin.action(description='選択した失敗ジョブを再実行する')
+    def retry_jobs(self, request, queryset):
+        retried = queryset.filter(status='failed').update(
+            status='queued', attempts=0, run_at=timezone.now(), locked_by=''
+        )
+        self.message_user(request, f'{retried}件のジョブを実行待ちに戻しました')
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class JobsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'jobs'
+    verbose_name = 'バックグラウンドジョブ'
+    
+    def ready(self):
+        from oshare_style_answers.metrics import register_gauge
+        from .queue import queue_depth_samples
+        
+        register_gauge('job_queue_depth', queue_depth_samples)
@@ -0,0 +1,345 @@
+"""
+ジョブキューのバックエンド
+
+DatabaseBackend は Job テーブルをキューにする。ジョブの追加は呼び出し側のトランザクションに含まれるため、
+ロールバックされた書き込みのジョブは実行されない。ワーカーは実行待ちのジョブを条件付きUPDATEで確保するため、
+複数のワーカープロセスが同じジョブを二重に実行することはない。
+
+RedisBackend は Redis（互換サーバーを含む）をキューにする。DBへの書き込みを増やさずに済むが、
+ジョブはコミット後に追加され、実行と完了の記録が別になるため、ジョブは冪等にしておくこと。
+redis パッケージが必要。
+"""
+
+import json
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+
+class JobLost(Exception):
+    """確保したジョブが実行中に他のワーカーに確保し直されていた（visibility_timeout を超えて実行した場合など）"""
+
+
+@dataclass
+class JobRecord:
+    """ワーカーが確保したジョブ"""
+    id: object  # DatabaseBackend は Job の主キー、RedisBackend は文字列
+    name: str
+    args: list = field(default_factory=list)
+    kwargs: dict = field(default_factory=dict)
+    queue: str = 'default'
+    priority: int = 0
+    attempts: int = 1
+    max_attempts: int = 3
+    run_at: datetime = None
+    # 確保したときの識別子（停止したとみなされた後に他のワーカーが確保し直したジョブを完了させない）
+    token: str = ''
+
+
+class BaseBackend:
+    # 実行と完了の記録を同じDBトランザクションにできる（@job(atomic=True) のジョブが1回だけ完了する）
+    transactional = False
+
+    def __init__(self, visibility_timeout=300):
+        # 実行中のまま visibility_timeout 秒経ったジョブはワーカーが停止したとみなして実行待ちに戻す
+        self.visibility_timeout = visibility_timeout
+
+    def enqueue(self, name, args, kwargs, queue, priority, run_at, max_attempts, unique_key=None):
+        raise NotImplementedError
+
+    def reserve(self, queues, limit):
+        """実行予定日時を過ぎたジョブを優先度の高い順に最大 limit 件確保して JobRecord のリストを返す"""
+        raise NotImplementedError
+
+    def complete(self, job):
+        """ジョブを完了する（確保し直されていた場合は JobLost を送出する）"""
+        raise NotImplementedError
+
+    def retry(self, job, error, run_at):
+        raise NotImplementedError
+
+    def fail(self, job, error):
+        raise NotImplementedError
+
+    def requeue_stale(self):
+        """停止したワーカーが確保したままのジョブを実行待ちに戻して件数を返す"""
+        raise NotImplementedError
+
+    def depth(self):
+        """{(キュー, 状態): 件数}（状態は ready・scheduled・running・failed）"""
+        raise NotImplementedError
+
+    def oldest_ready(self):
+        """{キュー: 実行待ちのうち最も古い実行予定日時}（取得できないバックエンドでは空）"""
+        return {}
+
+
+class DatabaseBackend(BaseBackend):
+    """Job テーブルをキューにするバックエンド"""
+    transactional = True
+
+    def enqueue(self, name, args, kwargs, queue, priority, run_at, max_attempts, unique_key=None):
+        job = Job(
+            name=name, args=list(args), kwargs=kwargs, queue=queue, priority=priority,
+            run_at=run_at, max_attempts=max_attempts, unique_key=unique_key,
+        )
+        if unique_key is None:
+            job.save()
+            return job.pk
+        # 同じキーの実行待ちジョブがあれば追加しない（ON CONFLICT DO NOTHING のためトランザクションを中断しない）
+        Job.objects.bulk_create([job], ignore_conflicts=True)
+        return None
+
+    def reserve(self, queues, limit):
+        now = timezone.now()
+        candidates = Job.objects.filter(status='queued', run_at__lte=now)
+        if queues:
+            candidates = candidates.filter(queue__in=queues)
+        job_ids = list(candidates.order_by('-priority', 'run_at', 'pk').values_list('pk', flat=True)[:limit])
+        if not job_ids:
+            return []
+
+        # 確保はIDごとではなく1回のUPDATEで行い、他のワーカーが先に確保したジョブは locked_by で除外する
+        token = uuid.uuid4().hex
+        Job.objects.filter(pk__in=job_ids, status='queued').update(
+            status='running', attempts=F('attempts') + 1, started_at=now, unique_key=None, locked_by=token,
+        )
+        jobs = list(
+            Job.objects.filter(pk__in=job_ids, status='running', locked_by=token)
+            .order_by('-priority', 'run_at', 'pk')
+        )
+        return [
+            JobRecord(
+                id=job.pk, name=job.name, args=job.args, kwargs=job.kwargs, queue=job.queue, priority=job.priority,
+                attempts=job.attempts, max_attempts=job.max_attempts, run_at=job.run_at, token=token,
+            )
+            for job in jobs
+        ]
+
+    def _claimed(self, job):
+        return Job.objects.filter(pk=job.id, status='running', locked_by=job.token)
+
+    def complete(self, job):
+        # 他のワーカーが確保し直していた場合は送出して、同じトランザクションで実行した処理をロールバックさせる
+        deleted, _ = self._claimed(job).delete()
+        if not deleted:
+            raise JobLost(job.id)
+
+    def retry(self, job, error, run_at):
+        self._claimed(job).update(status='queued', run_at=run_at, locked_by='', last_error=error)
+
+    def fail(self, job, error):
+        self._claimed(job).update(status='failed', last_error=error)
+
+    def requeue_stale(self):
+        return Job.objects.filter(
+            status='running', started_at__lt=timezone.now() - timedelta(seconds=self.visibility_timeout)
+        ).update(status='queued', locked_by='', last_error='Worker stopped before the job finished')
+
+    def depth(self):
+        now = timezone.now()
+        depth = {}
+        for queue, status, due, count in (
+            Job.objects.values_list('queue', 'status')
+            .annotate(due=Count('pk', filter=Q(run_at__lte=now)), count=Count('pk')).order_by()
+        ):
+            if status == 'queued':
+                depth[(queue, 'ready')] = due
+                depth[(queue, 'scheduled')] = count - due
+            else:
+                depth[(queue, status)] = count
+        return depth
+
+    def oldest_ready(self):
+        return dict(
+            Job.objects.filter(status='queued', run_at__lte=timezone.now())
+            .values_list('queue').annotate(oldest=Min('run_at')).order_by()
+        )
+
+
+# 実行予定日時を過ぎたジョブを実行待ちに移してから、優先度の高い順に確保する
+_RESERVE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, id in ipairs(due) do
+  redis.call('ZREM', KEYS[1], id)
+  redis.call('ZADD', KEYS[2], redis.call('HGET', ARGV[4] .. id, 'score'), id)
+end
+local jobs = {}
+for _, id in ipairs(redis.call('ZRANGE', KEYS[2], 0, tonumber(ARGV[2]) - 1)) do
+  local key = ARGV[4] .. id
+  redis.call('ZREM', KEYS[2], id)
+  redis.call('ZADD', KEYS[3], ARGV[1], id)
+  redis.call('HSET', key, 'token', ARGV[3])
+  local unique_key = redis.call('HGET', key, 'unique_key')
+  if unique_key and unique_key ~= '' then
+    redis.call('DEL', ARGV[5] .. unique_key)
+  end
+  table.insert(jobs, id)
+  table.insert(jobs, redis.call('HGET', key, 'payload'))
+  table.insert(jobs, redis.call('HINCRBY', key, 'attempts', 1))
+end
+return jobs
+"""
+
+# 確保したワーカーのジョブであれば、完了（削除）・再試行（予定に戻す）・失敗のいずれかにする
+_FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[1], 'token') ~= ARGV[1] then
+  return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[3])
+if ARGV[2] == 'complete' then
+  redis.call('DEL', KEYS[1])
+  return 1
+end
+redis.call('HSET', KEYS[1], 'token', '', 'error', ARGV[5])
+if ARGV[2] == 'retry' then
+  redis.call('HSET', KEYS[1], 'score', ARGV[6])
+end
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[3])
+return 1
+"""
+
+# 実行中のまま期限を過ぎたジョブを実行待ちに戻す
+_REQUEUE_SCRIPT = """
+local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+for _, id in ipairs(stale) do
+  redis.call('ZREM', KEYS[1], id)
+  redis.call('HSET', ARGV[2] .. id, 'token', '', 'error', 'Worker stopped before the job finished')
+  redis.call('ZADD', KEYS[2], redis.call('HGET', ARGV[2] .. id, 'score'), id)
+end
+return #stale
+"""
+
+
+class RedisBackend(BaseBackend):
+    """
+    Redis をキューにするバックエンド
+
+    キューごとに、実行待ち（優先度・実行予定日時の順のソート済みセット）、予定（実行予定日時順）、
+    実行中、失敗のソート済みセットを持ち、ジョブの内容はハッシュに保存する。
+    確保・完了・再試行は Lua スクリプトで行うため、複数のワーカーが同じジョブを確保することはない。
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='jobs:', **options):
+        super().__init__(**options)
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImproperlyConfigured('RedisBackend を使うには redis パッケージが必要です') from exc
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._reserve = self.client.register_script(_RESERVE_SCRIPT)
+        self._finish = self.client.register_script(_FINISH_SCRIPT)
+        self._requeue = self.client.register_script(_REQUEUE_SCRIPT)
+
+    def _key(self, kind, queue):
+        return f'{self.prefix}{kind}:{queue}'
+
+    def _queues(self):
+        return sorted(queue.decode() for queue in self.client.smembers(f'{self.prefix}queues'))
+
+    @staticmethod
+    def _score(priority, run_at):
+        # 優先度が高いほど、同じ優先度なら実行予定日時が早いほど小さくなる
+        return -priority * 10 ** 13 + int(run_at.timestamp() * 1000)
+
+    def enqueue(self, name, args, kwargs, queue, priority, run_at, max_attempts, unique_key=None):
+        job_id = uuid.uuid4().hex
+        payload = json.dumps({
+            'name': name, 'args': list(args), 'kwargs': kwargs, 'queue': queue, 'priority': priority,
+            'max_attempts': max_attempts, 'run_at': run_at.timestamp(),
+        })
+
+        def push():
+            if unique_key is not None and not self.client.set(f'{self.prefix}unique:{unique_key}', job_id, nx=True):
+                return
+            pipe = self.client.pipeline()
+            pipe.hset(f'{self.prefix}job:{job_id}', mapping={
+                'payload': payload, 'score': self._score(priority, run_at), 'attempts': 0,
+                'unique_key': unique_key or '',
+            })
+            pipe.zadd(self._key('scheduled', queue), {job_id: run_at.timestamp()})
+            pipe.sadd(f'{self.prefix}queues', queue)
+            pipe.execute()
+
+        # DBの書き込みがロールバックされた場合はジョブを追加しない
+        transaction.on_commit(push)
+        return job_id if unique_key is None else None
+
+    def reserve(self, queues, limit):
+        now = time.time()
+        jobs = []
+        for queue in queues or self._queues():
+            if len(jobs) >= limit:
+                break
+            token = uuid.uuid4().hex
+            result = self._reserve(
+                keys=[self._key('scheduled', queue), self._key('ready', queue), self._key('running', queue)],
+                args=[now, limit - len(jobs), token, f'{self.prefix}job:', f'{self.prefix}unique:'],
+            )
+            for job_id, payload, attempts in zip(result[::3], result[1::3], result[2::3]):
+                data = json.loads(payload)
+                jobs.append(JobRecord(
+                    id=job_id.decode(), name=data['name'], args=data['args'], kwargs=data['kwargs'],
+                    queue=data['queue'], priority=data['priority'], attempts=int(attempts),
+                    max_attempts=data['max_attempts'],
+                    run_at=datetime.fromtimestamp(data['run_at'], tz=dt_timezone.utc), token=token,
+                ))
+        return jobs
+
+    def _finish_job(self, job, mode, destination, score, error='', ready_score=''):
+        return self._finish(
+            keys=[f'{self.prefix}job:{job.id}', self._key('running', job.queue), self._key(destination, job.queue)],
+            args=[job.token, mode, job.id, score, error, ready_score],
+        )
+
+    def complete(self, job):
+        if not self._finish_job(job, 'complete', 'running', 0):
+            raise JobLost(job.id)
+
+    def retry(self, job, error, run_at):
+        self._finish_job(
+            job, 'retry', 'scheduled', run_at.timestamp(), error, self._score(job.priority, run_at)
+        )
+
+    def fail(self, job, error):
+        self._finish_job(job, 'fail', 'failed', time.time(), error)
+
+    def requeue_stale(self):
+        deadline = time.time() - self.visibility_timeout
+        return sum(
+            self._requeue(
+                keys=[self._key('running', queue), self._key('ready', queue)], args=[deadline, f'{self.prefix}job:']
+            )
+            for queue in self._queues()
+        )
+
+    def depth(self):
+        now = time.time()
+        pipe = self.client.pipeline()
+        queues = self._queues()
+        for queue in queues:
+            pipe.zcard(self._key('ready', queue))
+            pipe.zcount(self._key('scheduled', queue), '-inf', now)
+            pipe.zcard(self._key('scheduled', queue))
+            pipe.zcard(self._key('running', queue))
+            pipe.zcard(self._key('failed', queue))
+        counts = pipe.execute()
+        depth = {}
+        for index, queue in enumerate(queues):
+            ready, due, scheduled, running, failed = counts[index * 5:index * 5 + 5]
+            depth.update({
+                (queue, 'ready'): ready + due,
+                (queue, 'scheduled'): scheduled - due,
+                (queue, 'running'): running,
+                (queue, 'failed'): failed,
+            })
+        return depth
@@ -0,0 +1,70 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from jobs.queue import get_backend
+from jobs.worker import run_pending, work
+from oshare_style_answers.metrics import get_config as get_metrics_config, registry
+
+
+class Command(BaseCommand):
+    help = 'バックグラウンドジョブを実行するワーカーを起動します（複数プロセスで同時に実行できます）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='append', dest='queues', help='実行するキュー（既定はすべて）')
+        parser.add_argument('--batch-size', type=int, default=20, help='1回に確保するジョブの件数')
+        parser.add_argument('--threads', type=int, default=4, help='ジョブを並行して実行するスレッド数')
+        parser.add_argument('--interval', type=float, default=1.0, help='実行待ちがない場合の待機秒数')
+        parser.add_argument('--stats-interval', type=float, default=60, help='キューの件数を出力する間隔（秒）')
+        parser.add_argument('--once', action='store_true', help='実行待ちがなくなったら終了する')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        metrics = get_metrics_config()
+        if metrics['MULTIPROCESS_DIR']:
+            # ジョブの待ち時間・実行時間を Web サーバーの /metrics で合算する
+            registry.start_flusher(metrics['MULTIPROCESS_DIR'], metrics['FLUSH_INTERVAL'])
+        self.stdout.write(f'ジョブワーカーを起動しました（{type(backend).__name__}）')
+        
+        if options['once']:
+            self._report(run_pending(options['queues'], options['batch_size']))
+            self._report_depth(backend)
+            return
+        
+        processed = Counter()
+        next_stats = time.monotonic() + options['stats_interval']
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            try:
+                while True:
+                    requeued = backend.requeue_stale()
+                    if requeued:
+                        self.stdout.write(f'Requeued {requeued} stale jobs')
+                    
+                    results = work(options['queues'], options['batch_size'], executor)
+                    processed.update(results)
+                    if time.monotonic() >= next_stats:
+                        self._report(processed)
+                        self._report_depth(backend)
+                        processed.clear()
+                        next_stats = time.monotonic() + options['stats_interval']
+                    if not results:
+                        time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                pass
+        
+        self._report(processed)
+        self.stdout.write(self.style.SUCCESS('ジョブワーカーを終了しました'))
+
+    def _report(self, results):
+        if results:
+            self.stdout.write(f'Processed {sum(results.values())} jobs: {dict(sorted(results.items()))}')
+
+    def _report_depth(self, backend):
+        depth = backend.depth()
+        for queue in sorted({queue for queue, state in depth}):
+            states = ' '.join(
+                f'{state}={depth.get((queue, state), 0)}' for state in ('ready', 'scheduled', 'running', 'failed')
+            )
+            self.stdout.write(f'  queue={queue} {states}')
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='ジョブ')),
+                ('args', models.JSONField(blank=True, default=list, verbose_name='引数')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='キーワード引数')),
+                ('queue', models.CharField(default='default', max_length=50, verbose_name='キュー')),
+                ('priority', models.SmallIntegerField(default=0, verbose_name='優先度')),
+                ('status', models.CharField(choices=[('queued', '実行待ち'), ('running', '実行中'), ('failed', '失敗')], default='queued', max_length=10, verbose_name='ステータス')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='実行予定日時')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='試行回数')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='最大試行回数')),
+                ('unique_key', models.CharField(blank=True, max_length=255, null=True, verbose_name='重複排除キー')),
+                ('locked_by', models.CharField(blank=True, max_length=32, verbose_name='確保したワーカー')),
+                ('last_error', models.TextField(blank=True, verbose_name='エラー内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+            ],
+            options={
+                'verbose_name': 'ジョブ',
+                'verbose_name_plural': 'ジョブ',
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['queue', '-priority', 'run_at', 'id'], name='job_queued_idx'), models.Index(fields=['status', 'started_at'], name='job_status_started_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'queued')), fields=('unique_key',), name='job_unique_queued')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """バックグラウンドジョブ（DatabaseBackend のキュー。成功したジョブは削除する）"""
+    STATUS_CHOICES = [
+        ('queued', '実行待ち'),
+        ('running', '実行中'),
+        ('failed', '失敗'),
+    ]
+    
+    name = models.CharField('ジョブ', max_length=200)
+    args = models.JSONField('引数', default=list, blank=True)
+    kwargs = models.JSONField('キーワード引数', default=dict, blank=True)
+    queue = models.CharField('キュー', max_length=50, default='default')
+    priority = models.SmallIntegerField('優先度', default=0)  # 大きいほど先に実行
+    status = models.CharField('ステータス', max_length=10, choices=STATUS_CHOICES, default='queued')
+    run_at = models.DateTimeField('実行予定日時', default=timezone.now)
+    attempts = models.PositiveSmallIntegerField('試行回数', default=0)
+    max_attempts = models.PositiveSmallIntegerField('最大試行回数', default=3)
+    # 同じキーの実行待ちジョブは1つにまとめる（@job(unique=True)）
+    unique_key = models.CharField('重複排除キー', max_length=255, null=True, blank=True)
+    # 確保したワーカーの識別子（同時に確保したワーカー同士で取り合ったジョブを区別する）
+    locked_by = models.CharField('確保したワーカー', max_length=32, blank=True)
+    last_error = models.TextField('エラー内容', blank=True)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    started_at = models.DateTimeField('開始日時', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'ジョブ'
+        verbose_name_plural = 'ジョブ'
+        indexes = [
+            # 実行待ちのジョブだけを優先度・実行予定日時の順に取り出す
+            models.Index(
+                fields=['queue', '-priority', 'run_at', 'id'],
+                condition=models.Q(status='queued'), name='job_queued_idx',
+            ),
+            models.Index(fields=['status', 'started_at'], name='job_status_started_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['unique_key'], condition=models.Q(status='queued'), name='job_unique_queued'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
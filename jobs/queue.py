@@ -0,0 +1,124 @@
+"""
+バックグラウンドジョブのキュー
+
+リクエスト内で行う必要のない処理（集計の更新・ポイント付与・通知の配信・画像の処理など）は
+``@job`` を付けた関数にし、ビューやシグナルから ``.enqueue()`` で追加する。
+追加したジョブは run_jobs コマンドのワーカーが実行する::
+
+    @job(priority=5, max_attempts=5)
+    def award_points(user_id, points):
+        ...
+
+    award_points.enqueue(user.pk, 10)                               # 既定の設定で追加
+    enqueue(award_points, args=(user.pk, 10), delay=60)              # 60秒後に実行
+    enqueue(award_points, args=(user.pk, 10), priority=10, queue='points')
+
+引数は JSON で保存するため、モデルのインスタンスではなく主キーを渡す。
+失敗したジョブは retry_delay 秒 × 2^(試行回数-1) 後に再試行し、max_attempts 回失敗すると failed になる。
+
+キューのバックエンドは settings.JOB_QUEUE で設定する（PAYMENT_GATEWAYS と同じ形式）::
+
+    JOB_QUEUE = {
+        'BACKEND': 'jobs.backends.DatabaseBackend',
+        'OPTIONS': {'visibility_timeout': 300},
+        'EAGER': False,  # True にするとワーカーを使わずコミット後にその場で実行する（開発用）
+    }
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+DEFAULT_JOB_QUEUE = {
+    'BACKEND': 'jobs.backends.DatabaseBackend',
+    'OPTIONS': {},
+    'EAGER': False,
+}
+
+_backend = None
+
+
+def get_config():
+    return {**DEFAULT_JOB_QUEUE, **getattr(settings, 'JOB_QUEUE', {})}
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        config = get_config()
+        _backend = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _backend
+
+
+@receiver(setting_changed)
+def reset_backend(*, setting, **kwargs):
+    global _backend
+    if setting == 'JOB_QUEUE':
+        _backend = None
+
+
+def job(queue='default', priority=0, max_attempts=3, retry_delay=10, unique=False, atomic=True):
+    """
+    関数をバックグラウンドジョブにするデコレーター
+
+    - unique: 同じ引数の実行待ちジョブがあれば追加しない（連続した書き込みによる再集計などをまとめる）
+    - atomic: 関数の実行とジョブの完了を1つのトランザクションで行う（DatabaseBackend では1回だけ完了する）。
+      長時間のファイル処理などトランザクションを開いたままにしたくないジョブは False にする
+    """
+
+    def decorator(func):
+        func.job_name = f'{func.__module__}.{func.__qualname__}'
+        func.job_options = {
+            'queue': queue, 'priority': priority, 'max_attempts': max_attempts,
+            'retry_delay': retry_delay, 'unique': unique, 'atomic': atomic,
+        }
+        func.enqueue = lambda *args, **kwargs: enqueue(func, args=args, kwargs=kwargs)
+        return func
+
+    return decorator
+
+
+def enqueue(func, args=(), kwargs=None, *, queue=None, priority=None, delay=None, run_at=None):
+    """
+    ジョブを追加してIDを返す（unique のジョブは同じ引数の実行待ちがあれば追加せず、IDは返さない）
+
+    DatabaseBackend では呼び出し側のトランザクションに含まれ、ロールバックされるとジョブも取り消される。
+    """
+    options = func.job_options
+    kwargs = kwargs or {}
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay or 0)
+
+    if get_config()['EAGER']:
+        from .worker import run_eagerly
+
+        transaction.on_commit(lambda: run_eagerly(func, args, kwargs), robust=True)
+        return None
+
+    unique_key = None
+    if options['unique']:
+        arguments = json.dumps([list(args), kwargs], sort_keys=True, separators=(',', ':'))
+        unique_key = f'{func.job_name}:{hashlib.sha1(arguments.encode()).hexdigest()}'
+    return get_backend().enqueue(
+        func.job_name, args, kwargs,
+        queue=queue or options['queue'],
+        priority=options['priority'] if priority is None else priority,
+        run_at=run_at,
+        max_attempts=options['max_attempts'],
+        unique_key=unique_key,
+    )
+
+
+def queue_depth_samples():
+    """job_queue_depth ゲージの値 [(ラベル, 件数), ...]（/metrics のスクレイプ時に取得する）"""
+    return [
+        ((('queue', queue), ('state', state)), count)
+        for (queue, state), count in get_backend().depth().items()
+    ]
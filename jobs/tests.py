@@ -0,0 +1,190 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from answers.models import Answer, Question
+from oshare_style_answers.metrics import registry, render_metrics
+from .backends import JobLost
+from .models import Job
+from .queue import enqueue, get_backend, job
+from .worker import run_job, run_pending, work
+
+User = get_user_model()
+
+calls = []
+
+
+@job()
+def record(value):
+    calls.append(value)
+
+
+@job(max_attempts=2, retry_delay=60)
+def create_then_fail(username):
+    User.objects.create_user(username=username)
+    raise ValueError('boom')
+
+
+@job()
+def create_user(username):
+    User.objects.create_user(username=username)
+
+
+@job(unique=True)
+def collapse(value):
+    calls.append(value)
+
+
+def not_a_job():
+    pass
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+        registry.reset()
+
+    def test_priority_and_schedule(self):
+        record.enqueue('low')
+        enqueue(record, args=('high',), priority=10)
+        enqueue(record, args=('later',), delay=3600)
+
+        self.assertEqual(run_pending(), {'succeeded': 2})
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual(list(Job.objects.values_list('kwargs', 'status')), [({}, 'queued')])
+
+        Job.objects.update(run_at=timezone.now())
+        run_pending()
+        self.assertEqual(calls, ['high', 'low', 'later'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_retry_with_backoff_then_fail(self):
+        create_then_fail.enqueue('ghost')
+        self.assertEqual(run_pending(), {'retried': 1})
+        failing = Job.objects.get()
+        self.assertEqual((failing.status, failing.attempts), ('queued', 1))
+        self.assertGreater(failing.run_at, timezone.now() + timedelta(seconds=50))
+        self.assertIn('ValueError: boom', failing.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(run_pending(), {'failed': 1})
+        self.assertEqual(Job.objects.get().status, 'failed')
+        # 失敗したジョブの書き込みはジョブの完了と一緒にロールバックされる
+        self.assertFalse(User.objects.filter(username='ghost').exists())
+
+    def test_enqueue_is_part_of_the_transaction(self):
+        try:
+            with transaction.atomic():
+                record.enqueue('rolled back')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Job.objects.exists())
+
+    def test_unique_jobs_collapse_until_started(self):
+        for _ in range(3):
+            collapse.enqueue('a')
+        collapse.enqueue('b')
+        self.assertEqual(Job.objects.count(), 2)
+
+        jobs = get_backend().reserve(None, 1)
+        collapse.enqueue('a')
+        self.assertEqual(Job.objects.filter(status='queued').count(), 2)
+        self.assertEqual(get_backend().reserve(None, 10)[0].args, ['b'])
+        self.assertEqual(len(jobs), 1)
+
+    def test_reserved_jobs_are_not_claimed_twice_and_stale_jobs_are_requeued(self):
+        record.enqueue('once')
+        backend = get_backend()
+        claimed = backend.reserve(None, 10)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(backend.reserve(None, 10), [])
+
+        Job.objects.update(started_at=timezone.now() - timedelta(seconds=backend.visibility_timeout + 1))
+        self.assertEqual(backend.requeue_stale(), 1)
+        self.assertEqual(run_pending(), {'succeeded': 1})
+        # 停止したとみなされたワーカーの完了は記録しない
+        with self.assertRaises(JobLost):
+            backend.complete(claimed[0])
+        self.assertEqual(calls, ['once'])
+
+    def test_reclaimed_atomic_job_rolls_back(self):
+        create_user.enqueue('twice')
+        backend = get_backend()
+        job, = backend.reserve(None, 1)
+        # visibility_timeout を超えて実行している間に、他のワーカーが確保し直した状態
+        Job.objects.update(locked_by='other-worker')
+
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            self.assertEqual(run_job(job, backend), 'lost')
+        self.assertFalse(User.objects.filter(username='twice').exists())
+        self.assertEqual(Job.objects.get().status, 'running')
+
+    def test_unknown_job_fails_without_retry(self):
+        Job.objects.create(name='jobs.tests.not_a_job')
+        self.assertEqual(work(), {'failed': 1})
+
+    def test_queue_depth_and_latency_metrics(self):
+        record.enqueue('now')
+        enqueue(record, args=('later',), delay=60)
+        Job.objects.create(name='jobs.tests.record', status='failed')
+        metrics = render_metrics({'MULTIPROCESS_DIR': None})
+        self.assertIn('job_queue_depth{queue="default",state="ready"} 1', metrics)
+        self.assertIn('job_queue_depth{queue="default",state="scheduled"} 1', metrics)
+        self.assertIn('job_queue_depth{queue="default",state="failed"} 1', metrics)
+
+        run_pending()
+        metrics = render_metrics({'MULTIPROCESS_DIR': None})
+        self.assertIn('jobs_processed_total{job="jobs.tests.record",outcome="succeeded"} 1', metrics)
+        self.assertIn('job_wait_seconds_count{queue="default"} 1', metrics)
+        self.assertIn('job_duration_seconds_count{job="jobs.tests.record"} 1', metrics)
+
+    @override_settings(JOB_QUEUE={'EAGER': True})
+    def test_eager_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record.enqueue('eager')
+            self.assertEqual(calls, [])
+        self.assertEqual(calls, ['eager'])
+        self.assertFalse(Job.objects.exists())
+
+
+class AnswerJobsTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user(username='author')
+        self.question = Question.objects.create(user=self.user, title='質問', content='内容')
+
+    def test_answer_count_is_recounted_once(self):
+        for i in range(3):
+            Answer.objects.create(question=self.question, user=self.user, content=f'回答{i}')
+        Question.objects.filter(pk=self.question.pk).update(answers_count=10)
+        self.assertEqual(Job.objects.filter(name='answers.tasks.recount_question_answers').count(), 1)
+
+        run_pending()
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.answers_count, 3)
+
+    def test_large_images_are_downscaled(self):
+        buffer = BytesIO()
+        Image.new('RGB', (3200, 1600), 'white').save(buffer, 'JPEG')
+        with self.settings(MEDIA_ROOT=self.media_root):
+            answer = Answer.objects.create(
+                question=self.question, user=self.user, content='画像付き',
+                image=SimpleUploadedFile('large.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            )
+            original = answer.image.name
+            run_pending()
+            answer.refresh_from_db()
+            self.assertNotEqual(answer.image.name, original)
+            self.assertFalse(answer.image.storage.exists(original))
+            with Image.open(answer.image.path) as image:
+                self.assertEqual(image.size, (1600, 800))
@@ -0,0 +1,137 @@
+"""
+ジョブの実行
+
+ワーカー（run_jobs コマンド）は停止したワーカーのジョブを実行待ちに戻してから、
+実行待ちのジョブを確保して実行する。ジョブごとに次のメトリクスを記録する（/metrics）:
+
+- job_wait_seconds: 実行予定日時から実行開始までの待ち時間（キューの遅延）
+- job_duration_seconds: 実行時間
+- jobs_processed_total: ジョブ名と結果（succeeded・retried・failed・lost）ごとの件数
+"""
+
+import logging
+import time
+import traceback
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from oshare_style_answers.metrics import increment, observe
+from .backends import JobLost
+from .queue import get_backend
+
+logger = logging.getLogger(__name__)
+
+
+def resolve(name):
+    """ジョブ名から @job を付けた関数を返す（任意の関数を実行させない）"""
+    func = import_string(name)
+    if not hasattr(func, 'job_options'):
+        raise ImportError(f'{name} is not a job')
+    return func
+
+
+def _call(func, args, kwargs, complete=None):
+    if func.job_options['atomic']:
+        with transaction.atomic():
+            func(*args, **kwargs)
+            if complete:
+                complete()
+        return
+    func(*args, **kwargs)
+    if complete:
+        complete()
+
+
+def _record(name, queue, outcome, duration, wait=None):
+    if wait is not None:
+        observe('job_wait_seconds', max(wait, 0), queue=queue)
+    observe('job_duration_seconds', duration, job=name)
+    increment('jobs_processed_total', job=name, outcome=outcome)
+
+
+def run_job(job, backend=None):
+    """確保したジョブを実行して結果（succeeded・retried・failed・lost）を返す"""
+    backend = backend or get_backend()
+    wait = (timezone.now() - job.run_at).total_seconds()
+    started = time.perf_counter()
+    try:
+        func = resolve(job.name)
+    except ImportError:
+        logger.error(f'Job {job.id} ({job.name}) failed: unknown job', exc_info=True)
+        backend.fail(job, traceback.format_exc())
+        _record(job.name, job.queue, 'failed', time.perf_counter() - started, wait)
+        return 'failed'
+
+    try:
+        if backend.transactional:
+            # 実行結果とジョブの完了を同じトランザクションでコミットする
+            _call(func, job.args, job.kwargs, complete=lambda: backend.complete(job))
+        else:
+            _call(func, job.args, job.kwargs)
+            backend.complete(job)
+    except JobLost:
+        # 確保し直したワーカーが実行するため、再試行も失敗の記録もしない（atomic のジョブは処理もロールバック済み）
+        logger.warning(f'Job {job.id} ({job.name}) was reclaimed by another worker; result discarded')
+        outcome = 'lost'
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            run_at = timezone.now() + timedelta(seconds=func.job_options['retry_delay'] * 2 ** (job.attempts - 1))
+            backend.retry(job, error, run_at)
+            logger.warning(
+                f'Job {job.id} ({job.name}) failed on attempt {job.attempts}/{job.max_attempts}; '
+                f'retrying at {run_at.isoformat()}', exc_info=True
+            )
+            outcome = 'retried'
+        else:
+            backend.fail(job, error)
+            logger.error(f'Job {job.id} ({job.name}) failed after {job.attempts} attempts', exc_info=True)
+            outcome = 'failed'
+    else:
+        outcome = 'succeeded'
+    _record(job.name, job.queue, outcome, time.perf_counter() - started, wait)
+    return outcome
+
+
+def _run_job_in_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        connections.close_all()
+
+
+def work(queues=None, limit=20, executor=None):
+    """
+    実行待ちのジョブを最大 limit 件確保して実行し、結果ごとの件数を返す
+
+    executor（ThreadPoolExecutor）を渡すと確保したジョブを並行して実行する。
+    """
+    jobs = get_backend().reserve(queues, limit)
+    if executor is None:
+        return Counter(run_job(job) for job in jobs)
+    return Counter(executor.map(_run_job_in_thread, jobs))
+
+
+def run_pending(queues=None, limit=20):
+    """実行予定日時を過ぎたジョブがなくなるまで実行し、結果ごとの件数を返す"""
+    total = Counter()
+    while results := work(queues, limit):
+        total.update(results)
+    return total
+
+
+def run_eagerly(func, args, kwargs):
+    """ワーカーを使わずにその場で実行する（JOB_QUEUE['EAGER']、再試行はしない）"""
+    started = time.perf_counter()
+    try:
+        _call(func, args, kwargs)
+    except Exception:
+        logger.error(f'Job {func.job_name} failed', exc_info=True)
+        outcome = 'failed'
+    else:
+        outcome = 'succeeded'
+    _record(func.job_name, func.job_options['queue'], outcome, time.perf_counter() - started)
@@ -0,0 +1,18 @@
+"""
+本番用ASGI設定（gunicorn の uvicorn ワーカーから読み込む）
+
+GUNICORN_WORKER_CLASS=uvicorn gunicorn で起動する（gunicorn.conf.py を参照）。
+"""
+
+import os
+import sys
+from django.core.asgi import get_asgi_application
+
+# プロジェクトのパスを追加
+project_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_path)
+
+# 本番環境の設定を使用
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'oshare_style_answers.settings_production')
+
+application = get_asgi_application()
@@ -0,0 +1,87 @@
+"""
+非同期ビュー（ASGI）の共通処理
+
+Django の非同期ORM（aget・aiterator など）は内部で sync_to_async(thread_sensitive=True) を使うため、
+1リクエスト内のクエリは同じスレッドで1つずつ実行される。
+gather_queries() は互いに独立したクエリをそれぞれ別のスレッド（別の接続）で同時に実行し、
+最も遅いクエリの時間で応答できるようにする::
+
+    items, stats = await gather_queries(
+        lambda: list(Item.objects.filter(is_featured=True)),
+        lambda: Question.objects.aggregate(total=Count('id')),
+    )
+
+クエリは専用のスレッドプール（スレッド数は settings.ASYNC_QUERY_THREADS）で実行し、接続は CONN_MAX_AGE に
+かかわらずスレッドごとに使い回す。スレッドは終了しないため、接続数はスレッド数×データベース数を超えない
+（既定のエグゼキューターはスレッドの入れ替わりで閉じられない接続が残る）。
+シリアライズは取得済みのオブジェクトだけで行い、非同期のコンテキストで
+クエリが実行されると SynchronousOnlyOperation になる。
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+
+def _release_connections():
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is None:
+            continue
+        # コネクションプールの接続はすぐにプールに返す。それ以外はスレッドごとに使い回し
+        # （接続し直すと SQLite の PRAGMA の実行や PostgreSQL の認証に毎回時間がかかる）、
+        # エラーで使えなくなった接続だけ閉じる
+        if connection.settings_dict['OPTIONS'].get('pool') or (
+            connection.errors_occurred and not connection.is_usable()
+        ):
+            connection.close()
+        else:
+            connection.errors_occurred = False
+
+
+def _run(function):
+    try:
+        return function()
+    finally:
+        _release_connections()
+
+
+@cache
+def _run_in_thread():
+    executor = ThreadPoolExecutor(
+        max_workers=getattr(settings, 'ASYNC_QUERY_THREADS', 4), thread_name_prefix='async-queries'
+    )
+    return sync_to_async(_run, thread_sensitive=False, executor=executor)
+
+
+async def gather_queries(*functions):
+    """同期の関数（クエリの実行）をそれぞれ別スレッドで同時に実行し、結果を順に返す"""
+    run = _run_in_thread()
+    return await asyncio.gather(*(run(function) for function in functions))
+
+
+def filtered_queryset(view_class, request):
+    """
+    DRF の一覧ビューと同じ絞り込み・検索・並び替えを適用したクエリセット
+
+    django-filter は関連モデルのIDを検証するときにクエリを実行するため、gather_queries の中で呼ぶ。
+    不正なパラメーターは rest_framework.exceptions.ValidationError になる。
+    """
+    view = view_class(request=Request(request), args=(), kwargs={}, format_kwarg=None)
+    return view.filter_queryset(view.get_queryset())
+
+
+def json_response(data, status=200):
+    """DRF の JSONRenderer（UNICODE_JSON などの設定）で同期のビューと同じ形式の JSON を返す"""
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def not_found_response(model):
+    """get_object_or_404 を使う同期のビューと同じ 404 の応答"""
+    return json_response({'detail': f'No {model._meta.object_name} matches the given query.'}, status=404)
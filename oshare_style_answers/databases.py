@@ -0,0 +1,130 @@
+"""
+DATABASES の設定プロファイル
+
+環境変数 DB_ENGINE で切り替える（settings.py / settings_production.py から呼び出す）。
+
+- ``sqlite``（既定）: BASE_DIR/db.sqlite3。接続ごとに WAL などの同時実行向けの設定を適用する
+  （DB_SQLITE_TUNING=0 で無効）
+  （ファイルの場所は DB_SQLITE_PATH で変更できる）
+- ``postgresql``: POSTGRES_DB / POSTGRES_USER / POSTGRES_PASSWORD / POSTGRES_HOST / POSTGRES_PORT
+  （docker-compose.yml の db サービスと .env に合わせた名前）
+
+リードレプリカは replica_1, replica_2, ... のエイリアスで追加する（oshare_style_answers.db_router を参照）。
+PostgreSQL では POSTGRES_REPLICA_HOSTS（``host[:port]`` のカンマ区切り）、
+SQLite では DB_SQLITE_REPLICAS（ファイルパスのカンマ区切り）で指定する。
+
+PostgreSQL では psycopg のコネクションプールを使う（DB_POOL=0 で無効にすると、
+CONN_MAX_AGE による永続接続とヘルスチェックに切り替わる）。
+PgBouncer のトランザクションプーリング経由で接続する場合は DB_DISABLE_SERVER_SIDE_CURSORS=1 にする。
+"""
+
+import os
+
+
+def _env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+# SQLite の接続ごとに実行する PRAGMA
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',  # 読み込みが書き込みを待たない（DBファイルと同じディレクトリに -wal/-shm を作る）
+    'PRAGMA synchronous=NORMAL',  # WAL ではコミットごとの fsync を省いても破損しない
+    'PRAGMA mmap_size=134217728',  # 128MB までメモリマップで読む
+    'PRAGMA cache_size=-20000',  # ページキャッシュ 20MB
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+def sqlite_database(path, tuned=True):
+    database = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+    }
+    if tuned:
+        database['OPTIONS'] = {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            # ロック中の書き込みはエラーにせず最大この秒数待つ（busy_timeout）
+            'timeout': int(os.environ.get('DB_SQLITE_BUSY_TIMEOUT', 20)),
+            # トランザクションの開始時に書き込みロックを取る（BEGIN IMMEDIATE）。
+            # 読み込みの後に書き込むトランザクションが途中でロックを昇格できずに
+            # database is locked で失敗するのを防ぐ
+            'transaction_mode': 'IMMEDIATE',
+        }
+    return database
+
+
+def postgresql_database():
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'oshare_db'),
+        'USER': os.environ.get('POSTGRES_USER', 'oshare_user'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        # .iterator() はサーバーサイドカーソルで少しずつ取得する（PgBouncer のトランザクションモードでは無効にする）
+        'DISABLE_SERVER_SIDE_CURSORS': _env_bool('DB_DISABLE_SERVER_SIDE_CURSORS'),
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+            'application_name': 'oshare_style_answers',
+        },
+    }
+    if _env_bool('DB_POOL', default=True):
+        database['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),  # 空き接続を待つ秒数
+        }
+        # プールを使う場合、接続の再利用はプールが行う（CONN_MAX_AGE とは併用できない）
+        database['CONN_MAX_AGE'] = 0
+    return database
+
+
+def database_from_env(base_dir):
+    """DB_ENGINE に応じた default データベースの設定を返す"""
+    engine = os.environ.get('DB_ENGINE', 'sqlite')
+    if engine in ('postgresql', 'postgres'):
+        return postgresql_database()
+    path = os.environ.get('DB_SQLITE_PATH') or base_dir / 'db.sqlite3'
+    return sqlite_database(path, tuned=_env_bool('DB_SQLITE_TUNING', default=True))
+
+
+def _env_list(name):
+    return [value.strip() for value in os.environ.get(name, '').split(',') if value.strip()]
+
+
+def replica_databases():
+    """DB_ENGINE に応じたリードレプリカの設定を {エイリアス: 設定} で返す"""
+    replicas = []
+    if os.environ.get('DB_ENGINE', 'sqlite') in ('postgresql', 'postgres'):
+        for address in _env_list('POSTGRES_REPLICA_HOSTS'):
+            host, _, port = address.partition(':')
+            database = postgresql_database()
+            database['HOST'] = host
+            database['PORT'] = port or database['PORT']
+            # レプリカへの誤った書き込みはエラーにする
+            database['OPTIONS']['options'] = '-c default_transaction_read_only=on'
+            replicas.append(database)
+    else:
+        tuned = _env_bool('DB_SQLITE_TUNING', default=True)
+        replicas = [sqlite_database(path, tuned=tuned) for path in _env_list('DB_SQLITE_REPLICAS')]
+
+    for database in replicas:
+        # テストではプライマリのテストDBをそのまま使う
+        database['TEST'] = {'MIRROR': 'default'}
+    return {f'replica_{index}': database for index, database in enumerate(replicas, start=1)}
+
+
+def register_database(alias, database):
+    """実行中に接続先を追加する（管理コマンドから別のDBファイルを扱う場合に使う）"""
+    from django.db import DEFAULT_DB_ALIAS, connections
+
+    databases = connections.configure_settings({
+        DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+        alias: database,
+    })
+    connections.settings[alias] = databases[alias]
@@ -0,0 +1,54 @@
+"""
+リクエスト中に実行されたSQLの観測
+
+connection.execute_wrapper は接続（スレッド）ごとに設定するため、非同期ビューが sync_to_async で
+別スレッドの接続から実行したクエリは、ミドルウェアのスレッドで設定したラッパーでは記録できない。
+ここではすべての接続に1つのラッパーを常設し、contextvar に登録された観測者に振り分ける。
+contextvar は sync_to_async のスレッドにも引き継がれるため、同期・非同期どちらのビューでも
+リクエスト中のクエリを記録できる::
+
+    with observe_queries(recorder):  # recorder は execute_wrapper と同じ呼び出し形式
+        response = self.get_response(request)
+"""
+
+import contextvars
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_observers = contextvars.ContextVar('db_query_observers', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    observers = _observers.get()
+    # 先に登録された観測者（外側のミドルウェア）が外側になるように重ねる
+    for observer in reversed(observers):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install(connection):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+def _install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_install_on_connect)
+
+
+@contextmanager
+def observe_queries(observer):
+    """ブロック内（sync_to_async で実行するクエリを含む）のSQLを observer に渡す"""
+    # このモジュールの読み込み前に接続済みだった接続にも設定する
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+    token = _observers.set(_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
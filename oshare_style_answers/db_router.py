@@ -0,0 +1,163 @@
+"""
+リードレプリカへの読み込みの振り分け
+
+ReplicaPinMiddleware が安全なメソッド（GET/HEAD/OPTIONS）のリクエストの読み込みをレプリカに振り分け、
+それ以外（書き込み、管理コマンド、ワーカー、トランザクション中の読み込み）はすべてプライマリ（default）を使う。
+
+書き込みに成功したクライアントは PIN_SECONDS の間プライマリに固定し（read-your-writes）、
+レプリカの遅延で直前に書いた内容が見えなくなるのを防ぐ。固定はクッキーと、
+Authorization ヘッダーのハッシュをキーにしたキャッシュの両方で判定する（クッキーを保持しないAPIクライアント向け）::
+
+    REPLICA_ROUTING = {
+        'REPLICAS': ['replica_1'],     # レプリカのDBエイリアス（空ならすべてプライマリ）
+        'PIN_SECONDS': 5,              # 書き込み後にプライマリに固定する秒数（レプリカの遅延より長くする）
+        'COOKIE_NAME': 'primary_pin',
+        'CACHE_ALIAS': 'default',
+    }
+
+リクエスト以外でレプリカから読む場合は ``with use_replica():``、
+リクエスト中でも最新の値が必要な場合は ``with use_primary():`` を使う。
+"""
+
+import contextvars
+import hashlib
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULTS = {
+    'REPLICAS': [],
+    'PIN_SECONDS': 5,
+    'COOKIE_NAME': 'primary_pin',
+    'CACHE_ALIAS': 'default',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# 'replica' の場合だけレプリカから読む（既定はプライマリ）
+_read_from = contextvars.ContextVar('replica_read_from', default=None)
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'REPLICA_ROUTING', {})}
+
+
+@contextmanager
+def _reading_from(target):
+    token = _read_from.set(target)
+    try:
+        yield
+    finally:
+        _read_from.reset(token)
+
+
+def use_primary():
+    """ブロック内の読み込みをプライマリに固定する"""
+    return _reading_from('primary')
+
+
+def use_replica():
+    """ブロック内の読み込みをレプリカに振り分ける（多少古いデータでよい集計など）"""
+    return _reading_from('replica')
+
+
+class ReplicaRouter:
+    """レプリカが設定されていれば読み込みをレプリカに、書き込みをプライマリに振り分ける"""
+
+    def db_for_read(self, model, **hints):
+        if _read_from.get() != 'replica':
+            return DEFAULT_DB_ALIAS
+        replicas = get_config()['REPLICAS']
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        # 書き込みと同じトランザクション内の読み込みはプライマリで行う
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        # 関連オブジェクトは取得元のインスタンスと同じDBから読む
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # レプリカはプライマリの複製なので、どのDBから読んだオブジェクト同士でも関連付けてよい
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_config()['REPLICAS']:
+            return False
+        return None
+
+
+def pin_cache_key(request):
+    authorization = request.headers.get('Authorization')
+    if not authorization:
+        return None
+    return f'replica_pin:{hashlib.sha256(authorization.encode()).hexdigest()}'
+
+
+class ReplicaPinMiddleware:
+    """安全なメソッドのリクエストの読み込みをレプリカに振り分け、書き込んだクライアントをプライマリに固定する"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        config = get_config()
+        if not config['REPLICAS']:
+            return self.get_response(request)
+
+        cache = caches[config['CACHE_ALIAS']]
+        cache_key = pin_cache_key(request)
+        pinned = self._pinned(config, request) or (cache_key is not None and cache.get(cache_key))
+        with _reading_from('primary' if pinned else 'replica'):
+            response = self.get_response(request)
+
+        if self._wrote(request, response):
+            self._pin(config, response)
+            if cache_key is not None:
+                cache.set(cache_key, 1, config['PIN_SECONDS'])
+        return response
+
+    async def __acall__(self, request):
+        config = get_config()
+        if not config['REPLICAS']:
+            return await self.get_response(request)
+
+        cache = caches[config['CACHE_ALIAS']]
+        cache_key = pin_cache_key(request)
+        pinned = self._pinned(config, request) or (cache_key is not None and await cache.aget(cache_key))
+        with _reading_from('primary' if pinned else 'replica'):
+            response = await self.get_response(request)
+
+        if self._wrote(request, response):
+            self._pin(config, response)
+            if cache_key is not None:
+                await cache.aset(cache_key, 1, config['PIN_SECONDS'])
+        return response
+
+    def _pinned(self, config, request):
+        return request.method not in SAFE_METHODS or config['COOKIE_NAME'] in request.COOKIES
+
+    def _wrote(self, request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400
+
+    def _pin(self, config, response):
+        response.set_cookie(
+            config['COOKIE_NAME'], '1', max_age=config['PIN_SECONDS'], httponly=True, samesite='Lax'
+        )
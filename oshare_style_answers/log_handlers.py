@@ -0,0 +1,130 @@
+"""
+ログ出力のハンドラーとフィルター
+
+QueuedHandler はログレコードをキューに積むだけで返り、ファイルやコンソールへの書き込みは
+QueueListener のスレッドで行う。リクエストを処理するスレッドがディスク書き込みを待たない::
+
+    'file': {
+        'class': 'oshare_style_answers.log_handlers.QueuedHandler',
+        'target_class': 'logging.FileHandler',
+        'filename': BASE_DIR / 'debug.log',
+        'formatter': 'verbose',
+        'filters': ['redact'],
+    },
+
+``target_class`` 以外の引数（``queue_size`` を除く）はそのまま出力先ハンドラーに渡す。
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import weakref
+
+from django.utils.module_loading import import_string
+
+SENSITIVE_KEYS = ('password', 'password_confirm', 'token', 'authorization', 'secret', 'card_number', 'cvv')
+REDACTED = '[REDACTED]'
+
+_SENSITIVE_PATTERN = re.compile(
+    r"""(?P<key>['"]?(?:%s)['"]?\s*[:=]\s*)(?:(?P<quote>['"]).*?(?P=quote)|[^'",}\s]+)""" % '|'.join(
+        re.escape(key) for key in SENSITIVE_KEYS
+    ),
+    re.IGNORECASE,
+)
+
+_handlers = weakref.WeakSet()
+
+
+def _redact_match(match):
+    quote = match['quote'] or ''
+    return f"{match['key']}{quote}{REDACTED}{quote}"
+
+
+def redact(value):
+    """辞書・文字列から機密情報（パスワード・トークン等）を伏せた値を返す"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if str(key).lower() in SENSITIVE_KEYS else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(item) for item in value)
+    if isinstance(value, str):
+        return _SENSITIVE_PATTERN.sub(_redact_match, value)
+    return value
+
+
+class RedactingFilter(logging.Filter):
+    """ログメッセージと引数から機密情報を伏せるフィルター"""
+
+    def filter(self, record):
+        if isinstance(record.msg, str):
+            record.msg = redact(record.msg)
+        if isinstance(record.args, dict):
+            record.args = redact(record.args)
+        elif record.args:
+            record.args = tuple(redact(arg) for arg in record.args)
+        return True
+
+
+class QueuedHandler(logging.handlers.QueueHandler):
+    """出力先ハンドラーへの書き込みを QueueListener のスレッドに任せるハンドラー"""
+
+    def __init__(self, target_class, queue_size=10000, **target_kwargs):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        if isinstance(target_class, str):
+            target_class = import_string(target_class)
+        if issubclass(target_class, logging.FileHandler):
+            target_kwargs.setdefault('encoding', 'utf-8')
+        self.target = target_class(**target_kwargs)
+        self.dropped = 0
+        self._start_listener()
+        _handlers.add(self)
+
+    def _start_listener(self):
+        self.listener = logging.handlers.QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def enqueue(self, record):
+        # キューが溢れた場合は待たずに破棄する（リクエストを止めない）
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _stop_listener(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def flush(self):
+        """キューに残っているレコードを書き出す"""
+        if self.listener._thread is not None:
+            self.listener.stop()
+            self._start_listener()
+        self.target.flush()
+
+    def close(self):
+        self._stop_listener()
+        self.target.close()
+        _handlers.discard(self)
+        super().close()
+
+
+def _restart_listeners():
+    # fork 後の子プロセスにはリスナースレッドが引き継がれないため起動し直す
+    for handler in list(_handlers):
+        handler.queue = queue.Queue(maxsize=handler.queue.maxsize)
+        handler._start_listener()
+
+
+def _stop_listeners():
+    for handler in list(_handlers):
+        handler._stop_listener()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listeners)
+atexit.register(_stop_listeners)
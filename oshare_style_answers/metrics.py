@@ -0,0 +1,555 @@
+"""
+リクエストメトリクス（レイテンシ・クエリ数・シリアライズ時間・レスポンスサイズ）
+
+プロセス内で固定バケットのヒストグラムとカウンターを集計し、``/metrics`` で
+Prometheus のテキスト形式として公開する。
+
+- MetricsMiddleware がルート（URLパターン）とメソッドごとに処理時間、DBクエリ数と時間、
+  シリアライザーの処理時間、レスポンスサイズを記録する
+- ビューに ``@observe_latency('login')`` を付けるとビュー単位の処理時間も記録され、
+  ``latency_snapshot()`` でバケットごとの件数とパーセンタイルの目安を取得できる
+
+gunicorn などで複数プロセスから配信する場合は METRICS['MULTIPROCESS_DIR'] を指定する。
+各プロセスは自分の集計値を ``metrics-<pid>.json`` に定期的に書き出し（他のプロセスとファイルを共有しない）、
+``/metrics`` は全ファイルを合算して返す。終了したワーカーのファイルは ``mark_process_dead()`` で
+``metrics-aggregate.json`` にまとめるため（gunicorn.conf.py の child_exit）、ファイルはワーカー数より増えず、
+カウンターは再起動をまたいで単調増加する。ディレクトリはサーバー起動時に空にしておく::
+
+    METRICS = {
+        'ENABLED': True,
+        'MULTIPROCESS_DIR': None,  # 複数プロセスで集計する場合のディレクトリ
+        'FLUSH_INTERVAL': 5,       # ファイルへの書き出し間隔（秒）
+        'TOKEN': '',               # /metrics に Authorization: Bearer <TOKEN> を要求する（未指定の場合は DEBUG のときのみ公開）
+    }
+"""
+
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .db_observers import observe_queries
+
+DEFAULTS = {
+    'ENABLED': True,
+    'MULTIPROCESS_DIR': None,
+    'FLUSH_INTERVAL': 5,
+    'TOKEN': '',
+}
+
+# バケットの上限（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+# ジョブの待ち時間は秒〜分単位になる
+JOB_WAIT_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+# メトリクス名: (種類, 説明, バケット)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by route, method and status.', None),
+    'http_request_duration_seconds': ('histogram', 'Request latency in seconds.', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Response body size in bytes.', SIZE_BUCKETS),
+    'db_queries_per_request': ('histogram', 'Database queries per request.', QUERY_COUNT_BUCKETS),
+    'db_query_duration_seconds': ('histogram', 'Database time per request in seconds.', LATENCY_BUCKETS),
+    'serializer_duration_seconds': ('histogram', 'Serializer time per request in seconds.', LATENCY_BUCKETS),
+    'view_latency_seconds': ('histogram', 'View latency in seconds (@observe_latency).', LATENCY_BUCKETS),
+    'jobs_processed_total': ('counter', 'Background jobs processed by job and outcome.', None),
+    'job_wait_seconds': ('histogram', 'Delay from scheduled run time to job start in seconds.', JOB_WAIT_BUCKETS),
+    'job_duration_seconds': ('histogram', 'Background job run time in seconds.', LATENCY_BUCKETS),
+    'job_queue_depth': ('gauge', 'Background jobs by queue and state.', None),
+    'questions_expired_total': ('counter', 'Questions expired by the sweeper by reward outcome.', None),
+}
+
+# ゲージの値を返す関数（スクレイプ時に呼び出す）: メトリクス名 → [(ラベル, 値), ...] を返す関数
+_gauges = {}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'METRICS', {})}
+
+
+class Histogram:
+    """スレッドセーフな固定バケットのヒストグラム"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+
+    def state(self):
+        """(バケットごとの件数, 件数, 合計) を返す"""
+        with self._lock:
+            return list(self.counts), self.count, self.sum
+
+    def percentile(self, p):
+        """p（0〜1）パーセンタイルが含まれるバケットの上限を返す（上限超過はNone）"""
+        counts, count, _ = self.state()
+        if not count:
+            return None
+        target = count * p
+        cumulative = 0
+        for upper, bucket_count in zip(self.buckets + (None,), counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return upper
+        return None
+
+    def snapshot(self):
+        counts, count, total = self.state()
+        cumulative = 0
+        buckets = []
+        for upper, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            buckets.append({'le': upper, 'count': cumulative})
+        return {
+            'count': count,
+            'sum': round(total, 6),
+            'buckets': buckets,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """ラベル付きのヒストグラムとカウンターを保持する"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def histogram(self, name, labels):
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(METRICS[name][2]))
+        return histogram
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def histograms(self, name):
+        return {labels: histogram for (metric, labels), histogram in list(self._histograms.items()) if metric == name}
+
+    def reset(self):
+        # observe_latency が保持するヒストグラムを無効にしないよう、オブジェクトは残して値だけ戻す
+        with self._lock:
+            self._counters.clear()
+        for histogram in list(self._histograms.values()):
+            histogram.reset()
+
+    def after_fork(self):
+        # fork 前の集計値を子プロセスで重複して数えないよう捨てる
+        self._lock = threading.Lock()
+        self._flusher = None
+        self.reset()
+
+    def dump(self):
+        """JSONに書き出せる形の集計値"""
+        with self._lock:
+            counters = [[name, labels, value] for (name, labels), value in self._counters.items()]
+        histograms = []
+        for (name, labels), histogram in list(self._histograms.items()):
+            counts, count, total = histogram.state()
+            if count:
+                histograms.append([name, labels, counts, count, total])
+        return {'counters': counters, 'histograms': histograms}
+
+    def flush(self, directory):
+        """集計値をこのプロセスのファイルに書き出す"""
+        path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.dump(), f)
+        os.replace(temp_path, path)
+
+    def start_flusher(self, directory, interval):
+        """FLUSH_INTERVAL ごとにファイルへ書き出すスレッドを起動する（fork 後は子プロセスで起動し直す）"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.flush(directory)
+                    except OSError:
+                        pass
+
+            self._flusher = threading.Thread(target=run, name='metrics-flusher', daemon=True)
+            self._flusher.start()
+
+
+registry = MetricsRegistry()
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def observe(name, value, **labels):
+    registry.histogram(name, _labels(**labels)).observe(value)
+
+
+def increment(name, value=1, **labels):
+    registry.inc(name, _labels(**labels), value)
+
+
+def register_gauge(name, collect):
+    """スクレイプ時に collect() で値を取得するゲージを登録する（プロセス間で合算しない値に使う）"""
+    _gauges[name] = collect
+
+
+def get_latency_histogram(endpoint):
+    return registry.histogram('view_latency_seconds', _labels(endpoint=endpoint))
+
+
+def observe_latency(endpoint):
+    """ビューの処理時間を endpoint 名のヒストグラムに記録するデコレーター"""
+
+    def decorator(view_func):
+        histogram = get_latency_histogram(endpoint)
+
+        @wraps(view_func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return view_func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorator
+
+
+def latency_snapshot():
+    """全エンドポイントのヒストグラムを辞書で返す"""
+    histograms = registry.histograms('view_latency_seconds')
+    return {dict(labels)['endpoint']: histogram.snapshot() for labels, histogram in sorted(histograms.items())}
+
+
+def reset_latencies():
+    for histogram in registry.histograms('view_latency_seconds').values():
+        histogram.reset()
+
+
+class RequestSample:
+    """1リクエスト分のDBクエリとシリアライズの集計（observe_queries の観測者としても使う）"""
+
+    __slots__ = ('queries', 'query_time', 'serializer_time', 'in_serializer')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.in_serializer = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - started
+            self.queries += 1
+
+
+_current_sample = contextvars.ContextVar('metrics_request_sample', default=None)
+
+
+def instrument_serializers():
+    """
+    シリアライザーの data の生成時間をリクエストの集計に加える
+
+    入れ子のシリアライザーは外側の data の中で処理されるため、最も外側の1回だけを計測する。
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, 'instrumented', False):
+        return
+
+    def data(self):
+        sample = _current_sample.get()
+        if sample is None or sample.in_serializer:
+            return original.fget(self)
+        sample.in_serializer = True
+        started = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            sample.serializer_time += time.perf_counter() - started
+            sample.in_serializer = False
+
+    data.instrumented = True
+    BaseSerializer.data = property(data)
+
+
+ROUTE_HISTOGRAMS = (
+    'http_request_duration_seconds',
+    'db_queries_per_request',
+    'db_query_duration_seconds',
+    'serializer_duration_seconds',
+    'http_response_size_bytes',
+)
+_route_histograms = {}
+
+
+def get_route_histograms(route, method):
+    """ルートとメソッドのヒストグラム（ROUTE_HISTOGRAMS の順）をまとめて返す"""
+    histograms = _route_histograms.get((route, method))
+    if histograms is None:
+        labels = _labels(route=route, method=method)
+        histograms = tuple(registry.histogram(name, labels) for name in ROUTE_HISTOGRAMS)
+        _route_histograms[(route, method)] = histograms
+    return histograms
+
+
+def record_request(request, response, sample, duration):
+    match = getattr(request, 'resolver_match', None)
+    route = getattr(match, 'route', None) or '<unmatched>'
+    latency, queries, query_time, serializer_time, size = get_route_histograms(route, request.method)
+
+    registry.inc('http_requests_total', _labels(route=route, method=request.method, status=str(response.status_code)))
+    latency.observe(duration)
+    queries.observe(sample.queries)
+    query_time.observe(sample.query_time)
+    if sample.serializer_time:
+        serializer_time.observe(sample.serializer_time)
+    if not response.streaming:
+        size.observe(len(response.content))
+
+
+@contextmanager
+def _sampling(sample):
+    token = _current_sample.set(sample)
+    try:
+        with observe_queries(sample):
+            yield
+    finally:
+        _current_sample.reset(token)
+
+
+class MetricsMiddleware:
+    """リクエストごとのメトリクスを記録するミドルウェア（MIDDLEWARE の先頭に置く、非同期ビューにも対応）"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        instrument_serializers()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        config = get_config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        sample = RequestSample()
+        started = time.perf_counter()
+        with _sampling(sample):
+            response = self.get_response(request)
+        self._record(config, request, response, sample, started)
+        return response
+
+    async def __acall__(self, request):
+        config = get_config()
+        if not config['ENABLED']:
+            return await self.get_response(request)
+
+        sample = RequestSample()
+        started = time.perf_counter()
+        with _sampling(sample):
+            response = await self.get_response(request)
+        self._record(config, request, response, sample, started)
+        return response
+
+    def _record(self, config, request, response, sample, started):
+        record_request(request, response, sample, time.perf_counter() - started)
+        if config['MULTIPROCESS_DIR']:
+            registry.start_flusher(config['MULTIPROCESS_DIR'], config['FLUSH_INTERVAL'])
+
+
+AGGREGATE_FILENAME = 'metrics-aggregate.json'
+
+
+@contextmanager
+def _directory_lock(directory, exclusive=False):
+    """合算用のファイルへのまとめ込みと読み込みが重ならないようにするロック"""
+    import fcntl
+
+    with open(os.path.join(directory, 'metrics.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(dumps):
+    counters = {}
+    histograms = {}
+    for dump in dumps:
+        for name, labels, value in dump['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, count, total in dump['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0, 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += count
+            merged[2] += total
+    return counters, histograms
+
+
+def mark_process_dead(pid, directory):
+    """
+    終了したプロセスのファイルを合算用のファイル（metrics-aggregate.json）にまとめて削除し、まとめたかを返す
+
+    gunicorn の child_exit から呼び出す。ワーカーが入れ替わってもファイルが増え続けず、カウンターは単調増加のまま残る。
+    """
+    path = os.path.join(directory, f'metrics-{pid}.json')
+    aggregate_path = os.path.join(directory, AGGREGATE_FILENAME)
+    with _directory_lock(directory, exclusive=True):
+        dump = _load(path)
+        if dump is None:
+            return False
+        aggregate = _load(aggregate_path)
+        counters, histograms = _merge([aggregate, dump] if aggregate else [dump])
+        temp_path = f'{aggregate_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({
+                'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+                'histograms': [[name, labels, *merged] for (name, labels), merged in histograms.items()],
+            }, f)
+        os.replace(temp_path, aggregate_path)
+        os.remove(path)
+    return True
+
+
+def collect(config=None):
+    """全プロセス（終了したプロセスは合算用のファイル）の集計値を合算して返す"""
+    config = config or get_config()
+    directory = config['MULTIPROCESS_DIR']
+    if not directory:
+        return _merge([registry.dump()])
+
+    registry.flush(directory)
+    with _directory_lock(directory):
+        dumps = [
+            _load(os.path.join(directory, filename))
+            for filename in os.listdir(directory) if filename.endswith('.json')
+        ]
+    return _merge([dump for dump in dumps if dump])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render_metrics(config=None):
+    """Prometheus のテキスト形式で出力する"""
+    counters, histograms = collect(config)
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        if kind == 'gauge':
+            samples = sorted(_gauges[name]()) if name in _gauges else []
+        elif kind == 'counter':
+            samples = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+        else:
+            samples = sorted((labels, value) for (metric, labels), value in histograms.items() if metric == name)
+        if not samples:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            if kind in ('counter', 'gauge'):
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            counts, count, total = value
+            cumulative = 0
+            for upper, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(labels, le=upper)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus のスクレイプ用エンドポイント"""
+    config = get_config()
+    if not config['TOKEN']:
+        # トークンを指定していない本番環境では公開しない（処理時間やジョブキューの内部状態が見えるため）
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {config["TOKEN"]}'):
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(config), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _flush_at_exit():
+    directory = get_config()['MULTIPROCESS_DIR'] if settings.configured else None
+    if directory:
+        try:
+            registry.flush(directory)
+        except OSError:
+            pass
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.after_fork)
+atexit.register(_flush_at_exit)
@@ -0,0 +1,206 @@
+"""
+リアルタイム配信用のパブリッシュ／サブスクライブ
+
+書き込み側（同期のビューやシグナル、任意のスレッド）が publish() したメッセージを、
+同じチャンネルを購読している非同期ビュー（Server-Sent Events の接続）に配信する。
+ブローカーは settings.PUBSUB で設定する（PAYMENT_GATEWAYS と同じ形式）::
+
+    PUBSUB = {
+        'BACKEND': 'oshare_style_answers.pubsub.InProcessBroker',
+        'OPTIONS': {'max_queue': 100},
+    }
+
+InProcessBroker は同じプロセス内の購読者にだけ配信する（runserver・ワーカー1つの uvicorn 向け）。
+複数ワーカーで配信する場合は RedisBroker（``OPTIONS: {'url': 'redis://...'}``、redis パッケージが必要）を使う。
+
+購読者の受信待ちが max_queue 件を超えた場合（遅いクライアント）は、メッセージを捨てずに購読を打ち切り、
+SubscriptionOverflow で通知する。クライアントは全体を取得し直してから購読し直す::
+
+    async with get_broker().subscribe('question:1') as subscription:
+        message = await subscription.get(timeout=15)  # タイムアウトした場合は None
+"""
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+
+class SubscriptionOverflow(Exception):
+    """購読者の受信待ちのメッセージが上限を超えた"""
+
+
+class Subscription:
+    """1つのチャンネルの購読（``async with`` の中で、購読したイベントループ上で受信する）"""
+
+    def __init__(self, channel, max_queue):
+        self.channel = channel
+        self.max_queue = max_queue
+        self.overflowed = False
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.max_queue)
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def deliver(self, message):
+        """イベントループのスレッドで呼ぶ"""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """次のメッセージを返す（timeout 秒以内に届かなければ None）"""
+        if self.queue.empty() and self.overflowed:
+            raise SubscriptionOverflow()
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class BaseBroker:
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+
+    def publish(self, channel, message):
+        """文字列のメッセージを配信する（どのスレッドからでも呼べる）"""
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        """``async with`` で使う購読（Subscription）"""
+        raise NotImplementedError
+
+
+class InProcessSubscription(Subscription):
+    def __init__(self, broker, channel):
+        super().__init__(channel, broker.max_queue)
+        self.broker = broker
+
+    async def start(self):
+        self.broker._add(self)
+
+    async def stop(self):
+        self.broker._remove(self)
+
+
+class InProcessBroker(BaseBroker):
+    """同じプロセス内の購読者に配信するブローカー"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # 購読したイベントループが終了している
+                self._remove(subscription)
+
+    def subscribe(self, channel):
+        return InProcessSubscription(self, channel)
+
+    def _add(self, subscription):
+        with self._lock:
+            self._channels.setdefault(subscription.channel, set()).add(subscription)
+
+    def _remove(self, subscription):
+        with self._lock:
+            subscriptions = self._channels.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._channels[subscription.channel]
+
+
+class RedisSubscription(Subscription):
+    def __init__(self, broker, channel):
+        super().__init__(channel, broker.max_queue)
+        self.broker = broker
+
+    async def start(self):
+        self.client = self.broker.redis.asyncio.Redis.from_url(self.broker.url)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        self.relay = asyncio.create_task(self._relay())
+
+    async def _relay(self):
+        async for item in self.pubsub.listen():
+            if item['type'] == 'message':
+                self.deliver(item['data'].decode())
+
+    async def stop(self):
+        self.relay.cancel()
+        await self.pubsub.unsubscribe(self.channel)
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisBroker(BaseBroker):
+    """Redis の PUBLISH/SUBSCRIBE で複数プロセスの購読者に配信するブローカー"""
+
+    def __init__(self, url='redis://localhost:6379/0', **options):
+        super().__init__(**options)
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError as exc:
+            raise ImproperlyConfigured('RedisBroker を使うには redis パッケージが必要です') from exc
+        self.redis = redis
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(channel, message)
+
+    def subscribe(self, channel):
+        return RedisSubscription(self, channel)
+
+
+DEFAULT_BROKER = {
+    'BACKEND': 'oshare_style_answers.pubsub.InProcessBroker',
+    'OPTIONS': {},
+}
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        config = getattr(settings, 'PUBSUB', DEFAULT_BROKER)
+        _broker = import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def publish(channel, message):
+    get_broker().publish(channel, message)
+
+
+@receiver(setting_changed)
+def reset_broker(*, setting, **kwargs):
+    global _broker
+    if setting == 'PUBSUB':
+        _broker = None
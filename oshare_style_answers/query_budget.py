@@ -0,0 +1,159 @@
+"""
+リクエストごとのクエリ数の記録とクエリバジェット
+
+ビューに ``@query_budget(n)`` を付けてリクエストあたりのクエリ数の上限を宣言する。
+メソッドごとに変える場合は ``@query_budget({'GET': 3, 'POST': 6})`` のように指定する。
+関数ビューでは @api_view より外側、クラスビューではクラスに付ける。
+
+QueryBudgetMiddleware はリクエスト中に実行されたSQLを記録し、
+
+- バジェットを超えたリクエスト
+- 同じ形のSQL（パラメーター違い）が繰り返し実行されたリクエスト（N+1の疑い）
+
+を警告する。テスト実行時（QueryBudgetTestRunner）はバジェット超過を例外にしてテストを失敗させる::
+
+    QUERY_BUDGET = {
+        'ENABLED': DEBUG,
+        'RAISE': False,                # バジェット超過で QueryBudgetExceeded を送出する
+        'ALLOWANCE': 2,                # セッション・認証の取得に使うクエリ分の余裕
+        'N_PLUS_ONE_THRESHOLD': 5,     # 同じ形のSQLがこの回数以上でN+1として警告する
+        'N_PLUS_ONE_RAISE': False,
+    }
+"""
+
+import logging
+import re
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .db_observers import observe_queries
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'RAISE': False,
+    'ALLOWANCE': 2,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'N_PLUS_ONE_RAISE': False,
+}
+
+# トランザクション制御の文はクエリ数に含めない
+_TRANSACTION_STATEMENT = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT|ROLLBACK)\b', re.I)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.I)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """リクエストがクエリバジェットを超えた（またはN+1が検出された）"""
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def query_budget(budget):
+    """ビューのクエリバジェットを宣言するデコレーター（関数ビュー・クラスビュー共通）"""
+
+    def decorator(view):
+        view.query_budget = budget
+        return view
+
+    return decorator
+
+
+def get_view_budget(view_func, method):
+    """ビューに宣言されたバジェットを返す（未宣言はNone）"""
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+        budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        budget = budget.get(method, budget.get('default'))
+    return budget
+
+
+def sql_shape(sql):
+    """パラメーターやリテラルを除いたSQLの形"""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _LITERAL.sub('?', sql)
+
+
+class QueryRecorder:
+    """observe_queries に渡してSQLを記録する"""
+
+    def __init__(self):
+        self.shapes = Counter()
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not _TRANSACTION_STATEMENT.match(sql):
+            self.count += 1
+            self.shapes[sql_shape(sql)] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        """threshold 回以上実行された同じ形のSQLと回数"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class QueryBudgetMiddleware:
+    """リクエストごとのクエリ数を記録し、バジェット超過とN+1を検出するミドルウェア（非同期ビューにも対応）"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        config = get_config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with observe_queries(recorder):
+            response = self.get_response(request)
+        return self._check(config, request, response, recorder)
+
+    async def __acall__(self, request):
+        config = get_config()
+        if not config['ENABLED']:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        with observe_queries(recorder):
+            response = await self.get_response(request)
+        return self._check(config, request, response, recorder)
+
+    def _check(self, config, request, response, recorder):
+        response['X-Query-Count'] = str(recorder.count)
+        label = f'{request.method} {request.path}'
+
+        repeated = recorder.repeated(config['N_PLUS_ONE_THRESHOLD'])
+        if repeated:
+            shape, count = repeated[0]
+            message = f'Possible N+1 on {label}: {count} queries shaped like {shape[:300]}'
+            logger.warning(message)
+            if config['N_PLUS_ONE_RAISE']:
+                raise QueryBudgetExceeded(message)
+
+        # process_view を使うと非同期のリクエストで同期の呼び出しが挟まるため、解決済みのビューから取得する
+        match = getattr(request, 'resolver_match', None)
+        budget = get_view_budget(match.func, request.method) if match else None
+        if budget is not None and recorder.count > budget + config['ALLOWANCE']:
+            message = (
+                f'{label} executed {recorder.count} queries '
+                f'(budget {budget} + allowance {config["ALLOWANCE"]})'
+            )
+            logger.warning(message)
+            if config['RAISE']:
+                raise QueryBudgetExceeded(message)
+        return response
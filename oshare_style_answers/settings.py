@@ -14,6 +14,8 @@ from pathlib import Path
 import os
 import locale
 
+from .databases import database_from_env, replica_databases
+
 # UTF-8エンコーディング設定
 locale.setlocale(locale.LC_ALL, '')
 
@@ -54,17 +56,21 @@ INSTALLED_APPS = [
     'accounts',  # カスタムユーザーアプリ
     'answers',   # Q&Aアプリ
     'payments',  # 決済アプリ
+    'jobs',      # バックグラウンドジョブ
 ]
 
 MIDDLEWARE = [
+    'oshare_style_answers.metrics.MetricsMiddleware',  # 全体の処理時間を計測するため先頭に置く
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'oshare_style_answers.db_router.ReplicaPinMiddleware',  # セッションの読み込みより前に振り分ける
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'oshare_style_answers.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'oshare_style_answers.urls'
@@ -91,11 +97,21 @@ WSGI_APPLICATION = 'oshare_style_answers.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# DB_ENGINE=postgresql で PostgreSQL に切り替える（oshare_style_answers.databases を参照）
+# 既定は SQLite（.env には DB_ENGINE を書かない）。docker-compose の db サービスを使う場合は
+# DB_ENGINE=postgresql を環境変数で渡す（接続先は .env の POSTGRES_* を使う）
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
+    **replica_databases(),
+}
+
+# リードレプリカへの振り分け（oshare_style_answers.db_router）
+DATABASE_ROUTERS = ['oshare_style_answers.db_router.ReplicaRouter']
+REPLICA_ROUTING = {
+    'REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    'PIN_SECONDS': int(os.environ.get('DB_REPLICA_PIN_SECONDS', 5)),  # 書き込み後にプライマリから読む秒数
+    'COOKIE_NAME': 'primary_pin',
+    'CACHE_ALIAS': 'default',
 }
 
 
@@ -168,15 +184,25 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'redact': {
+            '()': 'oshare_style_answers.log_handlers.RedactingFilter',
+        },
+    },
     'handlers': {
+        # 書き込みは QueueListener のスレッドで行い、リクエスト処理をブロックしない
         'console': {
-            'class': 'logging.StreamHandler',
+            'class': 'oshare_style_answers.log_handlers.QueuedHandler',
+            'target_class': 'logging.StreamHandler',
             'formatter': 'verbose',
+            'filters': ['redact'],
         },
         'file': {
-            'class': 'logging.FileHandler',
+            'class': 'oshare_style_answers.log_handlers.QueuedHandler',
+            'target_class': 'logging.FileHandler',
             'filename': BASE_DIR / 'debug.log',
             'formatter': 'verbose',
+            'filters': ['redact'],
         },
     },
     'root': {
@@ -191,7 +217,7 @@ LOGGING = {
         },
         'accounts': {
             'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'level': 'INFO',
             'propagate': False,
         },
     },
@@ -220,6 +246,10 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# 冪等性キーヘッダーをクロスオリジンで許可
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 # 開発環境での追加CORS設定
 if DEBUG:
     CORS_ALLOW_ALL_ORIGINS = True
@@ -233,8 +263,8 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'accounts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
     ],
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
@@ -246,6 +276,103 @@ REST_FRAMEWORK = {
     ],
     'UNICODE_JSON': True,
     'COMPACT_JSON': False,
+    # クライアントIPの判定に使うプロキシの段数（0 は REMOTE_ADDR のみを使う）。
+    # 未指定（None）の DRF は X-Forwarded-For をそのまま使うため、ヘッダーを書き換えるとIP単位のレート制限を回避できる
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    # oshare_style_answers.throttling のスコープごとのレート（スライディングウィンドウ）
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '20/min',  # IPアドレス単位
+        'register': '10/hour',  # IPアドレス単位
+        'vote': '60/min',
+        'best_answer': '20/min',
+        'coupon_validate': '30/min',
+    },
+}
+THROTTLE_CACHE_ALIAS = 'default'
+
+# クエリバジェット（oshare_style_answers.query_budget）
+# 開発時は超過とN+1を警告し、テスト時（QueryBudgetTestRunner）は超過でテストを失敗させる
+QUERY_BUDGET = {
+    'ENABLED': DEBUG,
+    'RAISE': False,
+    'ALLOWANCE': 2,  # セッション・認証の取得に使うクエリ分
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'N_PLUS_ONE_RAISE': False,
+}
+TEST_RUNNER = 'oshare_style_answers.test_runner.QueryBudgetTestRunner'
+
+# リクエストメトリクス（oshare_style_answers.metrics、/metrics で公開）
+METRICS = {
+    'ENABLED': True,
+    'MULTIPROCESS_DIR': os.environ.get('METRICS_MULTIPROC_DIR') or None,  # 複数ワーカーで集計する場合
+    'FLUSH_INTERVAL': 5,
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),  # 未指定の場合、DEBUG=False では /metrics を 403 にする
+}
+
+# トークン認証キャッシュ設定（accounts.authentication.CachedTokenAuthentication）
+TOKEN_AUTH_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 60,  # 共有キャッシュのTTL（秒）、LocMemCache（CACHES 未設定時の既定）では共有キャッシュを使わない
+    'LOCAL_TIMEOUT': 5,  # プロセス内LRUのTTL（秒）、他プロセスでの無効化はこの時間だけ遅れる
+    'LOCAL_MAXSIZE': 1024,
+}
+
+# 冪等性キー設定（決済・注文作成API）
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24  # 保存したレスポンスの保持期間（秒）
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # 処理中のキーを別リクエストが引き継げるまでの時間（秒）
+
+# 決済ゲートウェイ設定（決済タイプごとに指定、未指定のタイプは'default'を使用）
+# 開発・テスト用のシミュレーター。本番（settings_production.py）では PAYMENT_GATEWAY_BACKEND で実際のゲートウェイを指定する
+PAYMENT_GATEWAYS = {
+    'default': {
+        'BACKEND': 'payments.gateways.SimulatorGateway',
+        'OPTIONS': {
+            'latency_ms': 200,
+            'jitter_ms': 100,
+            'failure_rate': 0.0,
+            'timeout_rate': 0.0,
+            'timeout_seconds': 10,
+        },
+    },
+}
+PAYMENT_MAX_ATTEMPTS = 3  # タイムアウト時の最大試行回数
+PAYMENT_PROCESSING_TIMEOUT = 300  # 処理中のまま放置された決済を再キューするまでの時間（秒）
+
+# 非同期ビューで並行してクエリを実行するスレッド数（oshare_style_answers.async_views.gather_queries）
+# 各スレッドがデータベースごとに接続を1つずつ持ち続ける
+ASYNC_QUERY_THREADS = int(os.environ.get('ASYNC_QUERY_THREADS', 4))
+
+# リアルタイム配信（oshare_style_answers.pubsub、質問ページの Server-Sent Events）
+# 複数ワーカーで配信する場合は PUBSUB_REDIS_URL を指定して Redis 経由にする（本番は gunicorn.conf.py の uvicorn ワーカーと組み合わせる）
+PUBSUB = {
+    'BACKEND': 'oshare_style_answers.pubsub.InProcessBroker',
+    'OPTIONS': {'max_queue': 100},
+}
+if os.environ.get('PUBSUB_REDIS_URL'):
+    PUBSUB = {
+        'BACKEND': 'oshare_style_answers.pubsub.RedisBroker',
+        'OPTIONS': {'url': os.environ['PUBSUB_REDIS_URL'], 'max_queue': 100},
+    }
+
+# バックグラウンドジョブ（jobs アプリ、run_jobs コマンドのワーカーが実行する）
+# Redis をキューにする場合は JOBS_REDIS_URL を指定する
+JOB_QUEUE = {
+    'BACKEND': 'jobs.backends.DatabaseBackend',
+    'OPTIONS': {'visibility_timeout': 300},  # 実行中のまま放置されたジョブを再キューするまでの時間（秒）
+    'EAGER': False,
+}
+if os.environ.get('JOBS_REDIS_URL'):
+    JOB_QUEUE['BACKEND'] = 'jobs.backends.RedisBackend'
+    JOB_QUEUE['OPTIONS'] = {**JOB_QUEUE['OPTIONS'], 'url': os.environ['JOBS_REDIS_URL']}
+
+# 新規登録時に付与するポイント（最初の質問の報酬ポイントを預けられるようにする、0で付与しない）
+SIGNUP_BONUS_POINTS = 100
+
+# 受付中の質問の期限切れ（answers.expiry、expire_questions コマンドで定期実行する）
+QUESTION_EXPIRY = {
+    'AFTER_DAYS': int(os.environ.get('QUESTION_EXPIRY_DAYS', 30)),  # 投稿からこの日数が過ぎた受付中の質問を期限切れにする
+    'BATCH_SIZE': 500,  # 1トランザクションで期限切れにする質問数
+    'REWARD_POLICY': 'refund_unanswered',  # 預かった報酬ポイントの扱い: 'refund'（返還）/ 'refund_unanswered'（回答がない場合のみ返還）/ 'forfeit'（没収）
 }
 
 # CSRF設定 - API用の除外設定
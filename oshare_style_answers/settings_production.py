@@ -5,9 +5,14 @@
 from .settings import *
 import os
 
+from .databases import database_from_env, replica_databases
+
 # DEBUG設定
 DEBUG = False
 
+# クエリバジェットの記録は開発・テスト用
+QUERY_BUDGET = {**QUERY_BUDGET, 'ENABLED': False}
+
 # 本番環境で許可するホスト（さくらのレンタルサーバーのドメインに変更してください）
 ALLOWED_HOSTS = [
     'your-domain.sakura.ne.jp',  # ここをあなたのドメインに変更
@@ -22,17 +27,19 @@ SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'django-insecure-&+-inj5v&1=a)h
 # HTTPS設定（さくらのレンタルサーバーでSSLを使用する場合）
 SECURE_SSL_REDIRECT = False  # さくらのレンタルサーバーではプロキシ経由なのでFalse
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# さくらのレンタルサーバーのプロキシ（1段）が付けた X-Forwarded-For の末尾をクライアントIPとして使う
+REST_FRAMEWORK = {**REST_FRAMEWORK, 'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 1))}
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = 'DENY'
 
-# データベース設定（さくらのレンタルサーバーでMySQLを使用する場合）
-# SQLiteのままでも動作しますが、MySQLの方が推奨です
+# データベース設定
+# 既定は SQLite。DB_ENGINE=postgresql で PostgreSQL（コネクションプール付き）に切り替える
+# リードレプリカは POSTGRES_REPLICA_HOSTS で追加する（REPLICA_ROUTING は settings.py で設定済み）
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(BASE_DIR),
+    **replica_databases(),
 }
 
 # MySQLを使用する場合は以下をコメントアウト：
@@ -50,6 +57,15 @@ DATABASES = {
 #     }
 # }
 
+# 決済ゲートウェイ設定
+# 開発用のシミュレーター（settings.py）は引き継がない。PAYMENT_GATEWAY_BACKEND に実際のゲートウェイ
+# （payments.gateways.BaseGateway のサブクラス）を指定する。未指定の場合、決済はすべて失敗にする
+PAYMENT_GATEWAYS = {}
+if os.environ.get('PAYMENT_GATEWAY_BACKEND'):
+    PAYMENT_GATEWAYS = {
+        'default': {'BACKEND': os.environ['PAYMENT_GATEWAY_BACKEND'], 'OPTIONS': {}},
+    }
+
 # 静的ファイル設定
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'static'
@@ -82,11 +98,18 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'redact': {
+            '()': 'oshare_style_answers.log_handlers.RedactingFilter',
+        },
+    },
     'handlers': {
         'file': {
-            'class': 'logging.FileHandler',
+            'class': 'oshare_style_answers.log_handlers.QueuedHandler',
+            'target_class': 'logging.FileHandler',
             'filename': BASE_DIR / 'production.log',
             'formatter': 'verbose',
+            'filters': ['redact'],
         },
     },
     'root': {
@@ -103,6 +126,7 @@ LOGGING = {
 }
 
 # キャッシュ設定
+# FileBasedCache の incr はプロセス間でアトミックではないため、レート制限の件数は同時アクセス時に少なめに数えられる
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
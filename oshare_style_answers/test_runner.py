@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """テスト中はクエリバジェットの超過をテストの失敗として扱うテストランナー"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET = {**getattr(settings, 'QUERY_BUDGET', {}), 'ENABLED': True, 'RAISE': True}
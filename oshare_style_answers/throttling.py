@@ -0,0 +1,184 @@
+"""
+スライディングウィンドウ方式のレート制限
+
+DRF の SimpleRateThrottle はリクエスト時刻のリストをキャッシュに保存するため、
+リクエスト数に比例して読み書きが重くなる。ここでは固定ウィンドウのカウンターを2つ持ち、
+直前のウィンドウの件数を経過時間で按分して現在の件数を推定する（スライディングウィンドウカウンター）。
+1リクエストあたりのキャッシュ操作は add/incr/get の定数回。add と incr がプロセス間でアトミックになるのは
+Redis・Memcached のキャッシュを使う場合で、FileBasedCache・DatabaseCache の incr は get と set に分かれるため
+同時アクセス時に件数を取りこぼす（制限が緩くなる）。厳密に制限する場合は THROTTLE_CACHE_ALIAS に Redis などを指定する。
+
+レートは DRF と同じく REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] にスコープごとに指定する::
+
+    'DEFAULT_THROTTLE_RATES': {'login': '10/min', 'vote': '60/min'}
+
+キャッシュは settings.THROTTLE_CACHE_ALIAS（既定は 'default'）を使い、
+キャッシュへの接続に失敗した場合はプロセス内のカウンターで制限を続ける。
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCounterStore:
+    """キャッシュが使えない場合のプロセス内カウンター（キャッシュの add/incr/get と同じ使い方をする）"""
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._next_prune = 0
+
+    def add(self, key, value, timeout):
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_prune:
+                self._prune(now)
+            entry = self._counters.get(key)
+            if entry is not None and entry[0] > now:
+                return False
+            self._counters[key] = (now + timeout, value)
+            return True
+
+    def incr(self, key, delta=1):
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                raise ValueError(f"Key '{key}' not found")
+            count = entry[1] + delta
+            self._counters[key] = (entry[0], count)
+            return count
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._counters.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return default
+            return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+
+    def _prune(self, now):
+        self._counters = {key: value for key, value in self._counters.items() if value[0] > now}
+        self._next_prune = now + 60
+
+
+local_counters = LocalCounterStore()
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    スライディングウィンドウカウンターによるレート制限
+
+    サブクラスで ``scope`` を指定する。認証済みならユーザー単位、
+    未認証（または ``per_ip = True``）ならIPアドレス単位で数える。
+    IPアドレスは REST_FRAMEWORK['NUM_PROXIES'] に従って判定する（X-Forwarded-For を信用するのはプロキシの段数分のみ）。
+    """
+
+    scope = None
+    per_ip = False
+
+    def get_rate(self):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            return None
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        return int(num), duration
+
+    def get_ident_key(self, request):
+        if not self.per_ip and request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        rate = self.get_rate()
+        if rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(rate)
+
+        now = time.time()
+        window = int(now // self.duration)
+        self.elapsed = now - window * self.duration
+        prefix = f'throttle:{self.scope}:{self.get_ident_key(request)}'
+        current_key = f'{prefix}:{window}'
+        previous_key = f'{prefix}:{window - 1}'
+
+        try:
+            return self._check(self._cache(), current_key, previous_key)
+        except Exception:
+            logger.warning('Throttle cache unavailable, using in-process counters')
+            return self._check(local_counters, current_key, previous_key)
+
+    def _check(self, store, current_key, previous_key):
+        if store.add(current_key, 1, self.duration * 2):
+            self.current = 1
+        else:
+            try:
+                self.current = store.incr(current_key)
+            except ValueError:
+                # add と incr の間にキーが失効した場合
+                store.add(current_key, 1, self.duration * 2)
+                self.current = 1
+        self.previous = store.get(previous_key, 0)
+        if self._estimate() <= self.num_requests:
+            return True
+
+        # 拒否したリクエストは数えない
+        try:
+            self.current = store.incr(current_key, -1)
+        except ValueError:
+            self.current = 0
+        return False
+
+    def wait(self):
+        """次のリクエストが許可されるまでの秒数"""
+        allowed = self.num_requests - 1
+        if self.current <= allowed:
+            # 直前のウィンドウの按分が減って枠が空くまで待つ
+            needed = 1 - (allowed - self.current) / self.previous if self.previous else 0
+            return max(needed * self.duration - self.elapsed, 0)
+        # 現在のウィンドウが埋まっている場合は次のウィンドウで按分が減るまで待つ
+        needed = 1 - allowed / self.current
+        return self.duration - self.elapsed + needed * self.duration
+
+    def _estimate(self):
+        weight = 1 - self.elapsed / self.duration
+        return self.previous * weight + self.current
+
+    def _cache(self):
+        return caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+
+
+class LoginRateThrottle(SlidingWindowThrottle):
+    scope = 'login'
+    per_ip = True
+
+
+class RegisterRateThrottle(SlidingWindowThrottle):
+    scope = 'register'
+    per_ip = True
+
+
+class VoteRateThrottle(SlidingWindowThrottle):
+    scope = 'vote'
+
+
+class BestAnswerRateThrottle(SlidingWindowThrottle):
+    scope = 'best_answer'
+
+
+class CouponValidationRateThrottle(SlidingWindowThrottle):
+    scope = 'coupon_validate'
@@ -20,6 +20,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
 from api.frontend_views import ReactAppView, serve_react_build
+from oshare_style_answers.metrics import metrics_view
 from django.views.static import serve
 import os
 
@@ -45,6 +46,7 @@ urlpatterns = [
     path('api/', include('payments.urls')),  # 決済関連API
     path('admin/', admin.site.urls),
     path('api-info/', api_root, name='api_root'),  # API情報ページ
+    path('metrics', metrics_view, name='metrics'),  # Prometheus メトリクス
     path('app/', ReactAppView.as_view(), name='react_app'),  # React アプリ（開発用）
     path('', serve_react_build, name='frontend_home'),  # ルートでReactアプリを提供
 ]
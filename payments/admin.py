@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     PaymentMethod, Coupon, Order, OrderItem, 
-    CouponUsage, ShoppingCart, Payment
+    CouponUsage, ShoppingCart, Payment, IdempotencyKey,
+    SalesDailyRollup, SalesRollupWatermark
 )
 
 @admin.register(PaymentMethod)
@@ -15,17 +16,12 @@ class PaymentMethodAdmin(admin.ModelAdmin):
 class CouponAdmin(admin.ModelAdmin):
     list_display = [
         'code', 'name', 'discount_type', 'discount_value', 
-        'minimum_order_amount', 'usage_limit', 'is_active', 
+        'minimum_order_amount', 'usage_limit', 'usage_count', 'is_active', 
         'valid_from', 'valid_until'
     ]
     list_filter = ['discount_type', 'is_active', 'valid_from', 'valid_until']
     search_fields = ['code', 'name']
-    readonly_fields = ['created_at', 'updated_at']
-    
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        # 使用回数の注釈を追加
-        return qs.prefetch_related('couponusage_set')
+    readonly_fields = ['usage_count', 'created_at', 'updated_at']
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -89,8 +85,31 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = ['status', 'payment_method', 'processed_at']
     search_fields = ['order__order_number', 'external_transaction_id', 'external_payment_id']
     readonly_fields = ['created_at', 'updated_at']
+    exclude = ['payment_token']
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related(
             'order', 'payment_method'
         )
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ['key', 'scope', 'user', 'response_status', 'expires_at', 'created_at']
+    list_filter = ['scope', 'response_status']
+    search_fields = ['key', 'user__username']
+    readonly_fields = ['request_fingerprint', 'response_body', 'locked_at', 'created_at']
+
+
+@admin.register(SalesDailyRollup)
+class SalesDailyRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'dimension', 'label', 'orders_count', 'units', 'revenue', 'discount']
+    list_filter = ['dimension', 'date']
+    search_fields = ['label']
+    date_hierarchy = 'date'
+    readonly_fields = ['updated_at']
+
+@admin.register(SalesRollupWatermark)
+class SalesRollupWatermarkAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_processed_at', 'updated_at']
+    readonly_fields = ['updated_at']
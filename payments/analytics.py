@@ -0,0 +1,219 @@
+"""
+売上集計（日次ロールアップ）
+
+注文の作成日ごとに、全体・商品・ブランド・カテゴリ・クーポン・決済方法の軸で
+売上・販売数量・割引額を SalesDailyRollup に保存する。
+更新は前回処理した注文の更新日時（ウォーターマーク）以降に変更された注文だけを対象とし、
+それらの注文が属する日の集計のみを再計算する。
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, Sum, Value, When
+from django.db.models.functions import TruncDate
+
+from .models import Order, OrderItem, SalesDailyRollup, SalesRollupWatermark
+
+WATERMARK_NAME = 'sales_daily'
+
+# 売上に含めない注文ステータス
+EXCLUDED_STATUSES = ['cancelled', 'refunded']
+
+# 注文明細を集計する軸: (キー, 表示名)
+ITEM_DIMENSIONS = {
+    'item': ('item_id', 'item__name'),
+    'brand': ('item__brand_id', 'item__brand__name'),
+    'category': ('item__category_id', 'item__category__name'),
+}
+
+# 注文単位で集計する軸: (キー, 表示名)
+ORDER_DIMENSIONS = {
+    'total': (None, None),
+    'coupon': ('coupon_id', 'coupon__code'),
+    'payment_method': ('payment_method_id', 'payment_method__name'),
+}
+
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+CENT = Decimal('0.01')
+
+
+def _amount(value):
+    return Decimal(value or 0).quantize(CENT)
+
+
+def _item_rollups(dates):
+    """商品・ブランド・カテゴリ軸の集計（割引額は明細金額に応じて按分）"""
+    items = OrderItem.objects.filter(
+        order__created_at__date__in=dates
+    ).exclude(order__status__in=EXCLUDED_STATUSES).annotate(day=TruncDate('order__created_at'))
+    
+    discount_share = Case(
+        When(order__subtotal=0, then=Value(0)),
+        default=F('total_price') * F('order__discount_amount') / F('order__subtotal'),
+        output_field=AMOUNT_FIELD,
+    )
+    
+    for dimension, (key_field, label_field) in ITEM_DIMENSIONS.items():
+        rows = items.values('day', key_field, label_field).annotate(
+            orders_count=Count('order', distinct=True),
+            units_sum=Sum('quantity'),
+            revenue_sum=Sum('total_price'),
+            discount_sum=Sum(discount_share),
+        ).order_by()
+        for row in rows:
+            yield SalesDailyRollup(
+                date=row['day'],
+                dimension=dimension,
+                key=row[key_field],
+                label=row[label_field] or '',
+                orders_count=row['orders_count'],
+                units=row['units_sum'] or 0,
+                revenue=_amount(row['revenue_sum']),
+                discount=_amount(row['discount_sum']),
+            )
+
+
+def _order_rollups(dates):
+    """全体・クーポン・決済方法軸の集計"""
+    orders = Order.objects.filter(
+        created_at__date__in=dates
+    ).exclude(status__in=EXCLUDED_STATUSES).annotate(day=TruncDate('created_at'))
+    items = OrderItem.objects.filter(
+        order__created_at__date__in=dates
+    ).exclude(order__status__in=EXCLUDED_STATUSES).annotate(day=TruncDate('order__created_at'))
+    
+    for dimension, (key_field, label_field) in ORDER_DIMENSIONS.items():
+        group = ['day']
+        if key_field:
+            group += [key_field, label_field]
+            dimension_orders = orders.filter(**{f'{key_field}__isnull': False})
+        else:
+            dimension_orders = orders
+        
+        # 数量は明細側で集計して結合（注文と明細のJOINで金額が重複しないように）
+        units = defaultdict(int)
+        item_group = ['day'] + ([f'order__{key_field}'] if key_field else [])
+        for row in items.values(*item_group).annotate(units_sum=Sum('quantity')).order_by():
+            units[tuple(row[field] for field in item_group)] = row['units_sum'] or 0
+        
+        rows = dimension_orders.values(*group).annotate(
+            orders_count=Count('id'),
+            revenue_sum=Sum('total_amount'),
+            discount_sum=Sum('discount_amount'),
+        ).order_by()
+        for row in rows:
+            key = row[key_field] if key_field else 0
+            units_key = (row['day'], key) if key_field else (row['day'],)
+            yield SalesDailyRollup(
+                date=row['day'],
+                dimension=dimension,
+                key=key,
+                label=(row[label_field] or '') if label_field else '',
+                orders_count=row['orders_count'],
+                units=units[units_key],
+                revenue=_amount(row['revenue_sum']),
+                discount=_amount(row['discount_sum']),
+            )
+
+
+def rebuild_days(dates):
+    """指定した日の集計をすべての軸で作り直し、作成した行数を返す"""
+    dates = sorted(set(dates))
+    if not dates:
+        return 0
+    
+    rollups = list(_order_rollups(dates)) + list(_item_rollups(dates))
+    with transaction.atomic():
+        SalesDailyRollup.objects.filter(date__in=dates).delete()
+        SalesDailyRollup.objects.bulk_create(rollups, batch_size=500)
+    return len(rollups)
+
+
+def update_rollups(full=False, batch_days=31):
+    """
+    ウォーターマーク以降に作成・更新された注文の日付だけを再集計する
+
+    戻り値は (再集計した日数, 作成した行数)。
+    """
+    watermark, _ = SalesRollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+    
+    # 処理中に更新された注文を取りこぼさないよう、先に上限を確定する
+    high = Order.objects.aggregate(high=Max('updated_at'))['high']
+    if high is None:
+        return 0, 0
+    
+    changed = Order.objects.filter(updated_at__lte=high)
+    if watermark.last_processed_at and not full:
+        changed = changed.filter(updated_at__gt=watermark.last_processed_at)
+    
+    dates = sorted(set(
+        changed.annotate(day=TruncDate('created_at')).values_list('day', flat=True).order_by()
+    ))
+    
+    rows = 0
+    for start in range(0, len(dates), batch_days):
+        rows += rebuild_days(dates[start:start + batch_days])
+    
+    watermark.last_processed_at = high
+    watermark.save(update_fields=['last_processed_at', 'updated_at'])
+    return len(dates), rows
+
+
+def sales_stats(start, end, dimension='total', limit=10):
+    """ダッシュボード用の集計結果を返す（集計テーブルのみを参照）"""
+    daily = [
+        {
+            'date': rollup.date,
+            'orders_count': rollup.orders_count,
+            'units': rollup.units,
+            'revenue': rollup.revenue,
+            'discount': rollup.discount,
+        }
+        for rollup in SalesDailyRollup.objects.filter(
+            dimension='total', date__range=(start, end)
+        ).order_by('date')
+    ]
+    
+    totals = {
+        'orders_count': sum(row['orders_count'] for row in daily),
+        'units': sum(row['units'] for row in daily),
+        'revenue': sum((row['revenue'] for row in daily), Decimal('0.00')),
+        'discount': sum((row['discount'] for row in daily), Decimal('0.00')),
+    }
+    
+    breakdown = []
+    if dimension != 'total':
+        rows = SalesDailyRollup.objects.filter(
+            dimension=dimension, date__range=(start, end)
+        ).values('key').annotate(
+            label_max=Max('label'),
+            orders_count_sum=Sum('orders_count'),
+            units_sum=Sum('units'),
+            revenue_sum=Sum('revenue'),
+            discount_sum=Sum('discount'),
+        ).order_by('-revenue_sum')[:limit]
+        breakdown = [
+            {
+                'key': row['key'],
+                'label': row['label_max'],
+                'orders_count': row['orders_count_sum'],
+                'units': row['units_sum'],
+                'revenue': _amount(row['revenue_sum']),
+                'discount': _amount(row['discount_sum']),
+            }
+            for row in rows
+        ]
+    
+    return {
+        'start': start,
+        'end': end,
+        'dimension': dimension,
+        'totals': totals,
+        'daily': daily,
+        'breakdown': breakdown,
+        'last_processed_at': SalesRollupWatermark.objects.filter(
+            name=WATERMARK_NAME
+        ).values_list('last_processed_at', flat=True).first(),
+    }
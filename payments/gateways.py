@@ -0,0 +1,116 @@
+"""
+決済ゲートウェイアダプター
+
+決済タイプごとのゲートウェイは settings.PAYMENT_GATEWAYS で設定する。
+CACHES と同じ形式で、``BACKEND`` にクラスのパス、``OPTIONS`` にコンストラクタ引数を指定する。
+SimulatorGateway は開発・テスト用の設定（settings.py）でのみ使い、本番の設定では実際のゲートウェイを指定する。
+ゲートウェイが設定されていない決済タイプの決済は失敗させる::
+
+    PAYMENT_GATEWAYS = {
+        'default': {
+            'BACKEND': 'payments.gateways.SimulatorGateway',
+            'OPTIONS': {'latency_ms': 200, 'failure_rate': 0.05},
+        },
+    }
+"""
+
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
+
+
+class GatewayError(Exception):
+    """ゲートウェイが決済を拒否した場合の例外"""
+
+
+class GatewayTimeout(GatewayError):
+    """ゲートウェイが時間内に応答しなかった場合の例外（再試行対象）"""
+
+
+@dataclass
+class GatewayResult:
+    """ゲートウェイ呼び出し結果"""
+    transaction_id: str
+    payment_id: str = ''
+    details: dict = field(default_factory=dict)
+
+
+class BaseGateway:
+    """決済ゲートウェイの基底クラス"""
+    
+    def __init__(self, timeout_seconds=10, **options):
+        self.timeout_seconds = timeout_seconds
+        self.options = options
+    
+    def charge(self, amount, reference, token=None):
+        """決済を実行してGatewayResultを返す（失敗時はGatewayErrorを送出）"""
+        raise NotImplementedError
+
+
+class SimulatorGateway(BaseGateway):
+    """
+    ローカル検証用の決済シミュレーター
+
+    外部サービスに接続せず、設定した遅延・失敗率・タイムアウト率で応答する。
+    スループットやタイムアウト時の挙動をオフラインで負荷試験するために使う。
+    """
+    
+    def __init__(self, latency_ms=100, jitter_ms=0, failure_rate=0.0,
+                 timeout_rate=0.0, seed=None, **options):
+        super().__init__(**options)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.random = random.Random(seed)
+    
+    def charge(self, amount, reference, token=None):
+        roll = self.random.random()
+        latency = max(0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        
+        if roll < self.timeout_rate or latency > self.timeout_seconds:
+            time.sleep(self.timeout_seconds)
+            raise GatewayTimeout(f'ゲートウェイが{self.timeout_seconds}秒以内に応答しませんでした')
+        
+        time.sleep(latency)
+        
+        if roll < self.timeout_rate + self.failure_rate:
+            raise GatewayError('カードが拒否されました（シミュレーター）')
+        
+        return GatewayResult(
+            transaction_id=f'sim_{uuid.uuid4().hex}',
+            payment_id=reference,
+            details={'gateway': 'simulator', 'amount': str(amount), 'latency_ms': round(latency * 1000)},
+        )
+
+
+_gateways = {}
+
+
+def get_gateway(payment_type):
+    """
+    決済タイプに対応するゲートウェイを返す（未設定の場合は'default'）
+
+    ゲートウェイが設定されていない場合は ImproperlyConfigured を送出する（課金せずに決済を完了させない）。
+    """
+    if payment_type not in _gateways:
+        config = getattr(settings, 'PAYMENT_GATEWAYS', None) or {}
+        gateway_config = config.get(payment_type) or config.get('default')
+        if not gateway_config:
+            raise ImproperlyConfigured(f'No payment gateway is configured for {payment_type!r}')
+        gateway_class = import_string(gateway_config['BACKEND'])
+        _gateways[payment_type] = gateway_class(**gateway_config.get('OPTIONS', {}))
+    return _gateways[payment_type]
+
+
+@receiver(setting_changed)
+def reset_gateways(*, setting, **kwargs):
+    if setting == 'PAYMENT_GATEWAYS':
+        _gateways.clear()
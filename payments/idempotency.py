@@ -0,0 +1,147 @@
+"""
+決済・注文作成APIの冪等性キー処理
+
+クライアントが ``Idempotency-Key`` ヘッダーを付けて送信したリクエストは、
+同じキーで再送されても処理を再実行せず、初回のレスポンスをそのまま返す。
+キーはDBの一意制約で排他するため、複数のgunicornワーカー間でも有効。
+"""
+
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def get_key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+
+
+def get_lock_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+def request_fingerprint(request):
+    """メソッド・パス・リクエスト本文からフィンガープリントを生成"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.path, data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _acquire(request, scope, key, fingerprint, attempts=3):
+    """キーを確保する。確保できなかった場合は既存レコードを返す"""
+    now = timezone.now()
+    
+    # 期限切れのキーは再利用できるように削除
+    IdempotencyKey.objects.filter(
+        user=request.user, scope=scope, key=key, expires_at__lte=now
+    ).delete()
+    
+    for _ in range(attempts):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=request.user,
+                    scope=scope,
+                    key=key,
+                    request_fingerprint=fingerprint,
+                    locked_at=now,
+                    expires_at=now + get_key_ttl(),
+                )
+            return record, None
+        except IntegrityError:
+            try:
+                existing = IdempotencyKey.objects.get(user=request.user, scope=scope, key=key)
+                break
+            except IdempotencyKey.DoesNotExist:
+                # 処理中だったリクエストが失敗してキーを削除した直後なので、確保し直す
+                continue
+    else:
+        # 確保と削除が繰り返し競合した場合は処理中として扱う（409）
+        return None, IdempotencyKey(request_fingerprint=fingerprint)
+    
+    # 処理中のまま放置されたキー（ワーカー停止など）は引き継ぐ
+    if (
+        existing.response_status is None
+        and existing.request_fingerprint == fingerprint
+        and existing.locked_at <= now - get_lock_timeout()
+    ):
+        taken_over = IdempotencyKey.objects.filter(
+            pk=existing.pk, response_status__isnull=True, locked_at=existing.locked_at
+        ).update(locked_at=now)
+        if taken_over:
+            existing.locked_at = now
+            return existing, None
+    
+    return None, existing
+
+
+def _replay(existing, fingerprint):
+    """既存レコードに対するレスポンスを返す"""
+    if existing.request_fingerprint != fingerprint:
+        return Response(
+            {'error': 'この冪等性キーは別のリクエスト内容で使用済みです。'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    
+    if existing.response_status is None:
+        return Response(
+            {'error': '同じリクエストを処理中です。しばらくしてから再試行してください。'},
+            status=status.HTTP_409_CONFLICT
+        )
+    
+    response = Response(existing.response_body, status=existing.response_status)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """Idempotency-Keyヘッダー付きリクエストを冪等に処理するビューデコレーター"""
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER)
+            if not key or not request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+            
+            if len(key) > 255:
+                return Response(
+                    {'error': '冪等性キーが長すぎます。'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            fingerprint = request_fingerprint(request)
+            record, existing = _acquire(request, scope, key, fingerprint)
+            if existing is not None:
+                return _replay(existing, fingerprint)
+            
+            try:
+                with transaction.atomic():
+                    response = view_func(request, *args, **kwargs)
+                    
+                    # 5xxはリトライで再実行できるように記録しない
+                    if response.status_code < 500:
+                        record.response_status = response.status_code
+                        record.response_body = response.data
+                        record.save(update_fields=['response_status', 'response_body'])
+            except Exception:
+                record.delete()
+                raise
+            
+            if response.status_code >= 500:
+                record.delete()
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from payments.gateways import GatewayError, GatewayTimeout, SimulatorGateway
+
+
+class Command(BaseCommand):
+    help = '決済シミュレーターに並行して決済を送り、スループットとタイムアウトを計測します（DB不要）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=1000, help='送信する決済の件数')
+        parser.add_argument('--threads', type=int, default=32, help='並行数')
+        parser.add_argument('--latency-ms', type=float, default=200)
+        parser.add_argument('--jitter-ms', type=float, default=100)
+        parser.add_argument('--failure-rate', type=float, default=0.02)
+        parser.add_argument('--timeout-rate', type=float, default=0.01)
+        parser.add_argument('--timeout-seconds', type=float, default=2)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        gateway = SimulatorGateway(
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            failure_rate=options['failure_rate'],
+            timeout_rate=options['timeout_rate'],
+            timeout_seconds=options['timeout_seconds'],
+            seed=options['seed'],
+        )
+        
+        def charge(index):
+            started = time.perf_counter()
+            try:
+                gateway.charge(Decimal('1000'), reference=f'BENCH-{index}')
+                outcome = 'completed'
+            except GatewayTimeout:
+                outcome = 'timeout'
+            except GatewayError:
+                outcome = 'failed'
+            return outcome, time.perf_counter() - started
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            results = list(executor.map(charge, range(options['payments'])))
+        elapsed = time.perf_counter() - started
+        
+        latencies = sorted(latency for _, latency in results)
+        outcomes = [outcome for outcome, _ in results]
+        
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        
+        self.stdout.write(f'Payments:   {len(results)} ({options["threads"]} threads)')
+        self.stdout.write(f'Elapsed:    {elapsed:.2f}s')
+        self.stdout.write(f'Throughput: {len(results) / elapsed:.1f} payments/s')
+        self.stdout.write(
+            f'Outcomes:   completed={outcomes.count("completed")} '
+            f'failed={outcomes.count("failed")} timeout={outcomes.count("timeout")}'
+        )
+        self.stdout.write(f'Latency:    p50={percentile(0.5):.0f}ms p95={percentile(0.95):.0f}ms p99={percentile(0.99):.0f}ms')
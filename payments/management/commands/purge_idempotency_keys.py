@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from payments.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = '有効期限切れの冪等性キーを削除します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='1回のDELETEで削除する件数')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        deleted_total = 0
+        
+        while True:
+            expired_ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now)
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not expired_ids:
+                break
+            deleted, _ = IdempotencyKey.objects.filter(id__in=expired_ids).delete()
+            deleted_total += deleted
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted_total} expired idempotency keys')
+        )
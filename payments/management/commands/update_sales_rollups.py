@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from payments.analytics import update_rollups
+
+
+class Command(BaseCommand):
+    help = '前回実行以降に作成・更新された注文の日次売上集計を更新します（cron等で定期実行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='ウォーターマークを無視して全期間を再集計する')
+        parser.add_argument('--batch-days', type=int, default=31, help='1トランザクションで再集計する日数')
+
+    def handle(self, *args, **options):
+        days, rows = update_rollups(full=options['full'], batch_days=options['batch_days'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {days} days ({rows} rollup rows)')
+        )
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:55
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("scope", models.CharField(max_length=50, verbose_name="対象エンドポイント")),
+                ("key", models.CharField(max_length=255, verbose_name="冪等性キー")),
+                ("request_fingerprint", models.CharField(max_length=64, verbose_name="リクエストフィンガープリント")),
+                ("response_status", models.PositiveSmallIntegerField(blank=True, null=True, verbose_name="レスポンスステータス")),
+                ("response_body", models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name="レスポンス本文")),
+                ("locked_at", models.DateTimeField(verbose_name="処理開始日時")),
+                ("expires_at", models.DateTimeField(db_index=True, verbose_name="有効期限")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="作成日時")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="idempotency_keys", to=settings.AUTH_USER_MODEL, verbose_name="ユーザー")),
+            ],
+            options={
+                "verbose_name": "冪等性キー",
+                "verbose_name_plural": "冪等性キー",
+                "unique_together": {("user", "scope", "key")},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0002_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0, verbose_name="試行回数"),
+        ),
+        migrations.AlterField(
+            model_name="payment",
+            name="status",
+            field=models.CharField(choices=[("pending", "処理待ち"), ("processing", "処理中"), ("completed", "完了"), ("failed", "失敗"), ("cancelled", "キャンセル"), ("refunded", "返金")], default="pending", max_length=20, verbose_name="決済ステータス"),
+        ),
+    ]
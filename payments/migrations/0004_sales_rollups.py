@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:58
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("payments", "0003_payment_processing"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SalesRollupWatermark",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True, verbose_name="集計名")),
+                ("last_processed_at", models.DateTimeField(blank=True, null=True, verbose_name="処理済み更新日時")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新日時")),
+            ],
+            options={
+                "verbose_name": "売上集計ウォーターマーク",
+                "verbose_name_plural": "売上集計ウォーターマーク",
+            },
+        ),
+        migrations.CreateModel(
+            name="SalesDailyRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField(verbose_name="日付")),
+                ("dimension", models.CharField(choices=[("total", "全体"), ("item", "商品"), ("brand", "ブランド"), ("category", "カテゴリ"), ("coupon", "クーポン"), ("payment_method", "決済方法")], max_length=20, verbose_name="集計軸")),
+                ("key", models.PositiveBigIntegerField(default=0, verbose_name="集計キー")),
+                ("label", models.CharField(blank=True, max_length=200, verbose_name="表示名")),
+                ("orders_count", models.PositiveIntegerField(default=0, verbose_name="注文数")),
+                ("units", models.PositiveIntegerField(default=0, verbose_name="販売数量")),
+                ("revenue", models.DecimalField(decimal_places=2, default=Decimal("0"), max_digits=14, verbose_name="売上")),
+                ("discount", models.DecimalField(decimal_places=2, default=Decimal("0"), max_digits=14, verbose_name="割引額")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新日時")),
+            ],
+            options={
+                "verbose_name": "日次売上集計",
+                "verbose_name_plural": "日次売上集計",
+                "ordering": ["-date", "dimension", "-revenue"],
+                "indexes": [models.Index(fields=["dimension", "date"], name="sales_rollup_dim_date_idx")],
+                "unique_together": {("dimension", "key", "date")},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='payment_token',
+            field=models.CharField(blank=True, max_length=255, verbose_name='決済トークン'),
+        ),
+    ]
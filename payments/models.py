@@ -1,7 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 import uuid
 from items.models import Item
 
@@ -38,6 +39,10 @@ class PaymentMethod(models.Model):
         
     def __str__(self):
         return self.name
+    
+    def calculate_processing_fee(self, amount):
+        """決済手数料を計算"""
+        return (amount * self.processing_fee_rate).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
 
 class Coupon(models.Model):
     """クーポンモデル"""
@@ -155,6 +160,15 @@ class Coupon(models.Model):
                 return False, "このクーポンの使用回数が上限に達しています"
         
         return True, "有効"
+    
+    def redeem(self):
+        """使用回数を1つ加算（上限未満の場合のみ条件付きUPDATEで加算）"""
+        updated = Coupon.objects.filter(pk=self.pk).filter(
+            models.Q(usage_limit__isnull=True)
+            | models.Q(usage_limit=0)
+            | models.Q(usage_count__lt=models.F('usage_limit'))
+        ).update(usage_count=models.F('usage_count') + 1)
+        return bool(updated)
 
 class Order(models.Model):
     """注文モデル"""
@@ -370,7 +384,8 @@ class Payment(models.Model):
     status = models.CharField(
         max_length=20, 
         choices=[
-            ('pending', '処理中'),
+            ('pending', '処理待ち'),
+            ('processing', '処理中'),
             ('completed', '完了'),
             ('failed', '失敗'),
             ('cancelled', 'キャンセル'),
@@ -383,6 +398,12 @@ class Payment(models.Model):
     # 決済詳細情報（JSON形式）
     payment_details = models.JSONField(default=dict, blank=True, verbose_name="決済詳細")
     
+    # ワーカーがゲートウェイに渡す決済トークン（APIレスポンスには含めず、決済の確定時に消去する）
+    payment_token = models.CharField(max_length=255, blank=True, verbose_name="決済トークン")
+    
+    # ゲートウェイ呼び出し回数（タイムアウト時の再試行管理）
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="試行回数")
+    
     processed_at = models.DateTimeField(null=True, blank=True, verbose_name="決済処理日時")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
@@ -393,3 +414,74 @@ class Payment(models.Model):
         
     def __str__(self):
         return f"決済 {self.order.order_number} - ¥{self.amount}"
+
+class IdempotencyKey(models.Model):
+    """冪等性キーモデル（リトライ時に初回のレスポンスを返すための記録）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name="ユーザー")
+    scope = models.CharField(max_length=50, verbose_name="対象エンドポイント")
+    key = models.CharField(max_length=255, verbose_name="冪等性キー")
+    request_fingerprint = models.CharField(max_length=64, verbose_name="リクエストフィンガープリント")
+    
+    # 処理完了後に保存されるレスポンス（未完了の間はNULL）
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="レスポンスステータス")
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name="レスポンス本文")
+    
+    locked_at = models.DateTimeField(verbose_name="処理開始日時")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="有効期限")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="作成日時")
+    
+    class Meta:
+        verbose_name = "冪等性キー"
+        verbose_name_plural = "冪等性キー"
+        unique_together = ['user', 'scope', 'key']
+        
+    def __str__(self):
+        return f"{self.scope}:{self.key} - {self.user.username}"
+
+class SalesDailyRollup(models.Model):
+    """日次売上集計モデル（update_sales_rollupsコマンドで更新）"""
+    DIMENSIONS = [
+        ('total', '全体'),
+        ('item', '商品'),
+        ('brand', 'ブランド'),
+        ('category', 'カテゴリ'),
+        ('coupon', 'クーポン'),
+        ('payment_method', '決済方法'),
+    ]
+    
+    date = models.DateField(verbose_name="日付")
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS, verbose_name="集計軸")
+    key = models.PositiveBigIntegerField(default=0, verbose_name="集計キー")  # 集計軸の対象ID（全体は0）
+    label = models.CharField(max_length=200, blank=True, verbose_name="表示名")
+    
+    orders_count = models.PositiveIntegerField(default=0, verbose_name="注文数")
+    units = models.PositiveIntegerField(default=0, verbose_name="販売数量")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'), verbose_name="売上")
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'), verbose_name="割引額")
+    
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+    
+    class Meta:
+        verbose_name = "日次売上集計"
+        verbose_name_plural = "日次売上集計"
+        unique_together = ['dimension', 'key', 'date']
+        indexes = [
+            models.Index(fields=['dimension', 'date'], name='sales_rollup_dim_date_idx'),
+        ]
+        ordering = ['-date', 'dimension', '-revenue']
+        
+    def __str__(self):
+        return f"{self.date} {self.get_dimension_display()} {self.label}: ¥{self.revenue}"
+
+class SalesRollupWatermark(models.Model):
+    """売上集計の処理済み位置（注文の更新日時）"""
+    name = models.CharField(max_length=50, unique=True, verbose_name="集計名")
+    last_processed_at = models.DateTimeField(null=True, blank=True, verbose_name="処理済み更新日時")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新日時")
+    
+    class Meta:
+        verbose_name = "売上集計ウォーターマーク"
+        verbose_name_plural = "売上集計ウォーターマーク"
+        
+    def __str__(self):
+        return f"{self.name}: {self.last_processed_at}"
@@ -0,0 +1,125 @@
+"""
+非同期決済処理パイプライン
+
+決済APIは処理待ち（pending）の Payment を作成し、同じトランザクションで process_payment ジョブを追加して即座に応答する。
+ゲートウェイの呼び出しはリクエスト外のジョブワーカー（run_jobs コマンド、payments キュー）が行う。
+決済は条件付きUPDATEで確保するため、ジョブが重複して実行されても同じ決済を二重に処理することはない。
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from jobs.queue import job
+from .gateways import GatewayError, GatewayTimeout, get_gateway
+from .models import Order, Payment
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentBusy(Exception):
+    """決済を他のワーカーが処理中（処理中のまま放置されたとみなすまでジョブを再試行する）"""
+
+
+def get_max_attempts():
+    return getattr(settings, 'PAYMENT_MAX_ATTEMPTS', 3)
+
+
+def get_processing_timeout():
+    return timedelta(seconds=getattr(settings, 'PAYMENT_PROCESSING_TIMEOUT', 300))
+
+
+def claim_payment(payment_id):
+    """
+    処理待ちの決済を確保する（他のワーカーが確保済みならFalse）
+
+    ワーカー停止などで処理中のまま PAYMENT_PROCESSING_TIMEOUT を過ぎた決済も確保し直す。
+    """
+    now = timezone.now()
+    return Payment.objects.filter(
+        Q(status='pending') | Q(status='processing', updated_at__lt=now - get_processing_timeout()),
+        pk=payment_id,
+    ).update(status='processing', attempts=F('attempts') + 1, updated_at=now) == 1
+
+
+@job(queue='payments', priority=10, max_attempts=5, retry_delay=60, unique=True, atomic=False)
+def process_payment(payment_id):
+    """
+    決済を確保してゲートウェイで処理する（ゲートウェイの応答を待つ間はトランザクションを開かない）
+
+    タイムアウトで処理待ちに戻った決済は、ジョブを追加し直して再試行する。
+    """
+    if not claim_payment(payment_id):
+        if Payment.objects.filter(pk=payment_id, status='processing').exists():
+            raise PaymentBusy(f'Payment {payment_id} is being processed by another worker')
+        return
+    if execute_payment(payment_id) == 'pending':
+        process_payment.enqueue(payment_id)
+
+
+def _finish(payment, payment_status, order_payment_status, **fields):
+    """処理中の決済を確定し、注文の決済ステータスを更新（決済トークンは不要になるため消去する）"""
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Payment.objects.filter(pk=payment.pk, status='processing').update(
+            status=payment_status, payment_token='', updated_at=now, **fields
+        )
+        if not updated:
+            logger.warning(f"Payment {payment.pk} was no longer processing; result discarded")
+            return False
+        
+        order_fields = {'payment_status': order_payment_status, 'updated_at': now}
+        if payment_status == 'completed':
+            order_fields['status'] = 'confirmed'
+        Order.objects.filter(pk=payment.order_id).update(**order_fields)
+    return True
+
+
+def execute_payment(payment_id):
+    """確保済みの決済についてゲートウェイを呼び出し、結果のステータスを返す"""
+    payment = Payment.objects.select_related('payment_method', 'order').get(pk=payment_id)
+    try:
+        gateway = get_gateway(payment.payment_method.payment_type)
+    except ImproperlyConfigured as e:
+        # ゲートウェイが設定されていない環境では課金できないため、完了にせず失敗にする
+        logger.error(f"Payment {payment.pk} failed: {e}")
+        _finish(payment, 'failed', 'failed', payment_details={**payment.payment_details, 'last_error': str(e)})
+        return 'failed'
+    
+    try:
+        result = gateway.charge(
+            payment.amount,
+            reference=payment.order.order_number,
+            token=payment.payment_token or None,
+        )
+    except GatewayTimeout as e:
+        details = {**payment.payment_details, 'last_error': str(e)}
+        if payment.attempts < get_max_attempts():
+            # タイムアウトは再試行のため処理待ちに戻す
+            Payment.objects.filter(pk=payment.pk, status='processing').update(
+                status='pending', payment_details=details, updated_at=timezone.now()
+            )
+            logger.info(f"Payment {payment.pk} timed out (attempt {payment.attempts}); requeued")
+            return 'pending'
+        _finish(payment, 'failed', 'failed', payment_details=details)
+        return 'failed'
+    except GatewayError as e:
+        details = {**payment.payment_details, 'last_error': str(e)}
+        _finish(payment, 'failed', 'failed', payment_details=details)
+        return 'failed'
+    
+    details = {**payment.payment_details, 'gateway_response': result.details}
+    details.pop('last_error', None)
+    _finish(
+        payment, 'completed', 'completed',
+        external_transaction_id=result.transaction_id,
+        external_payment_id=result.payment_id,
+        payment_details=details,
+        processed_at=timezone.now(),
+    )
+    return 'completed'
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
 from decimal import Decimal
 from .models import (
     PaymentMethod, Coupon, Order, OrderItem, 
@@ -24,7 +27,6 @@ class PaymentMethodSerializer(serializers.ModelSerializer):
 class CouponSerializer(serializers.ModelSerializer):
     """クーポンシリアライザー"""
     is_valid = serializers.SerializerMethodField()
-    usage_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Coupon
@@ -39,10 +41,6 @@ class CouponSerializer(serializers.ModelSerializer):
     def get_is_valid(self, obj):
         """クーポンが有効かどうかを返す"""
         return obj.is_valid()
-    
-    def get_usage_count(self, obj):
-        """クーポンの使用回数を返す"""
-        return obj.couponusage_set.count()
 
 class CouponValidationSerializer(serializers.Serializer):
     """クーポン有効性検証用シリアライザー"""
@@ -95,6 +93,31 @@ class OrderSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
 
+class OrderListSerializer(serializers.ModelSerializer):
+    """注文履歴一覧用の軽量シリアライザー（件数・サムネイルは注釈から取得）"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+    thumbnail_url = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'order_number', 'status', 'status_display', 'total_amount',
+            'item_count', 'thumbnail_url', 'created_at'
+        ]
+    
+    def get_thumbnail_url(self, obj):
+        """先頭商品の画像URLを返す（main_image_urlを優先、なければmain_image）"""
+        if obj.thumbnail_image_url:
+            return obj.thumbnail_image_url
+        elif obj.thumbnail_image:
+            request = self.context.get('request')
+            url = default_storage.url(obj.thumbnail_image)
+            if request:
+                return request.build_absolute_uri(url)
+            return url
+        return None
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     """注文作成用シリアライザー"""
     items = serializers.ListField(
@@ -108,8 +131,8 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = [
-            'payment_method', 'shipping_address', 'billing_address',
-            'notes', 'items', 'coupon_code'
+            'payment_method', 'shipping_name', 'shipping_postal_code',
+            'shipping_address', 'shipping_phone', 'notes', 'items', 'coupon_code'
         ]
     
     def validate_items(self, value):
@@ -117,30 +140,34 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError("商品が選択されていません。")
         
-        validated_items = []
+        requested = []
         for item_data in value:
             try:
                 item_id = int(item_data.get('item_id'))
                 quantity = int(item_data.get('quantity', 1))
-                
-                if quantity <= 0:
-                    raise serializers.ValidationError("数量は1以上である必要があります。")
-                
-                item = Item.objects.get(id=item_id, is_available=True)
-                
-                if item.stock_quantity < quantity:
-                    raise serializers.ValidationError(
-                        f"商品「{item.name}」の在庫が不足しています。"
-                    )
-                
-                validated_items.append({
-                    'item': item,
-                    'quantity': quantity,
-                    'unit_price': item.price
-                })
-                
-            except (ValueError, Item.DoesNotExist):
+            except (TypeError, ValueError):
+                raise serializers.ValidationError("無効な商品が含まれています。")
+            if quantity <= 0:
+                raise serializers.ValidationError("数量は1以上である必要があります。")
+            requested.append((item_id, quantity))
+        
+        # 商品はまとめて1回のクエリで取得する
+        items = Item.objects.filter(is_available=True).in_bulk([item_id for item_id, _ in requested])
+        
+        validated_items = []
+        for item_id, quantity in requested:
+            item = items.get(item_id)
+            if item is None:
                 raise serializers.ValidationError("無効な商品が含まれています。")
+            if item.stock_quantity < quantity:
+                raise serializers.ValidationError(
+                    f"商品「{item.name}」の在庫が不足しています。"
+                )
+            validated_items.append({
+                'item': item,
+                'quantity': quantity,
+                'unit_price': item.price
+            })
         
         return validated_items
     
@@ -156,6 +183,22 @@ class OrderCreateSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("無効なクーポンコードです。")
         return None
     
+    def validate(self, attrs):
+        """クーポンの注文条件・ユーザー別使用制限を検証"""
+        coupon = attrs.get('coupon_code')
+        if coupon:
+            subtotal = sum(
+                item_data['quantity'] * item_data['unit_price']
+                for item_data in attrs['items']
+            )
+            is_valid, message = coupon.is_valid_for_order(
+                subtotal, self.context['request'].user
+            )
+            if not is_valid:
+                raise serializers.ValidationError({'coupon_code': message})
+        return attrs
+    
+    @transaction.atomic
     def create(self, validated_data):
         """注文を作成"""
         items_data = validated_data.pop('items')
@@ -168,6 +211,12 @@ class OrderCreateSerializer(serializers.ModelSerializer):
             for item_data in items_data
         )
         
+        # クーポンの使用回数を確保（上限到達時は注文ごとロールバック）
+        if coupon and not coupon.redeem():
+            raise serializers.ValidationError(
+                {'coupon_code': 'クーポンの使用回数が上限に達しています。'}
+            )
+        
         # 注文を作成
         order = Order.objects.create(
             user=user,
@@ -177,18 +226,30 @@ class OrderCreateSerializer(serializers.ModelSerializer):
         )
         
         # 注文商品を作成
-        for item_data in items_data:
-            OrderItem.objects.create(
+        OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
                 item=item_data['item'],
                 quantity=item_data['quantity'],
-                unit_price=item_data['unit_price']
+                unit_price=item_data['unit_price'],
+                total_price=item_data['unit_price'] * item_data['quantity'],
             )
-            
-            # 在庫を減らす
-            item = item_data['item']
-            item.stock_quantity -= item_data['quantity']
-            item.save()
+            for item_data in items_data
+        ])
+        
+        # 在庫を減らす（在庫が足りる商品だけを1回のUPDATEで減算し、足りなければ注文ごとロールバック）
+        quantities = {}
+        for item_data in items_data:
+            quantities[item_data['item'].pk] = quantities.get(item_data['item'].pk, 0) + item_data['quantity']
+        requested = Case(
+            *[When(pk=item_id, then=Value(quantity)) for item_id, quantity in quantities.items()],
+            output_field=IntegerField(),
+        )
+        updated = Item.objects.filter(pk__in=quantities, stock_quantity__gte=requested).update(
+            stock_quantity=F('stock_quantity') - requested
+        )
+        if updated != len(quantities):
+            raise serializers.ValidationError({'items': '在庫が不足している商品があります。'})
         
         # クーポン使用履歴を作成
         if coupon:
@@ -266,7 +327,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'order', 'order_details', 'payment_method', 'payment_method_details',
             'amount', 'status', 'external_transaction_id', 'external_payment_id', 
-            'processing_fee', 'payment_details', 'processed_at',
+            'processing_fee', 'payment_details', 'attempts', 'processed_at',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
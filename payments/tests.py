@@ -1,3 +1,395 @@
-from django.test import TestCase
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from items.models import Brand, Category, Item
+from jobs.models import Job
+from jobs.worker import work
+from .analytics import update_rollups
+from .models import Coupon, CouponUsage, IdempotencyKey, Order, OrderItem, Payment, PaymentMethod
+
+User = get_user_model()
+
+
+def create_item(**kwargs):
+    defaults = {
+        'name': 'Tシャツ',
+        'brand': Brand.objects.create(name='ブランド'),
+        'category': Category.objects.create(name='カテゴリ'),
+        'price': Decimal('3000'),
+        'description': '説明',
+        'condition': 'new',
+        'size': 'M',
+        'color': '白',
+        'stock_quantity': 10,
+    }
+    defaults.update(kwargs)
+    return Item.objects.create(**defaults)
+
+
+def create_coupon(**kwargs):
+    now = timezone.now()
+    defaults = {
+        'code': 'FLASH',
+        'name': 'フラッシュセール',
+        'discount_type': 'fixed_amount',
+        'discount_value': Decimal('500'),
+        'valid_from': now - timedelta(days=1),
+        'valid_until': now + timedelta(days=1),
+    }
+    defaults.update(kwargs)
+    return Coupon.objects.create(**defaults)
+
+
+class CouponRedeemTest(TestCase):
+    def test_redeem_stops_at_usage_limit(self):
+        coupon = create_coupon(usage_limit=2)
+        self.assertTrue(coupon.redeem())
+        self.assertTrue(coupon.redeem())
+        self.assertFalse(coupon.redeem())
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_count, 2)
+
+    def test_redeem_without_limit(self):
+        coupon = create_coupon(usage_limit=None)
+        for _ in range(5):
+            self.assertTrue(coupon.redeem())
+        coupon.refresh_from_db()
+        self.assertEqual(coupon.usage_count, 5)
+
+
+class OrderCouponRedemptionTest(APITestCase):
+    def setUp(self):
+        self.coupon = create_coupon(usage_limit=1, user_usage_limit=5)
+        self.payment_method = PaymentMethod.objects.create(name='カード', payment_type='credit_card')
+        self.item = create_item()
+
+    def _order(self, username):
+        user = User.objects.create_user(username=username, password='password123')
+        self.client.force_authenticate(user)
+        return self.client.post('/api/orders/', {
+            'payment_method': self.payment_method.id,
+            'shipping_name': '山田太郎',
+            'shipping_postal_code': '100-0001',
+            'shipping_address': '東京都千代田区',
+            'shipping_phone': '03-0000-0000',
+            'coupon_code': self.coupon.code,
+            'items': [{'item_id': str(self.item.id), 'quantity': '1'}],
+        }, format='json')
+
+    def test_usage_count_is_incremented_and_enforced(self):
+        self.assertEqual(self._order('first').status_code, 201)
+        response = self._order('second')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('coupon_code', response.data)
+
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.usage_count, 1)
+        self.assertEqual(CouponUsage.objects.count(), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class OrderReadModelTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        self.payment_method = PaymentMethod.objects.create(name='カード', payment_type='credit_card')
+        self.coupon = create_coupon()
+        self.client.force_authenticate(self.user)
+
+    def _create_orders(self, count):
+        for i in range(count):
+            order = Order.objects.create(
+                user=self.user, subtotal=Decimal('6000'), coupon=self.coupon,
+                payment_method=self.payment_method, shipping_name='山田太郎',
+                shipping_postal_code='100-0001', shipping_address='東京都千代田区',
+                shipping_phone='03-0000-0000',
+            )
+            for j in range(2):
+                OrderItem.objects.create(
+                    order=order, quantity=1, unit_price=Decimal('3000'),
+                    item=create_item(name=f'商品{i}-{j}', main_image_url=f'https://example.com/{i}-{j}.jpg'),
+                )
+        return order
+
+    def test_list_is_compact_and_constant_queries(self):
+        self._create_orders(5)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(response.data[0]['item_count'], 2)
+        self.assertEqual(response.data[0]['thumbnail_url'], 'https://example.com/4-0.jpg')
+        self.assertNotIn('order_items', response.data[0])
+
+    def test_detail_is_prefetched(self):
+        order = self._create_orders(1)
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/orders/{order.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['order_items']), 2)
+        self.assertEqual(response.data['coupon_details']['code'], self.coupon.code)
+
+
+class PaymentTestMixin:
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        self.payment_method = PaymentMethod.objects.create(name='カード', payment_type='credit_card')
+        self.item = create_item()
+        self.order = Order.objects.create(
+            user=self.user, subtotal=Decimal('3000'), payment_method=self.payment_method,
+            shipping_name='山田太郎', shipping_postal_code='100-0001',
+            shipping_address='東京都千代田区', shipping_phone='03-0000-0000',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _pay(self, key=None, transaction_id='txn-1'):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(
+            f'/api/orders/{self.order.id}/pay/', {'transaction_id': transaction_id},
+            format='json', **headers
+        )
+
+
+class IdempotentPaymentTest(PaymentTestMixin, APITestCase):
+    def test_retry_returns_original_response(self):
+        first = self._pay(key='retry-1')
+        second = self._pay(key='retry-1')
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 202)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['payment']['id'], first.data['payment']['id'])
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reused_with_different_payload_is_rejected(self):
+        self._pay(key='retry-2')
+        response = self._pay(key='retry-2', transaction_id='txn-2')
+        self.assertEqual(response.status_code, 422)
+
+    def test_key_deleted_by_failed_request_is_acquired_again(self):
+        other = IdempotencyKey.objects.create(
+            user=self.user, scope='process_payment', key='retry-3', request_fingerprint='other',
+            locked_at=timezone.now(), expires_at=timezone.now() + timedelta(days=1),
+        )
+        get = IdempotencyKey.objects.get
+
+        def deleted_before_get(*args, **kwargs):
+            # 一意制約で弾かれた直後に、処理中だったリクエストが失敗してキーを削除した状態
+            IdempotencyKey.objects.filter(pk=other.pk).delete()
+            return get(*args, **kwargs)
+
+        with mock.patch.object(IdempotencyKey.objects, 'get', side_effect=deleted_before_get):
+            response = self._pay(key='retry-3')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(IdempotencyKey.objects.get(key='retry-3').response_status, 202)
+
+        with mock.patch.object(IdempotencyKey.objects, 'get', side_effect=IdempotencyKey.DoesNotExist):
+            self.assertEqual(self._pay(key='retry-3').status_code, 409)
+
+    def test_paid_order_is_rejected_without_key(self):
+        self.assertEqual(self._pay().status_code, 202)
+        self.assertEqual(self._pay().status_code, 400)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_order_create_retry_creates_single_order(self):
+        payload = {
+            'payment_method': self.payment_method.id,
+            'shipping_name': '山田太郎',
+            'shipping_postal_code': '100-0001',
+            'shipping_address': '東京都千代田区',
+            'shipping_phone': '03-0000-0000',
+            'items': [{'item_id': str(self.item.id), 'quantity': '1'}],
+        }
+        responses = [
+            self.client.post('/api/orders/', payload, format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+            for _ in range(2)
+        ]
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(responses[0].data['id'], responses[1].data['id'])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+def simulator_settings(**options):
+    return override_settings(PAYMENT_GATEWAYS={
+        'default': {
+            'BACKEND': 'payments.gateways.SimulatorGateway',
+            'OPTIONS': {'latency_ms': 0, **options},
+        },
+    })
+
+
+class PaymentProcessingTest(PaymentTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.payment_method.processing_fee_rate = Decimal('0.0360')
+        self.payment_method.save()
+
+    def _run_worker(self):
+        work(['payments'])
+        return list(Payment.objects.values_list('status', flat=True))
+
+    @simulator_settings()
+    def test_worker_completes_payment(self):
+        self.assertEqual(self._pay().status_code, 202)
+        self.assertEqual(self._run_worker(), ['completed'])
+
+        payment = Payment.objects.get()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(payment.processing_fee, Decimal('108.00'))
+        self.assertTrue(payment.external_transaction_id.startswith('sim_'))
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'confirmed')
+        self.assertEqual(self.order.payment_status, 'completed')
+
+    @override_settings(PAYMENT_GATEWAYS={})
+    def test_payment_fails_without_configured_gateway(self):
+        self.assertEqual(self._pay().status_code, 202)
+        with self.assertLogs('payments.processing', 'ERROR'):
+            self.assertEqual(self._run_worker(), ['failed'])
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.payment_status), ('pending', 'failed'))
+
+    @simulator_settings()
+    def test_payment_token_is_not_exposed_and_cleared_after_charge(self):
+        response = self.client.post(
+            f'/api/orders/{self.order.id}/pay/', {'payment_token': 'tok_secret'},
+            format='json', HTTP_IDEMPOTENCY_KEY='pay-token'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertNotIn('tok_secret', json.dumps(response.data, default=str))
+        self.assertNotIn('tok_secret', json.dumps(IdempotencyKey.objects.get().response_body))
+        self.assertEqual(Payment.objects.get().payment_token, 'tok_secret')
+
+        self.assertEqual(self._run_worker(), ['completed'])
+        self.assertEqual(Payment.objects.get().payment_token, '')
+
+    @simulator_settings(failure_rate=1.0)
+    def test_failed_payment_can_be_retried(self):
+        self._pay()
+        self.assertEqual(self._run_worker(), ['failed'])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.payment_status, 'failed')
+
+        self.assertEqual(self._pay().status_code, 202)
+        self.assertEqual(Payment.objects.get().status, 'pending')
+
+    @simulator_settings(timeout_rate=1.0, timeout_seconds=0)
+    def test_timeouts_are_retried_until_max_attempts(self):
+        self._pay()
+        with self.settings(PAYMENT_MAX_ATTEMPTS=2):
+            self.assertEqual(self._run_worker(), ['pending'])
+            self.assertEqual(self._run_worker(), ['failed'])
+        self.assertEqual(Payment.objects.get().attempts, 2)
+
+    @simulator_settings()
+    def test_stale_processing_payment_is_claimed_again(self):
+        self._pay()
+        # 別のワーカーが確保したまま停止した状態
+        Payment.objects.update(status='processing', attempts=1)
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            self.assertEqual(work(['payments']), {'retried': 1})
+
+        Payment.objects.update(updated_at=timezone.now() - timedelta(seconds=301))
+        Job.objects.update(run_at=timezone.now())
+        self.assertEqual(self._run_worker(), ['completed'])
+        self.assertEqual(Payment.objects.get().attempts, 2)
+        self.assertFalse(Job.objects.exists())
+
+
+class SalesRollupTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='password123')
+        self.admin = User.objects.create_user(username='admin', password='password123', is_staff=True)
+        self.payment_method = PaymentMethod.objects.create(name='カード', payment_type='credit_card')
+        self.coupon = create_coupon(discount_value=Decimal('1000'))
+        self.shirt = create_item(name='シャツ', price=Decimal('3000'))
+        self.pants = create_item(name='パンツ', price=Decimal('1000'))
+
+    def _order(self, coupon=None):
+        order = Order.objects.create(
+            user=self.user, subtotal=Decimal('4000'), coupon=coupon,
+            payment_method=self.payment_method, shipping_name='山田太郎',
+            shipping_postal_code='100-0001', shipping_address='東京都千代田区',
+            shipping_phone='03-0000-0000',
+        )
+        OrderItem.objects.create(order=order, item=self.shirt, quantity=1, unit_price=Decimal('3000'))
+        OrderItem.objects.create(order=order, item=self.pants, quantity=1, unit_price=Decimal('1000'))
+        return order
+
+    def _stats(self, dimension):
+        self.client.force_authenticate(self.admin)
+        return self.client.get('/api/admin/sales-stats/', {'dimension': dimension}).data
+
+    def test_rollups_are_incremental(self):
+        order = self._order(coupon=self.coupon)
+        self._order()
+        self.assertEqual(update_rollups()[0], 1)
+        self.assertEqual(update_rollups(), (0, 0))
+
+        stats = self._stats('brand')
+        self.assertEqual(stats['totals']['orders_count'], 2)
+        self.assertEqual(stats['totals']['units'], 4)
+        self.assertEqual(stats['totals']['revenue'], Decimal('7000.00'))
+        self.assertEqual(stats['totals']['discount'], Decimal('1000.00'))
+        self.assertEqual(stats['breakdown'][0]['label'], 'ブランド')
+        self.assertEqual(stats['breakdown'][0]['discount'], Decimal('750.00'))
+
+        coupon_stats = self._stats('coupon')
+        self.assertEqual(len(coupon_stats['breakdown']), 1)
+        self.assertEqual(coupon_stats['breakdown'][0]['units'], 2)
+
+        order.status = 'cancelled'
+        order.save()
+        update_rollups()
+        self.assertEqual(self._stats('total')['totals']['revenue'], Decimal('4000.00'))
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/admin/sales-stats/').status_code, 403)
+
+    def test_invalid_date_and_limit(self):
+        self._order()
+        update_rollups()
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/admin/sales-stats/', {'start': '2024-02-30'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/admin/sales-stats/', {'dimension': 'item', 'limit': -1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['breakdown']), 1)
+
+
+class CouponRedeemConcurrencyTest(TransactionTestCase):
+    attempts = 1000
+    usage_limit = 50
+
+    def _attempt(self, coupon_id):
+        # SQLiteのテストDBはテーブルロックで即時エラーになるため、確定するまで再試行
+        try:
+            while True:
+                try:
+                    with transaction.atomic():
+                        return Coupon(pk=coupon_id).redeem()
+                except OperationalError:
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_concurrent_redemptions_never_exceed_limit(self):
+        coupon = create_coupon(usage_limit=self.usage_limit)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(self._attempt, [coupon.pk] * self.attempts))
+
+        coupon.refresh_from_db()
+        self.assertEqual(sum(results), self.usage_limit)
+        self.assertEqual(coupon.usage_count, self.usage_limit)
@@ -28,4 +28,7 @@ urlpatterns = [
     path('payments/', views.PaymentListView.as_view(), name='payments'),
     path('payments/<int:pk>/', views.PaymentDetailView.as_view(), name='payment-detail'),
     path('orders/<int:order_id>/pay/', views.process_payment, name='process-payment'),
+    
+    # 管理者用統計
+    path('admin/sales-stats/', views.sales_stats, name='sales-stats'),
 ]
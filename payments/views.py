@@ -1,38 +1,85 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.db.models import Case, Count, F, OuterRef, Prefetch, Subquery, Value, When
+from datetime import timedelta
 from decimal import Decimal
 
+from items.models import Item
+
 from .models import (
     PaymentMethod, Coupon, Order, OrderItem, 
-    CouponUsage, ShoppingCart, Payment
+    CouponUsage, ShoppingCart, Payment, SalesDailyRollup
 )
 from .serializers import (
     PaymentMethodSerializer, CouponSerializer, CouponValidationSerializer,
-    OrderSerializer, OrderCreateSerializer, OrderItemSerializer,
+    OrderSerializer, OrderListSerializer, OrderCreateSerializer, OrderItemSerializer,
     ShoppingCartSerializer, ShoppingCartCreateSerializer,
     PaymentSerializer
 )
+from oshare_style_answers.query_budget import query_budget
+from oshare_style_answers.throttling import CouponValidationRateThrottle
+from .idempotency import idempotent
+from . import analytics, processing
 
 User = get_user_model()
 
+
+def order_detail_queryset():
+    """注文詳細表示用に関連オブジェクトを一括取得したクエリセット"""
+    return Order.objects.select_related('coupon', 'payment_method').prefetch_related(
+        Prefetch(
+            'items',
+            queryset=OrderItem.objects.select_related('item__brand', 'item__category')
+        )
+    )
+
+
+def order_summary_queryset():
+    """注文履歴一覧用に商品数・先頭商品画像を注釈したクエリセット"""
+    first_item = OrderItem.objects.filter(order=OuterRef('pk')).order_by('id')
+    return Order.objects.annotate(
+        item_count=Count('items'),
+        thumbnail_image_url=Subquery(first_item.values('item__main_image_url')[:1]),
+        thumbnail_image=Subquery(first_item.values('item__main_image')[:1]),
+    )
+
+
+def payment_detail_queryset():
+    """決済履歴表示用に注文詳細まで一括取得したクエリセット"""
+    return Payment.objects.select_related(
+        'payment_method', 'order__coupon', 'order__payment_method'
+    ).prefetch_related(
+        Prefetch(
+            'order__items',
+            queryset=OrderItem.objects.select_related('item__brand', 'item__category')
+        )
+    )
+
+@query_budget(1)
 class PaymentMethodListView(generics.ListAPIView):
     """決済方法一覧取得API"""
     queryset = PaymentMethod.objects.filter(is_active=True)
     serializer_class = PaymentMethodSerializer
     permission_classes = [permissions.AllowAny]
 
+@query_budget(1)
 class CouponListView(generics.ListAPIView):
     """クーポン一覧取得API（管理者用）"""
     queryset = Coupon.objects.all()
     serializer_class = CouponSerializer
     permission_classes = [permissions.IsAdminUser]
 
+@query_budget(2)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@throttle_classes([CouponValidationRateThrottle])
 def validate_coupon(request):
     """クーポン有効性検証API"""
     serializer = CouponValidationSerializer(data=request.data)
@@ -76,19 +123,21 @@ def validate_coupon(request):
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget({'GET': 1, 'POST': 14})
 class OrderListCreateView(generics.ListCreateAPIView):
     """注文一覧・作成API"""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        return order_summary_queryset().filter(user=self.request.user).order_by('-created_at')
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return OrderCreateSerializer
-        return OrderSerializer
+        return OrderListSerializer
     
+    @method_decorator(idempotent('order_create'))
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -96,65 +145,80 @@ class OrderListCreateView(generics.ListCreateAPIView):
             order = serializer.save()
             
             # 作成された注文を詳細情報で返す
-            response_serializer = OrderSerializer(order)
+            order = order_detail_queryset().get(pk=order.pk)
+            response_serializer = OrderSerializer(order, context=self.get_serializer_context())
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@query_budget(2)
 class OrderDetailView(generics.RetrieveAPIView):
     """注文詳細取得API"""
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return order_detail_queryset().filter(user=self.request.user)
 
+@query_budget(4)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def cancel_order(request, order_id):
     """注文キャンセルAPI"""
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    
-    if order.status not in ['pending', 'confirmed']:
-        return Response(
-            {'error': 'この注文はキャンセルできません。'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
     with transaction.atomic():
-        # 在庫を戻す
-        for order_item in order.order_items.all():
-            item = order_item.item
-            item.stock_quantity += order_item.quantity
-            item.save()
+        order = get_object_or_404(Order.objects.select_for_update(), id=order_id, user=request.user)
+        
+        if order.status not in ['pending', 'confirmed']:
+            return Response(
+                {'error': 'この注文はキャンセルできません。'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # 在庫を戻す（商品ごとの数量を1回のUPDATEで加算）
+        quantities = {}
+        for item_id, quantity in order.items.values_list('item_id', 'quantity'):
+            quantities[item_id] = quantities.get(item_id, 0) + quantity
+        if quantities:
+            Item.objects.filter(pk__in=quantities).update(
+                stock_quantity=F('stock_quantity') + Case(
+                    *[When(pk=item_id, then=Value(quantity)) for item_id, quantity in quantities.items()],
+                    default=Value(0),
+                )
+            )
         
         # 注文ステータスを更新
         order.status = 'cancelled'
-        order.save()
+        order.save(update_fields=['status', 'updated_at'])
     
     return Response({'message': '注文をキャンセルしました。'})
 
+@query_budget(1)
 class ShoppingCartListView(generics.ListAPIView):
     """ショッピングカート一覧取得API"""
     serializer_class = ShoppingCartSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return ShoppingCart.objects.filter(user=self.request.user).order_by('-created_at')
+        return ShoppingCart.objects.filter(user=self.request.user).select_related(
+            'item__brand', 'item__category'
+        ).order_by('-created_at')
 
+@query_budget(3)
 class ShoppingCartCreateView(generics.CreateAPIView):
     """ショッピングカート追加API"""
     serializer_class = ShoppingCartCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+@query_budget(2)
 class ShoppingCartUpdateView(generics.UpdateAPIView):
     """ショッピングカート更新API"""
     serializer_class = ShoppingCartSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return ShoppingCart.objects.filter(user=self.request.user)
+        return ShoppingCart.objects.filter(user=self.request.user).select_related('item__brand', 'item__category')
 
+@query_budget(2)
 class ShoppingCartDeleteView(generics.DestroyAPIView):
     """ショッピングカート削除API"""
     permission_classes = [permissions.IsAuthenticated]
@@ -162,6 +226,7 @@ class ShoppingCartDeleteView(generics.DestroyAPIView):
     def get_queryset(self):
         return ShoppingCart.objects.filter(user=self.request.user)
 
+@query_budget(1)
 @api_view(['DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def clear_cart(request):
@@ -169,11 +234,14 @@ def clear_cart(request):
     ShoppingCart.objects.filter(user=request.user).delete()
     return Response({'message': 'カートを空にしました。'})
 
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def cart_summary(request):
     """カート概要取得API"""
-    cart_items = ShoppingCart.objects.filter(user=request.user)
+    cart_items = list(
+        ShoppingCart.objects.filter(user=request.user).select_related('item__brand', 'item__category')
+    )
     
     total_items = sum(item.quantity for item in cart_items)
     total_amount = sum(item.quantity * item.item.price for item in cart_items)
@@ -184,58 +252,98 @@ def cart_summary(request):
         'items': ShoppingCartSerializer(cart_items, many=True).data
     })
 
+@query_budget(2)
 class PaymentListView(generics.ListAPIView):
     """決済履歴一覧取得API"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Payment.objects.filter(
+        return payment_detail_queryset().filter(
             order__user=self.request.user
         ).order_by('-created_at')
 
+@query_budget(2)
 class PaymentDetailView(generics.RetrieveAPIView):
     """決済履歴詳細取得API"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return Payment.objects.filter(order__user=self.request.user)
+        return payment_detail_queryset().filter(order__user=self.request.user)
 
-@api_view(['POST'])
-@permission_classes([permissions.IsAuthenticated])
-def process_payment(request, order_id):
-    """決済処理API"""
-    order = get_object_or_404(Order, id=order_id, user=request.user)
-    
-    if order.status != 'pending':
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def sales_stats(request):
+    """売上統計API（管理者用・日次集計テーブルから応答）"""
+    today = timezone.localdate()
+    try:
+        start = parse_date(request.query_params.get('start', '')) or today - timedelta(days=29)
+        end = parse_date(request.query_params.get('end', '')) or today
+    except ValueError:
+        # 形式は正しいが存在しない日付（2024-02-30 など）
         return Response(
-            {'error': 'この注文は決済できません。'},
+            {'error': '無効な日付です。'},
             status=status.HTTP_400_BAD_REQUEST
         )
+    dimension = request.query_params.get('dimension', 'total')
     
-    transaction_id = request.data.get('transaction_id')
-    if not transaction_id:
+    if dimension not in dict(SalesDailyRollup.DIMENSIONS):
         return Response(
-            {'error': 'トランザクションIDが必要です。'},
+            {'error': '無効な集計軸です。'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+    except ValueError:
+        limit = 10
+    
+    return Response(analytics.sales_stats(start, end, dimension, limit))
+
+@query_budget(11)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent('process_payment')
+def process_payment(request, order_id):
+    """決済処理API（ゲートウェイ処理はワーカーで非同期に実行）"""
+    token = request.data.get('payment_token')
+    
     with transaction.atomic():
-        # 決済履歴を作成
-        payment = Payment.objects.create(
-            order=order,
-            payment_method=order.payment_method,
-            amount=order.total_amount,
-            status='completed',
-            external_transaction_id=transaction_id
+        # 同じ注文への同時決済を防ぐため注文行をロック
+        order = get_object_or_404(
+            Order.objects.select_for_update().select_related('payment_method'),
+            id=order_id, user=request.user
         )
+        payment = Payment.objects.filter(order=order).first()
         
-        # 注文ステータスを更新
-        order.status = 'paid'
-        order.save()
+        if order.status != 'pending' or (payment and payment.status != 'failed'):
+            return Response(
+                {'error': 'この注文は決済できません。'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if payment is None:
+            payment = Payment(order=order)
+        
+        # 決済履歴を処理待ちで作成（失敗した決済は再試行として作り直す）
+        payment.payment_method = order.payment_method
+        payment.amount = order.total_amount
+        payment.processing_fee = order.payment_method.calculate_processing_fee(order.total_amount)
+        payment.status = 'pending'
+        payment.attempts = 0
+        payment.payment_details = {}
+        payment.payment_token = token or ''
+        payment.save()
+        
+        order.payment_status = 'pending'
+        order.save(update_fields=['payment_status', 'updated_at'])
+        # ゲートウェイの呼び出しはジョブワーカーで行う（ロールバックされた場合はジョブも追加されない）
+        processing.process_payment.enqueue(payment.pk)
     
+    payment = payment_detail_queryset().get(pk=payment.pk)
     return Response({
-        'message': '決済が完了しました。',
-        'payment': PaymentSerializer(payment).data
-    })
+        'message': '決済を受け付けました。決済状況は決済詳細APIで確認してください。',
+        'payment': PaymentSerializer(payment, context={'request': request}).data
+    }, status=status.HTTP_202_ACCEPTED)